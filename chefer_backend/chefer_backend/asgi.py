@@ -12,5 +12,14 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'chefer_backend.settings')
+# Асинхронные версии публичных страниц (core.async_views)
+os.environ.setdefault('CORE_ASYNC_VIEWS', '1')
 
 application = get_asgi_application()
+
+from django.conf import settings  # noqa: E402
+
+if settings.TEMPLATE_PRELOAD:
+    from core.templating import preload_templates  # noqa: E402
+
+    preload_templates()
@@ -41,12 +41,16 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.instrumentation.RequestMetricsMiddleware',
+    'core.routers.PrimaryPinMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'core.staticfiles.StaticFilesMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
+    'core.middleware.PageCacheMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
@@ -58,19 +62,55 @@ STATICFILES_DIRS = [
     os.path.join(BASE_DIR, 'static'),
 ]
 
+# Имена с хэшем содержимого и сжатые копии .gz/.br (core.staticfiles)
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'core.staticfiles.CompressedManifestStaticFilesStorage'},
+}
+
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Лимиты POST-запросов форм (core.ratelimit): 'N/период' — N запросов подряд
+# и пополнение N жетонов за период; корзины по IP клиента и по e-mail из формы
+RATE_LIMITS = {
+    'contact': {'ip': '5/10m', 'email': '3/h'},
+    'newsletter': {'ip': '10/10m', 'email': '3/h'},
+    'comment': {'ip': '10/10m', 'email': '5/h'},
+}
+RATELIMIT_ENABLED = True
+# Число доверенных прокси перед приложением: IP берётся из X-Forwarded-For
+RATELIMIT_TRUSTED_PROXIES = 0
+
+# Кто отдаёт медиафайлы (core.media): 'python' (FileResponse/sendfile),
+# 'nginx' (X-Accel-Redirect на MEDIA_ACCEL_PREFIX) или 'sendfile' (X-Sendfile)
+MEDIA_SERVE_BACKEND = os.environ.get('MEDIA_SERVE_BACKEND', 'python')
+MEDIA_ACCEL_PREFIX = '/protected-media/'
+MEDIA_MAX_AGE = 60 * 60 * 24
+
+# Производные изображений (core.images): ширины для srcset и фоновый пул
+IMAGE_DERIVATIVE_WIDTHS = (320, 640, 1024, 1600)
+IMAGE_DERIVATIVE_QUALITY = 80
+IMAGE_DERIVATIVE_WORKERS = 2
+
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates с замером времени рендеринга для метрик запроса
+        'BACKEND': 'core.instrumentation.InstrumentedDjangoTemplates',
         'DIRS': [
             BASE_DIR / 'templates',
             BASE_DIR / 'core' / 'templates',
         ],
-        'APP_DIRS': True,
         'OPTIONS': {
+            # Шаблоны компилируются один раз на процесс, в том числе при DEBUG:
+            # runserver сбрасывает этот кэш при изменении файлов шаблонов
+            'loaders': [
+                ('django.template.loaders.cached.Loader', [
+                    'django.template.loaders.filesystem.Loader',
+                    'django.template.loaders.app_directories.Loader',
+                ]),
+            ],
             'context_processors': [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
@@ -81,7 +121,14 @@ TEMPLATES = [
     },
 ]
 
+# Компилировать шаблоны из DIRS при старте сервера (core.templating)
+TEMPLATE_PRELOAD = os.environ.get('TEMPLATE_PRELOAD', '1') == '1'
+
 WSGI_APPLICATION = 'chefer_backend.wsgi.application'
+ASGI_APPLICATION = 'chefer_backend.asgi.application'
+
+# Асинхронные представления публичных страниц; asgi.py включает их по умолчанию
+CORE_ASYNC_VIEWS = os.environ.get('CORE_ASYNC_VIEWS') == '1'
 
 
 # Database
@@ -91,7 +138,50 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Постоянные соединения: PRAGMA и прогретый кэш страниц живут дольше запроса
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            # Пишущая транзакция сразу берёт блокировку записи и ждёт busy_timeout,
+            # а не получает "database is locked" при повышении блокировки
+            'transaction_mode': 'IMMEDIATE',
+        },
+    }
+}
+
+# Реплики только для чтения: псевдонимы через запятую в DATABASE_REPLICAS.
+# Локально это копии db.sqlite3, которые обновляет команда replicate_sqlite
+DATABASE_REPLICAS = [alias for alias in os.environ.get('DATABASE_REPLICAS', '').split(',') if alias]
+for _alias in DATABASE_REPLICAS:
+    DATABASES[_alias] = {
+        **DATABASES['default'],
+        'NAME': BASE_DIR / f'db.{_alias}.sqlite3',
+        'TEST': {'MIRROR': 'default'},
     }
+
+DATABASE_ROUTERS = ['core.routers.PrimaryReplicaRouter']
+
+# Модели каталога, чтения которых идут в реплики (core.routers)
+DATABASE_REPLICATED_MODELS = [
+    'core.Feature', 'core.Testimonial', 'core.TeamMember', 'core.BlogPost', 'core.Chef',
+    'core.Category', 'core.InstagramImage', 'core.Menu', 'core.MenuItem', 'core.Dish',
+    'core.Tag', 'core.Comment',
+]
+
+# Сколько секунд после изменяющего запроса чтения посетителя идут в основную базу
+DATABASE_PRIMARY_PIN_SECONDS = 10
+
+# PRAGMA для каждого нового соединения SQLite (core.db.apply_sqlite_pragmas).
+# WAL: читатели не блокируют писателя и наоборот; synchronous=NORMAL в WAL
+# безопасен для целостности и не делает fsync на каждый коммит
+SQLITE_PRAGMAS = {
+    'journal_mode': 'wal',
+    'synchronous': 'normal',
+    'busy_timeout': 5000,  # мс
+    'cache_size': -64000,  # отрицательное значение — КиБ
+    'mmap_size': 256 * 1024 * 1024,
+    'temp_store': 'memory',
+    'foreign_keys': 'on',
 }
 
 
@@ -150,7 +240,56 @@ DEFAULT_FROM_EMAIL = 'noreply@chefer.com'
 ADMIN_EMAIL = 'admin@chefer.com'
 SERVER_EMAIL = 'server@chefer.com'
 
+# Newsletter delivery: подписчики читаются порциями. С NEWSLETTER_BACKGROUND
+# письма ставятся в очередь outbox, иначе каждая порция уходит через одно
+# соединение, порции обрабатываются пулом потоков
+NEWSLETTER_BATCH_SIZE = 200
+NEWSLETTER_WORKERS = 4
+NEWSLETTER_BACKGROUND = True
+
+# Outbox: письма формы контактов и рассылки отправляет `manage.py process_outbox --loop`
+OUTBOX_BATCH_SIZE = 50
+OUTBOX_MAX_ATTEMPTS = 5
+OUTBOX_RETRY_BASE = 30  # секунд, удваивается с каждой попыткой
+
+# Menu search: по умолчанию бэкенд выбирается по типу базы (FTS5 для SQLite,
+# tsvector для PostgreSQL). Можно указать путь к классу явно, например
+# 'core.search.SubstringSearchBackend'
+MENU_SEARCH_BACKEND = None
+
+# Cache settings
+# С REDIS_URL кэш общий для всех процессов (Redis). Без него — LocMemCache,
+# свой у каждого процесса; страницы, фрагменты, корзины лимитов и пул капч
+# делят его записи, поэтому MAX_ENTRIES больше 300 по умолчанию
+REDIS_URL = os.environ.get('REDIS_URL', '')
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        },
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'OPTIONS': {'MAX_ENTRIES': 5000},
+        },
+    }
+
+# Записи get_cached_data версионируются поколениями моделей и
+# инвалидируются сигналами. В общем кэше новое поколение сразу видят все
+# процессы, и TTL может быть большим. В LocMemCache его видит только процесс,
+# сохранивший модель: остальные отдают старые данные до истечения TTL
+CORE_CACHE_TIMEOUT = 60 * 60 * 24 * 7 if REDIS_URL else 60 * 15
+
 # Logging settings
+# Все записи проходят через очередь: форматирование, запись и ротацию
+# выполняет фоновый поток QueuedHandler, запрос не ждёт диска
+LOG_QUEUE_SIZE = 10000
+# Из DEBUG-записей каждого логгера сохраняется одна из N
+LOG_DEBUG_SAMPLE_EVERY = 10
+
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
@@ -163,27 +302,68 @@ LOGGING = {
             'format': '{levelname} {message}',
             'style': '{',
         },
+        'json': {
+            '()': 'core.log.JsonFormatter',
+        },
+    },
+    'filters': {
+        'debug_sampling': {
+            '()': 'core.log.DebugSamplingFilter',
+            'every': LOG_DEBUG_SAMPLE_EVERY,
+        },
     },
     'handlers': {
-        'console': {
-            'class': 'logging.StreamHandler',
+        'core': {
+            '()': 'core.log.queued_handler',
             'formatter': 'verbose',
+            'filters': ['debug_sampling'],
+            'queue_size': LOG_QUEUE_SIZE,
+            'overflow': 'drop_oldest',
+            'targets': [
+                {'class': 'logging.StreamHandler'},
+                {
+                    'class': 'logging.handlers.RotatingFileHandler',
+                    'filename': BASE_DIR / 'logs' / 'debug.log',
+                    'maxBytes': 10 * 1024 * 1024,
+                    'backupCount': 5,
+                    'encoding': 'utf-8',
+                },
+            ],
         },
-        'file': {
-            'class': 'logging.FileHandler',
-            'filename': BASE_DIR / 'logs' / 'debug.log',
-            'formatter': 'verbose',
+        # Метрики запросов: по файлу в сутки, две недели истории
+        'requests': {
+            '()': 'core.log.queued_handler',
+            'formatter': 'json',
+            'queue_size': LOG_QUEUE_SIZE,
+            'overflow': 'drop_new',
+            'targets': [
+                {
+                    'class': 'logging.handlers.TimedRotatingFileHandler',
+                    'filename': BASE_DIR / 'logs' / 'requests.log',
+                    'when': 'midnight',
+                    'backupCount': 14,
+                    'encoding': 'utf-8',
+                },
+            ],
         },
     },
     'loggers': {
         'core': {
-            'handlers': ['console', 'file'],
+            'handlers': ['core'],
             'level': 'DEBUG',
             'propagate': True,
         },
+        'core.requests': {
+            'handlers': ['requests'],
+            'level': 'INFO',
+            'propagate': False,
+        },
     },
 }
 
+# Число самых медленных SQL-запросов в метриках запроса
+REQUEST_METRICS_SLOW_QUERIES = 3
+
 os.makedirs(BASE_DIR / 'logs', exist_ok=True)
 
 # Captcha settings
@@ -200,4 +380,11 @@ CAPTCHA_DICTIONARY_MIN_LENGTH = 2
 CAPTCHA_DICTIONARY_MAX_LENGTH = 4
 CAPTCHA_OUTPUT_FORMAT = '%(image)s %(hidden_field)s %(text_field)s'
 CAPTCHA_FILTER_FUNCTIONS = ('captcha.helpers.post_smooth',)
-CAPTCHA_IMAGE_TEMPLATE = 'captcha/image.html' 
+CAPTCHA_IMAGE_TEMPLATE = 'captcha/image.html'
+# Капчи ContactForm берутся из пула с готовыми картинками (core.captcha_pool).
+# True отключает удаление просроченных капч при каждой проверке формы, но и
+# заставляет CaptchaStore.pick() выдавать уже выданные ключи: каждое
+# CaptchaField должно использовать core.captcha_pool.PooledCaptchaTextInput
+CAPTCHA_GET_FROM_POOL = True
+CAPTCHA_POOL_SIZE = 50
+CAPTCHA_POOL_TTL = 15
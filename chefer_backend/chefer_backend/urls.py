@@ -1,15 +1,17 @@
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, re_path, include
 from django.conf import settings
-from django.conf.urls.static import static
+
+from core import captcha_pool
+from core.media import serve_media
 
 urlpatterns = [
     path('admin/', admin.site.urls),
+    # Картинки и обновление капчи из пула (core.captcha_pool), остальное — captcha.urls
+    re_path(r'^captcha/image/(?P<key>\w+)/$', captcha_pool.captcha_image, {'scale': 1}),
+    re_path(r'^captcha/refresh/$', captcha_pool.captcha_refresh),
     path('', include('core.urls')),
     path('captcha/', include('captcha.urls')),
+    # Медиафайлы; статику отдаёт core.staticfiles.StaticFilesMiddleware
+    path(f'{settings.MEDIA_URL.strip("/")}/<path:path>', serve_media, name='media'),
 ]
-
-if settings.DEBUG:
-    from django.conf.urls.static import static
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
-    urlpatterns += static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
@@ -1,8 +1,13 @@
 from django.contrib import admin
 from .models import *
-from django.core.mail import send_mail
+from .caching import bump_generation_on_commit
+from .comments import refresh_approved_comment_counts
+from .export import export_response
+from .newsletter import deliver_newsletter, start_delivery
 from django.contrib import messages
+from django.core.handlers.asgi import ASGIRequest
 from django.conf import settings
+from django.utils import timezone
 
 
 admin.site.register(Chef)
@@ -48,6 +53,22 @@ class InstagramImageAdmin(admin.ModelAdmin):
     ordering = ('-created_at',)
   
 
+def _export(modeladmin, request, queryset, fmt):
+    # Весь результат не загружается в память: строки читаются порциями
+    filename = f'{modeladmin.model._meta.model_name}-{timezone.localdate():%Y%m%d}'
+    return export_response(queryset, fmt, filename, asynchronous=isinstance(request, ASGIRequest))
+
+
+@admin.action(description="Export selected to CSV")
+def export_csv(modeladmin, request, queryset):
+    return _export(modeladmin, request, queryset, 'csv')
+
+
+@admin.action(description="Export selected to JSON")
+def export_json(modeladmin, request, queryset):
+    return _export(modeladmin, request, queryset, 'json')
+
+
 @admin.register(ContactMessage)
 class ContactMessageAdmin(admin.ModelAdmin):
     list_display = ('name', 'email', 'subject', 'created_at', 'is_read')
@@ -55,23 +76,43 @@ class ContactMessageAdmin(admin.ModelAdmin):
     search_fields = ('name', 'email', 'subject', 'message')
     readonly_fields = ('created_at',)
     ordering = ('-created_at',)
+    actions = [export_csv, export_json]
+
 
 
+@admin.action(description="Requeue selected emails")
+def requeue_outbound_emails(modeladmin, request, queryset):
+    updated = queryset.exclude(status=OutboundEmail.STATUS_SENT).update(
+        status=OutboundEmail.STATUS_PENDING, attempts=0, next_attempt_at=timezone.now(), claimed_by='',
+    )
+    messages.success(request, f"Requeued {updated} emails.")
+
+
+@admin.register(OutboundEmail)
+class OutboundEmailAdmin(admin.ModelAdmin):
+    list_display = ('subject', 'to_email', 'status', 'attempts', 'next_attempt_at', 'sent_at')
+    list_filter = ('status', 'created_at')
+    search_fields = ('subject', 'to_email', 'last_error')
+    readonly_fields = ('created_at', 'sent_at', 'last_error')
+    ordering = ('-created_at',)
+    actions = [requeue_outbound_emails]
+
 
 @admin.action(description="Send email to selected subscribers")
 def send_email_to_subscribers(modeladmin, request, queryset):
     subject = "Your subject here"
     message = "Your message here"
-    from_email = settings.DEFAULT_FROM_EMAIL
-    emails = queryset.values_list('email', flat=True)
-    for email in emails:
-        send_mail(subject, message, from_email, [email], fail_silently=False)
-    messages.success(request, f"Sent email to {len(emails)} subscribers.")
+    if getattr(settings, 'NEWSLETTER_BACKGROUND', True):
+        start_delivery(subject, message, queryset)
+        messages.success(request, f"Queued email to {queryset.count()} subscribers.")
+        return
+    report = deliver_newsletter(subject, message, queryset)
+    messages.success(request, f"Sent email to {report.sent} subscribers.")
   
 @admin.register(NewsletterSubscriber)
 class NewsletterSubscriberAdmin(admin.ModelAdmin):
     list_display = ('email', 'subscribed_at')
-    actions = [send_email_to_subscribers]
+    actions = [send_email_to_subscribers, export_csv, export_json]
     list_filter = ('subscribed_at',)
     search_fields = ('email',)
     ordering = ('-subscribed_at',)
@@ -87,3 +128,23 @@ class CommentAdmin(admin.ModelAdmin):
     search_fields = ('name', 'email', 'content')
     readonly_fields = ('created_at',)
     ordering = ('-created_at',)
+    actions = ['approve_comments', 'unapprove_comments']
+
+    def _moderate(self, request, queryset, approved):
+        # update() не вызывает сигналы: счётчики и кэш страниц обновляются здесь
+        post_ids = set(queryset.values_list('post_id', flat=True))
+        updated = queryset.update(is_approved=approved)
+        refresh_approved_comment_counts(post_ids)
+        for post_id in post_ids:
+            bump_generation_on_commit((Comment, post_id))
+        return updated
+
+    @admin.action(description='Approve selected comments')
+    def approve_comments(self, request, queryset):
+        updated = self._moderate(request, queryset, True)
+        self.message_user(request, f'{updated} comments approved.', messages.SUCCESS)
+
+    @admin.action(description='Unapprove selected comments')
+    def unapprove_comments(self, request, queryset):
+        updated = self._moderate(request, queryset, False)
+        self.message_user(request, f'{updated} comments unapproved.', messages.SUCCESS)
@@ -0,0 +1,174 @@
+"""
+Асинхронные версии публичных страниц для запуска под ASGI (uvicorn, daphne).
+
+Независимые выборки выполняются одновременно через asyncio.gather на async
+API ORM и кэша. Контекст и шаблоны те же, что у представлений из
+`core.views`; маршруты выбираются настройкой CORE_ASYNC_VIEWS (см. `core.urls`).
+
+Рендеринг выполняется одним вызовом sync_to_async: контекстные процессоры
+(пользователь, сообщения, лента Instagram) лениво обращаются к сессии и базе,
+что в асинхронном контексте запрещено.
+"""
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.contrib import messages
+from django.shortcuts import aget_object_or_404, redirect, render
+
+from .comments import get_approved_comments_page
+from .forms import CommentForm
+from .models import BlogPost, Chef, Dish, Feature, Menu, TeamMember, Tag, Testimonial
+from .ratelimit import ratelimit
+from .search import search_menu_items
+from .snapshots import aget_menu_categories
+from .views import aget_cached_data, filter_menu_categories, get_selected_menu, paginate_categories
+
+arender = sync_to_async(render)
+
+
+async def _list(queryset):
+    return [obj async for obj in queryset]
+
+
+async def _search_ranks(search_query, menu):
+    if not (search_query and menu):
+        return None
+    item_ids = await sync_to_async(search_menu_items)(search_query, menu.id)
+    return {item_id: rank for rank, item_id in enumerate(item_ids)}
+
+
+async def index(request):
+    features, testimonials, team_members, blog_posts, chefs, menus = await asyncio.gather(
+        aget_cached_data(Feature, 'features'),
+        aget_cached_data(Testimonial, 'testimonials'),
+        aget_cached_data(TeamMember, 'team_members'),
+        aget_cached_data(BlogPost, 'blog_posts', limit=3),
+        aget_cached_data(Chef, 'chefs'),
+        _list(Menu.objects.all()),
+    )
+    selected_menu = menus[0] if menus else None
+    categories_for_index_menu = await aget_menu_categories(selected_menu)
+
+    context = {
+        'features': features,
+        'testimonials': testimonials,
+        'team_members': team_members,
+        'blog_posts': blog_posts,
+        'chefs': chefs,
+        'categories': categories_for_index_menu,
+        'page_title': 'Home',
+        'page_subtitle': 'Welcome to Chefer',
+        'show_search': False,
+        'menus': menus,
+        'selected_menu': selected_menu,
+        'name': 'Our Menu',
+        'description': "Explore our delicious menu",
+    }
+    return await arender(request, 'index.html', context)
+
+
+async def menu(request):
+    menus, features = await asyncio.gather(
+        _list(Menu.objects.all()),
+        aget_cached_data(Feature, 'features'),
+    )
+    selected_menu = get_selected_menu(menus, request.GET.get('menu'))
+    search_query = request.GET.get('search', '').strip()
+
+    # Снимок меню и поиск по индексу не зависят друг от друга
+    categories, ranks = await asyncio.gather(
+        aget_menu_categories(selected_menu),
+        _search_ranks(search_query, selected_menu),
+    )
+    page_obj = paginate_categories(request, categories)
+    filtered_categories, active_category_id = filter_menu_categories(
+        page_obj, ranks, request.GET.get('category'),
+    )
+
+    context = {
+        'title': 'Menu',
+        'page_title': 'Menu',
+        'name': 'Our Menu',
+        'description': "Explore our delicious menu",
+        'categories': filtered_categories,
+        'page_obj': page_obj,
+        'features': features,
+        'menus': menus,
+        'selected_menu': selected_menu,
+        'search_query': search_query,
+        'show_search': True,
+        'active_category_id': active_category_id,
+    }
+    return await arender(request, 'menu.html', context)
+
+
+async def blog(request):
+    context = {
+        'blog_posts': await aget_cached_data(BlogPost, 'blog_posts'),
+        'page_title': 'Blog',
+    }
+    return await arender(request, 'blog.html', context)
+
+
+@ratelimit('comment')
+async def blog_detail(request, pk):
+    post = await aget_object_or_404(BlogPost, pk=pk)
+
+    if request.method == 'POST':
+        form = CommentForm(request.POST)
+        # Валидация ModelForm может обращаться к базе
+        if await sync_to_async(form.is_valid)():
+            comment = form.save(commit=False)
+            comment.post = post
+            await comment.asave()
+            messages.success(request, 'Your comment has been submitted and is awaiting approval.')
+            return redirect('blog_detail', pk=post.pk)
+    else:
+        form = CommentForm()
+
+    blog_posts, comments = await asyncio.gather(
+        aget_cached_data(BlogPost, 'blog_posts'),
+        sync_to_async(get_approved_comments_page)(post, request.GET.get('page')),
+    )
+    context = {
+        'post': post,
+        'blog_posts': blog_posts,
+        'comments': comments,
+        'form': form,
+        'page_title': post.title,
+    }
+    return await arender(request, 'blog_detail.html', context)
+
+
+async def dishes_by_tag(request, tag_slug):
+    tag = await aget_object_or_404(Tag, name=tag_slug)
+    dishes, features = await asyncio.gather(
+        _list(Dish.objects.filter(tags=tag).select_related('menu').prefetch_related('tags')),
+        aget_cached_data(Feature, 'features'),
+    )
+
+    context = {
+        'tag': tag,
+        'dishes': dishes,
+        'features': features,
+        'page_title': f'Dishes - {tag.name}',
+        'name': f'Dishes with tag "{tag.name}"',
+        'description': 'Explore our delicious dishes',
+    }
+    return await arender(request, 'dishes_by_tag.html', context)
+
+
+async def dish_detail(request, pk):
+    dish, features = await asyncio.gather(
+        aget_object_or_404(Dish.objects.select_related('menu').prefetch_related('tags'), pk=pk),
+        aget_cached_data(Feature, 'features'),
+    )
+
+    context = {
+        'dish': dish,
+        'features': features,
+        'page_title': dish.name,
+        'name': dish.name,
+        'description': dish.description,
+    }
+    return await arender(request, 'dish_detail.html', context)
@@ -0,0 +1,278 @@
+"""
+Общие инструменты для бенчмарков (`manage.py bench_*`).
+
+Бенчмарки работают на временной тестовой базе, созданной миграциями, и
+заполняют её синтетическим каталогом через bulk_create. Рабочая база не
+затрагивается.
+
+`measure_routes` обходит все маршруты `core.urls` и для каждого записывает
+число запросов к базе (с пустым и с прогретым кэшем), медианное время и
+пиковую память; `compare_with_baseline` сверяет результат с сохранённой
+базовой линией (`core/bench_baseline.json`).
+"""
+import random
+import statistics
+import time
+import tracemalloc
+from contextlib import contextmanager
+from decimal import Decimal
+from pathlib import Path
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection, reset_queries
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLPattern, reverse
+
+from .models import BlogPost, Category, Comment, Dish, Feature, Menu, MenuItem, Tag, gravatar_hash
+
+WORDS = (
+    'salad', 'soup', 'chicken', 'beef', 'salmon', 'tuna', 'pancake', 'omelette', 'borscht', 'dolma',
+    'falafel', 'ramen', 'harissa', 'dumpling', 'vinaigrette', 'spicy', 'grilled', 'baked', 'fresh',
+    'garden', 'herb', 'lemon', 'garlic', 'cheese', 'cream', 'berry', 'smoothie', 'oatmeal', 'pumpkin',
+    'mushroom', 'pepper', 'tomato', 'potato', 'rice', 'noodle', 'honey', 'walnut', 'apricot', 'lamb',
+)
+
+
+@contextmanager
+def temporary_database(verbosity=0, test_name=None):
+    """
+    Создаёт тестовую базу на время бенчмарка и удаляет её после.
+    `test_name` — файл базы вместо базы в памяти (SQLite), например чтобы
+    несколько потоков работали с одной базой.
+    """
+    old_name = connection.settings_dict['NAME']
+    test_settings = connection.settings_dict['TEST']
+    old_test_name = test_settings.get('NAME')
+    if test_name is not None:
+        test_settings['NAME'] = str(test_name)
+    try:
+        connection.creation.create_test_db(verbosity=verbosity, autoclobber=True, serialize=False)
+        try:
+            yield
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=verbosity)
+    finally:
+        test_settings['NAME'] = old_test_name
+
+
+SYLLABLES = ('ka', 'lo', 'mi', 'ra', 'ti', 'su', 'ne', 'po', 'va', 'che', 'shi', 'dro', 'bel', 'gan', 'tor')
+
+
+def build_vocabulary(size=5000, seed=7):
+    """Словарь реалистичного размера: известные слова плюс псевдослова."""
+    rng = random.Random(seed)
+    vocabulary = set(WORDS)
+    while len(vocabulary) < size:
+        vocabulary.add(''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))))
+    return sorted(vocabulary)
+
+
+VOCABULARY = build_vocabulary()
+
+
+def _phrase(rng, words):
+    return ' '.join(rng.choice(VOCABULARY) for _ in range(words)).capitalize()
+
+
+def seed_catalog(items=1000, menus=3, categories=20, tags=15, posts=0, comments=0, features=0,
+                 seed=42, batch_size=2000):
+    """
+    Заполняет базу синтетическим каталогом: меню, категории, теги, блюда
+    (по одному на пункт меню), пункты меню, посты блога с комментариями
+    (половина одобрена) и предложения. Сигналы не вызываются, поэтому
+    производные структуры нужно перестроить (см. prepare_catalog).
+    """
+    rng = random.Random(seed)
+    menu_objs = Menu.objects.bulk_create(
+        [Menu(name=f'Menu {i}', description=_phrase(rng, 8)) for i in range(menus)]
+    )
+    category_objs = Category.objects.bulk_create(
+        [Category(name=f'{_phrase(rng, 1)} {i}') for i in range(categories)]
+    )
+    tag_objs = Tag.objects.bulk_create([Tag(name=f'tag-{i}') for i in range(tags)])
+
+    dishes = Dish.objects.bulk_create(
+        [
+            Dish(
+                menu=rng.choice(menu_objs), name=_phrase(rng, 2), description=_phrase(rng, 12),
+                price=Decimal(rng.randint(500, 5000)) / 100, image=f'dishes/dish-{i}.jpg',
+            )
+            for i in range(items)
+        ],
+        batch_size=batch_size,
+    )
+    Dish.tags.through.objects.bulk_create(
+        [
+            Dish.tags.through(dish_id=dish.id, tag_id=tag.id)
+            for dish in dishes
+            for tag in rng.sample(tag_objs, 2)
+        ],
+        batch_size=batch_size,
+    )
+    MenuItem.objects.bulk_create(
+        [
+            MenuItem(
+                category=rng.choice(category_objs), dish=dish, menu_id=dish.menu_id,
+                title=_phrase(rng, 3), description=_phrase(rng, 10), price=dish.price,
+                image=f'menu_images/item-{i}.jpg',
+            )
+            for i, dish in enumerate(dishes)
+        ],
+        batch_size=batch_size,
+    )
+
+    post_objs = BlogPost.objects.bulk_create(
+        [
+            BlogPost(title=_phrase(rng, 4), content=_phrase(rng, 200), image=f'blog/post-{i}.jpg')
+            for i in range(posts)
+        ],
+        batch_size=batch_size,
+    )
+    if post_objs:
+        Comment.objects.bulk_create(
+            [
+                Comment(
+                    post=rng.choice(post_objs), name=_phrase(rng, 1), email=f'reader{i}@example.com',
+                    avatar_hash=gravatar_hash(f'reader{i}@example.com'),
+                    content=_phrase(rng, 30), is_approved=i % 2 == 0,
+                )
+                for i in range(comments)
+            ],
+            batch_size=batch_size,
+        )
+    feature_objs = Feature.objects.bulk_create(
+        [
+            Feature(title=_phrase(rng, 2), description=_phrase(rng, 20), image=f'features/feature-{i}.png')
+            for i in range(features)
+        ]
+    )
+    return {
+        'menus': menu_objs, 'categories': category_objs, 'tags': tag_objs,
+        'dishes': dishes, 'posts': post_objs, 'features': feature_objs,
+    }
+
+
+def prepare_catalog():
+    """
+    Строит снимки меню, поисковый индекс и счётчики комментариев для
+    каталога из seed_catalog.
+    """
+    from .comments import refresh_approved_comment_counts
+    from .search import get_search_backend
+    from .snapshots import rebuild_menu_snapshots
+
+    rebuild_menu_snapshots()
+    get_search_backend().rebuild()
+    refresh_approved_comment_counts(BlogPost.objects.values_list('id', flat=True))
+
+
+BASELINE_PATH = Path(__file__).resolve().parent / 'bench_baseline.json'
+
+# Маршруты, доступные только сотрудникам
+STAFF_ROUTES = {'send_newsletter'}
+# Дополнительные варианты маршрутов: имя -> (маршрут, строка запроса)
+ROUTE_VARIANTS = {'menu_search': ('menu', 'search=salad')}
+# Метрики, которые сравниваются строго, и метрики с допуском
+EXACT_METRICS = ('queries_cold', 'queries_warm')
+TOLERANT_METRICS = ('time_ms', 'peak_kb')
+
+
+def route_paths(catalog):
+    """{имя: путь} для каждого маршрута из `core.urls` и его вариантов."""
+    from . import urls
+
+    kwargs = {
+        'blog_detail': {'pk': catalog['posts'][0].pk},
+        'feature_detail': {'pk': catalog['features'][0].pk},
+        'dishes_by_tag': {'tag_slug': catalog['tags'][0].name},
+        'dish_detail': {'pk': catalog['dishes'][0].pk},
+    }
+    paths = {
+        pattern.name: reverse(pattern.name, kwargs=kwargs.get(pattern.name))
+        for pattern in urls.urlpatterns
+        if isinstance(pattern, URLPattern)
+    }
+    for name, (route, query) in ROUTE_VARIANTS.items():
+        paths[name] = f'{paths[route]}?{query}'
+    return paths
+
+
+def _staff_client():
+    user, _ = get_user_model().objects.get_or_create(
+        username='bench-staff', defaults={'is_staff': True, 'is_superuser': True},
+    )
+    client = Client(SERVER_NAME='localhost')
+    client.force_login(user)
+    return client
+
+
+def measure_route(client, path, repeat=5):
+    """
+    Метрики одного маршрута: запросы при пустом кэше (и пиковая память этого
+    запроса), запросы при прогретом кэше и медианное время прогретого запроса.
+    """
+    cache.clear()
+    # Заполненный журнал запросов (deque на 9000 записей) не растёт и
+    # CaptureQueriesContext насчитал бы ноль
+    reset_queries()
+    tracemalloc.start()
+    try:
+        with CaptureQueriesContext(connection) as cold:
+            response = client.get(path)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    # captured_queries читает журнал лениво, поэтому считаем сразу
+    queries_cold = len(cold)
+    reset_queries()
+    with CaptureQueriesContext(connection) as warm:
+        client.get(path)
+    queries_warm = len(warm)
+
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        client.get(path)
+        timings.append(time.perf_counter() - started)
+    return {
+        'path': path,
+        'status': response.status_code,
+        'queries_cold': queries_cold,
+        'queries_warm': queries_warm,
+        'time_ms': round(statistics.median(timings) * 1000, 3) if timings else None,
+        'peak_kb': round(peak / 1024, 1),
+    }
+
+
+def measure_routes(catalog, repeat=5):
+    anonymous, staff = Client(SERVER_NAME='localhost'), _staff_client()
+    return {
+        name: measure_route(staff if name in STAFF_ROUTES else anonymous, path, repeat)
+        for name, path in route_paths(catalog).items()
+    }
+
+
+def compare_with_baseline(results, baseline, tolerance=1.5, metrics=EXACT_METRICS + TOLERANT_METRICS):
+    """
+    Список превышений базовой линии. Число запросов сравнивается строго,
+    время и память — с множителем `tolerance`. Маршруты без базовой линии
+    не считаются ошибкой.
+    """
+    violations = []
+    for name, result in results.items():
+        expected = baseline.get(name)
+        if expected is None:
+            continue
+        if result['status'] != expected['status']:
+            violations.append(f'{name}: status {result["status"]} != {expected["status"]}')
+        for metric in metrics:
+            actual, limit = result.get(metric), expected.get(metric)
+            if actual is None or limit is None:
+                continue
+            if metric in TOLERANT_METRICS:
+                limit = limit * tolerance
+            if actual > limit:
+                violations.append(f'{name}: {metric} {actual} > {limit:g}')
+    return violations
@@ -0,0 +1,110 @@
+"""
+Версионированные ключи кэша.
+
+Для каждой модели в кэше хранится счётчик поколения. Ключи данных включают
+текущее поколение, поэтому изменение модели (сигналы в `core.signals`)
+мгновенно делает старые записи недостижимыми. Это верно для общего кэша
+(Redis); в LocMemCache счётчики у каждого процесса свои, и другие процессы
+узнают об изменении только по истечении CORE_CACHE_TIMEOUT.
+
+Вместо модели можно передать пару (модель, область) — поколение части
+данных модели, например комментариев одного поста: её изменение не
+затрагивает ключи других областей.
+"""
+import time
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+
+# Время жизни версионированных записей (см. CORE_CACHE_TIMEOUT в настройках)
+DEFAULT_TIMEOUT = getattr(settings, 'CORE_CACHE_TIMEOUT', 60 * 60 * 24 * 7)
+
+GENERATION_KEY = 'generation:{label}'
+
+
+def is_shared_cache(alias='default'):
+    """True, если кэш общий для процессов, а не память одного процесса."""
+    return not isinstance(caches[alias], (LocMemCache, DummyCache))
+
+
+def _generation_key(model_class):
+    if isinstance(model_class, tuple):
+        model_class, scope = model_class
+        return f'{GENERATION_KEY.format(label=model_class._meta.label_lower)}:{scope}'
+    return GENERATION_KEY.format(label=model_class._meta.label_lower)
+
+
+def _initial_generation():
+    # Начальное значение от времени: если счётчик будет вытеснен из кэша,
+    # новое поколение не совпадёт ни с одним из уже использованных
+    return int(time.time() * 1000)
+
+
+def _fill_missing(keys, found):
+    missing = {key: _initial_generation() for key in keys if key not in found}
+    found.update(missing)
+    return missing
+
+
+def get_generations(*model_classes):
+    """Возвращает текущие поколения моделей одним обращением к кэшу."""
+    keys = [_generation_key(model_class) for model_class in model_classes]
+    found = cache.get_many(keys)
+    missing = _fill_missing(keys, found)
+    if missing:
+        cache.set_many(missing, None)
+    return [found[key] for key in keys]
+
+
+async def aget_generations(*model_classes):
+    """Асинхронный вариант get_generations для async-представлений."""
+    keys = [_generation_key(model_class) for model_class in model_classes]
+    found = await cache.aget_many(keys)
+    missing = _fill_missing(keys, found)
+    if missing:
+        await cache.aset_many(missing, None)
+    return [found[key] for key in keys]
+
+
+def bump_generation(model_class):
+    """Увеличивает поколение модели, инвалидируя все зависящие от неё ключи."""
+    key = _generation_key(model_class)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, _initial_generation(), None)
+
+
+def bump_generation_on_commit(model_class, using='default'):
+    """
+    Откладывает инвалидацию до коммита: иначе параллельный запрос успеет
+    закэшировать ещё не изменённые данные под новым поколением.
+    """
+    transaction.on_commit(lambda: bump_generation(model_class), using=using)
+
+
+def versioned_key(cache_key, *model_classes):
+    """Ключ кэша, привязанный к поколениям перечисленных моделей."""
+    return _join_key(cache_key, get_generations(*model_classes))
+
+
+async def aversioned_key(cache_key, *model_classes):
+    return _join_key(cache_key, await aget_generations(*model_classes))
+
+
+def query_key(request, params):
+    """
+    Часть ключа кэша из параметров запроса `params`, которые читает
+    представление. Прочие параметры (utm_* и т.п.), их порядок и пустые
+    значения на ключ не влияют.
+    """
+    values = ((name, request.GET.get(name, '').strip()) for name in sorted(params))
+    return urlencode([(name, value) for name, value in values if value])
+
+
+def _join_key(cache_key, generations):
+    return ':'.join([cache_key, *(f'g{generation}' for generation in generations)])
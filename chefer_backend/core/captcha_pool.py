@@ -0,0 +1,183 @@
+"""
+Пул заранее подготовленных капч для ContactForm.
+
+django-simple-captcha на каждый показ формы создаёт строку CaptchaStore, а на
+каждый запрос /captcha/image/<key>/ рисует PNG через Pillow в потоке запроса.
+Здесь капчи готовятся пачками в фоновом потоке: строки создаются одним
+bulk_create, картинки рисуются заранее и кладутся в кэш байтами. Показ формы
+берёт следующий ключ пачки (cache.incr), картинка — одно чтение кэша.
+
+Каждый ключ выдаётся один раз: проверка ответа удаляет строку капчи. Когда
+пачка израсходована наполовину или устаревает, в фоне готовится новая; пока
+пула нет (первый запрос, промах кэша), капча создаётся как в библиотеке.
+Просроченные строки удаляются одним DELETE при пополнении, а не при каждой
+проверке формы.
+
+Связь с django-simple-captcha (версия закреплена в requirements.txt):
+- CAPTCHA_GET_FROM_POOL = True выключает remove_expired() при каждой
+  проверке, но переводит CaptchaStore.pick() в режим выдачи случайной
+  существующей строки. pick() вызывают стандартный CaptchaTextInput и
+  captcha.views.captcha_refresh, поэтому каждое CaptchaField проекта должно
+  использовать PooledCaptchaTextInput, а /captcha/refresh/ обслуживается
+  здесь (маршрут стоит раньше captcha.urls);
+- картинки рисует закрытая функция captcha.views._captcha_image.
+
+С LocMemCache пул у каждого процесса свой. С общим кэшем (REDIS_URL) его
+можно пополнять командой `captcha_pool --loop`.
+"""
+import datetime
+import logging
+import secrets
+import threading
+import time
+
+from captcha import views as captcha_views
+from captcha.conf import settings as captcha_settings
+from captcha.fields import CaptchaTextInput
+from captcha.helpers import captcha_audio_url, captcha_image_url
+from captcha.models import CaptchaStore
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+from django.http import Http404, HttpResponse, JsonResponse
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+# Каждая капча пачки — отдельная запись кэша с картинкой, а LocMemCache
+# ограничен MAX_ENTRIES на все записи
+POOL_SIZE = getattr(settings, 'CAPTCHA_POOL_SIZE', 50)
+# Капча из пула живёт столько минут и выдаётся, пока до её истечения
+# остаётся не меньше CAPTCHA_TIMEOUT минут
+POOL_TTL = getattr(settings, 'CAPTCHA_POOL_TTL', 15)
+
+CURRENT_KEY = 'captcha:pool'
+CURSOR_KEY = 'captcha:pool:{batch}:cursor'
+IMAGE_KEY = 'captcha:image:{key}'
+LOCK_KEY = 'captcha:pool:lock'
+LOCK_TIMEOUT = 60
+
+_refill_lock = threading.Lock()
+
+
+def _batch_timeout():
+    return max(60, (POOL_TTL - int(captcha_settings.CAPTCHA_TIMEOUT)) * 60)
+
+
+def _is_low(current, issued):
+    _, keys, created = current
+    return issued >= len(keys) // 2 or time.time() - created > _batch_timeout() / 2
+
+
+def render_image(store, scale=1):
+    """PNG капчи, нарисованный так же, как в captcha.views.captcha_image (закрытый API библиотеки)."""
+    return captcha_views._captcha_image(store, scale).content
+
+
+def fill(size=None):
+    """Готовит пачку из size капч и делает её текущей; возвращает номер пачки."""
+    size = size or POOL_SIZE
+    get_challenge = captcha_settings.get_challenge()
+    expiration = timezone.now() + datetime.timedelta(minutes=POOL_TTL)
+    stores = []
+    for _ in range(size):
+        challenge, response = get_challenge()
+        stores.append(CaptchaStore(
+            challenge=challenge, response=response.lower(),
+            hashkey=secrets.token_hex(20), expiration=expiration,
+        ))
+    CaptchaStore.objects.bulk_create(stores)
+    cache.set_many({IMAGE_KEY.format(key=store.hashkey): render_image(store) for store in stores}, POOL_TTL * 60)
+
+    batch = secrets.token_hex(4)
+    cache.set(CURSOR_KEY.format(batch=batch), 0, _batch_timeout())
+    cache.set(CURRENT_KEY, (batch, [store.hashkey for store in stores], time.time()), _batch_timeout())
+    return batch
+
+
+def remove_expired():
+    """Удаляет просроченные капчи одним запросом; возвращает их число."""
+    deleted, _ = CaptchaStore.objects.filter(expiration__lte=timezone.now()).delete()
+    return deleted
+
+
+def pool_low():
+    """True, если текущей пачки нет, она израсходована наполовину или устаревает."""
+    current = cache.get(CURRENT_KEY)
+    if current is None:
+        return True
+    issued = cache.get(CURSOR_KEY.format(batch=current[0]))
+    return issued is None or _is_low(current, issued)
+
+
+def refill(size=None):
+    remove_expired()
+    return fill(size)
+
+
+def refill_in_background():
+    """Запускает пополнение пула в фоновом потоке, если оно ещё не идёт."""
+    if not _refill_lock.acquire(blocking=False):
+        return False
+    # С общим кэшем пачку готовит один процесс
+    if not cache.add(LOCK_KEY, 1, LOCK_TIMEOUT):
+        _refill_lock.release()
+        return False
+
+    def target():
+        try:
+            refill()
+        except Exception:
+            logger.exception("Captcha pool refill failed")
+        finally:
+            cache.delete(LOCK_KEY)
+            _refill_lock.release()
+            connections.close_all()
+
+    threading.Thread(target=target, name='captcha-pool', daemon=True).start()
+    return True
+
+
+def take_key():
+    """Ключ очередной готовой капчи; None — пул пуст или израсходован."""
+    current = cache.get(CURRENT_KEY)
+    if current is None:
+        refill_in_background()
+        return None
+    batch, keys, _ = current
+    try:
+        issued = cache.incr(CURSOR_KEY.format(batch=batch))
+    except ValueError:
+        refill_in_background()
+        return None
+    if _is_low(current, issued):
+        refill_in_background()
+    return keys[issued - 1] if issued <= len(keys) else None
+
+
+class PooledCaptchaTextInput(CaptchaTextInput):
+    """Виджет CaptchaField, который берёт ключ из пула."""
+
+    def fetch_captcha_store(self, name, value, attrs=None, generator=None):
+        key = take_key() or CaptchaStore.generate_key(generator)
+        self._value = [key, '']
+        self._key = key
+        self.id_ = self.build_attrs(attrs).get('id', None)
+
+
+def captcha_image(request, key, scale=1):
+    image = cache.get(IMAGE_KEY.format(key=key)) if scale == 1 else None
+    if image is None:
+        return captcha_views.captcha_image(request, key, scale)
+    return HttpResponse(image, content_type='image/png')
+
+
+def captcha_refresh(request):
+    if request.headers.get('x-requested-with') != 'XMLHttpRequest':
+        raise Http404
+    key = take_key() or CaptchaStore.generate_key()
+    return JsonResponse({
+        'key': key,
+        'image_url': captcha_image_url(key),
+        'audio_url': captcha_audio_url(key) if captcha_settings.CAPTCHA_FLITE_PATH else None,
+    })
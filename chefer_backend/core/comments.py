@@ -0,0 +1,54 @@
+"""
+Одобренные комментарии к постам блога.
+
+Число одобренных комментариев хранится в BlogPost.approved_comment_count и
+пересчитывается одним UPDATE при изменении модерации. Страницы комментариев
+кэшируются компактными записями под ключом, версионированным поколением
+комментариев этого поста (Comment, post.pk): новый неодобренный комментарий
+его не сбрасывает, а одобрение сбрасывает страницы только своего поста.
+Paginator получает готовое число из поста и не делает COUNT.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from .caching import DEFAULT_TIMEOUT, versioned_key
+from .models import BlogPost, Comment
+from .records import to_rows
+
+COMMENTS_PER_PAGE = getattr(settings, 'COMMENTS_PER_PAGE', 20)
+
+
+def refresh_approved_comment_counts(post_ids):
+    """Пересчитывает approved_comment_count для постов одним запросом."""
+    post_ids = list(post_ids)
+    if not post_ids:
+        return
+    approved = Comment.objects.filter(
+        post=OuterRef('pk'), is_approved=True,
+    ).order_by().values('post').annotate(total=Count('pk')).values('total')
+    BlogPost.objects.filter(pk__in=post_ids).update(
+        approved_comment_count=Coalesce(Subquery(approved), 0),
+    )
+
+
+def get_approved_comments_page(post, number=1, per_page=COMMENTS_PER_PAGE):
+    """
+    Страница одобренных комментариев поста. object_list — кортеж записей
+    CommentRow из кэша; при промахе выполняется один запрос.
+    """
+    paginator = Paginator(post.comments.filter(is_approved=True), per_page)
+    # count — cached_property: значение из поста избавляет от COUNT
+    paginator.count = post.approved_comment_count
+    page = paginator.get_page(number)
+
+    # Общее поколение Comment сбрасывает replicate(), поколение поста — модерация
+    cache_key = versioned_key(f'approved_comments:{post.pk}:{page.number}:{per_page}', Comment, (Comment, post.pk))
+    rows = cache.get(cache_key)
+    if rows is None:
+        rows = to_rows(page.object_list)
+        cache.set(cache_key, rows, DEFAULT_TIMEOUT)
+    page.object_list = rows
+    return page
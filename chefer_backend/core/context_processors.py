@@ -1,9 +1,35 @@
+from functools import lru_cache
+
+from django.core.cache import cache
+from django.utils.functional import SimpleLazyObject
+
+from .caching import DEFAULT_TIMEOUT, versioned_key
 from .models import InstagramImage
+from .records import to_rows
+
+INSTAGRAM_LIMIT = 8
+
+
+@lru_cache(maxsize=4)
+def _instagram_rows(cache_key):
+    # Локальный LRU по версионированному ключу: после смены поколения
+    # ключ меняется, а старая запись вытесняется сама
+    rows = cache.get(cache_key)
+    if rows is None:
+        rows = to_rows(InstagramImage.objects.all()[:INSTAGRAM_LIMIT])
+        cache.set(cache_key, rows, DEFAULT_TIMEOUT)
+    return rows
+
+
+def get_instagram_images():
+    return _instagram_rows(versioned_key(f'instagram_images_{INSTAGRAM_LIMIT}', InstagramImage))
+
 
 def instagram_context(request):
-    instagram_images = InstagramImage.objects.all()[:8]
+    # Лента вычисляется только если шаблон действительно её использует
+    instagram_images = SimpleLazyObject(get_instagram_images)
     instagram_link = "https://www.instagram.com/"
     return {
         'instagram_images': instagram_images,
         'instagram_link': instagram_link,
-    }
\ No newline at end of file
+    }
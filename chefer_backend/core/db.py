@@ -0,0 +1,38 @@
+"""
+Настройка соединений с базой.
+
+Для SQLite при каждом новом соединении выполняются PRAGMA из настройки
+SQLITE_PRAGMAS (порядок важен: journal_mode переключается первым). Другие
+базы не затрагиваются.
+"""
+import logging
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+def apply_sqlite_pragmas(connection, pragmas=None):
+    if connection.vendor != 'sqlite':
+        return
+    pragmas = getattr(settings, 'SQLITE_PRAGMAS', {}) if pragmas is None else pragmas
+    if not pragmas:
+        return
+    with connection.cursor() as cursor:
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+            if name == 'journal_mode':
+                # База в памяти остаётся в режиме memory — это не ошибка
+                mode = cursor.fetchone()[0]
+                if mode.lower() != str(value).lower() and mode != 'memory':
+                    logger.warning(f"SQLite journal_mode is {mode}, requested {value}")
+
+
+def sqlite_pragmas(connection, names):
+    """Текущие значения PRAGMA соединения (для проверок и бенчмарков)."""
+    with connection.cursor() as cursor:
+        values = {}
+        for name in names:
+            cursor.execute(f'PRAGMA {name}')
+            values[name] = cursor.fetchone()[0]
+    return values
@@ -1,5 +1,6 @@
 from django import forms
 from captcha.fields import CaptchaField
+from .captcha_pool import PooledCaptchaTextInput
 from .models import Comment
 class ContactForm(forms.Form):
     name = forms.CharField(
@@ -35,6 +36,7 @@ class ContactForm(forms.Form):
     )
     captcha = CaptchaField(
         label='Security Check',
+        widget=PooledCaptchaTextInput(),
         error_messages={
             'required': 'Please complete the security check',
             'invalid': 'Invalid security check code'
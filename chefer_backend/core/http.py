@@ -0,0 +1,96 @@
+"""
+Общие части раздачи файлов: ETag, условные запросы и диапазоны байт.
+"""
+import os
+import re
+
+from asgiref.sync import sync_to_async
+from django.utils.http import parse_http_date_safe
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+BLOCK_SIZE = 64 * 1024
+
+
+def file_etag(stat):
+    return f'"{int(stat.st_mtime):x}-{stat.st_size:x}"'
+
+
+def is_modified(request, etag, mtime):
+    """False, если у клиента актуальная копия (If-None-Match/If-Modified-Since)."""
+    if_none_match = request.headers.get('If-None-Match')
+    if if_none_match is not None:
+        return etag not in {tag.strip().removeprefix('W/') for tag in if_none_match.split(',')}
+    since = parse_http_date_safe(request.headers.get('If-Modified-Since', ''))
+    return since is None or int(mtime) > since
+
+
+def parse_range(header, size):
+    """(start, end) включительно, None — заголовок не поддерживается, False — диапазон вне файла."""
+    match = RANGE_RE.match(header.strip())
+    if not match or match.groups() == ('', ''):
+        return None
+    first, last = match.groups()
+    if first:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+        if last and int(last) < start:
+            return None
+    else:
+        start, end = max(0, size - int(last)), size - 1
+    if start >= size or size == 0:
+        return False
+    return start, end
+
+
+def requested_range(request, etag, size):
+    """Диапазон из Range с учётом If-Range; None — отдавать файл целиком."""
+    header = request.headers.get('Range')
+    if not header or request.headers.get('If-Range', etag) != etag:
+        return None
+    return parse_range(header, size)
+
+
+class FileRange:
+    """
+    Файл, из которого читается не больше `length` байт начиная с `start`.
+    fileno() остаётся доступным, поэтому wsgi.file_wrapper сервера (gunicorn)
+    отдаёт диапазон через os.sendfile: с текущей позиции, Content-Length байт.
+    """
+
+    def __init__(self, file, start, length):
+        self.file = file
+        self.remaining = length
+        file.seek(start)
+
+    def read(self, size=-1):
+        if self.remaining <= 0:
+            return b''
+        size = self.remaining if size is None or size < 0 else min(size, self.remaining)
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def tell(self):
+        return self.file.tell()
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        return self.file.seek(offset, whence)
+
+    def close(self):
+        self.file.close()
+
+
+async def aiter_file(file, block_size=BLOCK_SIZE):
+    """
+    Асинхронный итератор по файлу для FileResponse под ASGI: синхронный
+    итератор ASGIHandler прочитал бы в память целиком.
+    """
+    read = sync_to_async(file.read, thread_sensitive=False)
+    try:
+        while chunk := await read(block_size):
+            yield chunk
+    finally:
+        file.close()
@@ -0,0 +1,196 @@
+"""
+Производные изображения (responsive derivatives).
+
+После сохранения модели с ImageField фоновый пул потоков создаёт уменьшенные
+копии оригинала нескольких ширин в WebP (и AVIF, если Pillow собран с его
+поддержкой). Имена производных детерминированы:
+
+    derivatives/<путь оригинала без расширения>-<ширина>w.<формат>
+
+Рядом пишется манифест `derivatives/<оригинал>.json` со списком ширин, по
+которому тег `{% srcset %}` строит атрибут srcset. Когда фоновая генерация
+создала производные, поколение модели-владельца сбрасывается (core.caching):
+страницы и фрагменты, закэшированные с пустым srcset, пересобираются.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from urllib.parse import unquote
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps, UnidentifiedImageError, features
+
+from .caching import bump_generation
+
+logger = logging.getLogger(__name__)
+
+DERIVATIVE_ROOT = 'derivatives'
+WIDTHS = tuple(getattr(settings, 'IMAGE_DERIVATIVE_WIDTHS', (320, 640, 1024, 1600)))
+QUALITY = getattr(settings, 'IMAGE_DERIVATIVE_QUALITY', 80)
+WORKERS = getattr(settings, 'IMAGE_DERIVATIVE_WORKERS', 2)
+FORMATS = tuple(fmt for fmt in ('webp', 'avif') if features.check(fmt))
+
+# Манифесты неизменны для данного имени оригинала, поэтому кэшируются без срока,
+# но не больше MANIFEST_CACHE_SIZE последних
+MANIFEST_CACHE_SIZE = getattr(settings, 'IMAGE_MANIFEST_CACHE_SIZE', 2048)
+# Отсутствие манифеста помнится недолго: производные может создать другой процесс
+MISSING_MANIFEST_TTL = getattr(settings, 'IMAGE_MISSING_MANIFEST_TTL', 30)
+
+_executor = ThreadPoolExecutor(max_workers=WORKERS, thread_name_prefix='derivatives')
+# имя оригинала -> (манифест или None, момент истечения по time.monotonic() или None)
+_manifests = OrderedDict()
+_manifests_lock = threading.Lock()
+
+
+def derivative_name(name, width, fmt):
+    base, _ = os.path.splitext(name)
+    return f'{DERIVATIVE_ROOT}/{base}-{width}w.{fmt}'
+
+
+def manifest_name(name):
+    return f'{DERIVATIVE_ROOT}/{name}.json'
+
+
+def image_name(image):
+    """
+    Имя файла в хранилище для ImageFieldFile или для записей из кэша и
+    снимков, у которых есть только `.url`.
+    """
+    if not image:
+        return ''
+    name = getattr(image, 'name', None)
+    if name:
+        return name
+    url = str(getattr(image, 'url', image))
+    if url.startswith(settings.MEDIA_URL):
+        return unquote(url[len(settings.MEDIA_URL):])
+    return ''
+
+
+def _remember(name, manifest, expires=None):
+    with _manifests_lock:
+        _manifests[name] = (manifest, expires)
+        _manifests.move_to_end(name)
+        while len(_manifests) > MANIFEST_CACHE_SIZE:
+            _manifests.popitem(last=False)
+
+
+def _recall(name):
+    """(найдено, манифест) из локального кэша; просроченный промах забывается."""
+    with _manifests_lock:
+        entry = _manifests.get(name)
+        if entry is None:
+            return False, None
+        manifest, expires = entry
+        if expires is not None and expires <= time.monotonic():
+            del _manifests[name]
+            return False, None
+        _manifests.move_to_end(name)
+        return True, manifest
+
+
+def _save(storage, name, content):
+    if storage.exists(name):
+        storage.delete(name)
+    storage.save(name, ContentFile(content))
+
+
+def generate_derivatives(name, storage=default_storage):
+    """
+    Создаёт производные для оригинала `name` и записывает манифест.
+    Возвращает манифест {формат: [ширины]} или None, если файл не картинка.
+    """
+    try:
+        with storage.open(name) as source:
+            image = Image.open(source)
+            image.load()
+    except UnidentifiedImageError as e:
+        logger.warning(f"Cannot build derivatives for {name}: {str(e)}")
+        # Пустой манифест: производных у файла не будет, и страницы с ним
+        # не ждут их (см. derivatives_pending)
+        _save(storage, manifest_name(name), b'{}')
+        _remember(name, {})
+        return None
+    except (FileNotFoundError, OSError) as e:
+        logger.warning(f"Cannot build derivatives for {name}: {str(e)}")
+        return None
+
+    image = ImageOps.exif_transpose(image)
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if 'transparency' in image.info or image.mode in ('LA', 'PA') else 'RGB')
+
+    widths = sorted({width for width in WIDTHS if width < image.width} | {min(image.width, WIDTHS[-1])})
+    manifest = {}
+    for fmt in FORMATS:
+        for width in widths:
+            height = max(1, round(image.height * width / image.width))
+            resized = image if width == image.width else image.resize((width, height), Image.LANCZOS)
+            buffer = BytesIO()
+            resized.save(buffer, format=fmt.upper(), quality=QUALITY)
+            _save(storage, derivative_name(name, width, fmt), buffer.getvalue())
+        manifest[fmt] = widths
+
+    _save(storage, manifest_name(name), json.dumps(manifest).encode())
+    _remember(name, manifest)
+    return manifest
+
+
+def get_manifest(name, storage=default_storage):
+    """Манифест производных или None, если они ещё не созданы."""
+    if not name:
+        return None
+    found, manifest = _recall(name)
+    if found:
+        return manifest
+    path = manifest_name(name)
+    if not storage.exists(path):
+        _remember(name, None, time.monotonic() + MISSING_MANIFEST_TTL)
+        return None
+    with storage.open(path) as f:
+        manifest = json.load(f)
+    _remember(name, manifest)
+    return manifest
+
+
+def ensure_derivatives(name, storage=default_storage, model=None):
+    """
+    Создаёт производные, если их ещё нет. Новые производные меняют srcset
+    в выдаче модели `model`, поэтому её поколение сбрасывается.
+    """
+    if get_manifest(name, storage) is not None:
+        return
+    if generate_derivatives(name, storage) is not None and model is not None:
+        bump_generation(model)
+
+
+def schedule_derivatives(name, model=None):
+    """Ставит генерацию производных в фоновый пул."""
+    if name and FORMATS:
+        _executor.submit(ensure_derivatives, name, model=model)
+
+
+def derivatives_pending(image, storage=default_storage):
+    """
+    True, если производные изображения ещё не созданы: srcset пока пуст,
+    и кэш страницы или фрагмента с ним должен жить недолго.
+    """
+    name = image_name(image)
+    return bool(name and FORMATS) and get_manifest(name, storage) is None
+
+
+def build_srcset(image, fmt='webp', storage=default_storage):
+    """Значение атрибута srcset или пустая строка, если производных нет."""
+    name = image_name(image)
+    manifest = get_manifest(name, storage)
+    if not manifest or fmt not in manifest:
+        return ''
+    return ', '.join(
+        f'{storage.url(derivative_name(name, width, fmt))} {width}w' for width in manifest[fmt]
+    )
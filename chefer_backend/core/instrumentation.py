@@ -0,0 +1,190 @@
+"""
+Метрики запроса: число и время SQL-запросов, самые медленные запросы, время
+рендеринга шаблона и попадания/промахи get_cached_data.
+
+Метрики текущего запроса лежат в contextvar, поэтому собираются и в
+синхронных, и в асинхронных представлениях (asgiref копирует контекст в
+потоки sync_to_async). RequestMetricsMiddleware пишет их одной JSON-строкой
+в логгер `core.requests` и в заголовок Server-Timing. Запросы статики и медиа
+(STATIC_URL, MEDIA_URL) не измеряются: их много, и SQL в них нет.
+"""
+import heapq
+import logging
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.template.backends.django import DjangoTemplates, Template, reraise
+from django.template.exceptions import TemplateDoesNotExist
+
+logger = logging.getLogger('core.requests')
+
+SLOW_QUERIES = getattr(settings, 'REQUEST_METRICS_SLOW_QUERIES', 3)
+SQL_PREVIEW = 300
+
+_current = ContextVar('request_metrics', default=None)
+
+
+class RequestMetrics:
+    __slots__ = ('started', 'queries', 'sql_time', 'slow_queries', 'render_time', 'rendering',
+                 'cache_hits', 'cache_misses')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.sql_time = 0.0
+        self.slow_queries = []  # min-heap (время, sql)
+        self.render_time = 0.0
+        self.rendering = False
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def record_query(self, sql, duration):
+        self.queries += 1
+        self.sql_time += duration
+        entry = (duration, sql[:SQL_PREVIEW])
+        if len(self.slow_queries) < SLOW_QUERIES:
+            heapq.heappush(self.slow_queries, entry)
+        elif duration > self.slow_queries[0][0]:
+            heapq.heapreplace(self.slow_queries, entry)
+
+    def as_dict(self):
+        return {
+            'duration_ms': round((time.perf_counter() - self.started) * 1000, 3),
+            'queries': self.queries,
+            'sql_ms': round(self.sql_time * 1000, 3),
+            'slow_queries': [
+                {'ms': round(duration * 1000, 3), 'sql': sql}
+                for duration, sql in sorted(self.slow_queries, reverse=True)
+            ],
+            'render_ms': round(self.render_time * 1000, 3),
+            'cache_hits': self.cache_hits,
+            'cache_misses': self.cache_misses,
+        }
+
+    def server_timing(self, total_ms):
+        return ', '.join([
+            f'sql;dur={self.sql_time * 1000:.1f};desc="{self.queries} queries"',
+            f'render;dur={self.render_time * 1000:.1f}',
+            f'cache;desc="hit={self.cache_hits} miss={self.cache_misses}"',
+            f'total;dur={total_ms:.1f}',
+        ])
+
+
+def current_metrics():
+    return _current.get()
+
+
+def record_cache_lookup(hit):
+    """Учитывает обращение get_cached_data к кэшу в метриках текущего запроса."""
+    metrics = _current.get()
+    if metrics is not None:
+        if hit:
+            metrics.cache_hits += 1
+        else:
+            metrics.cache_misses += 1
+
+
+def _sql_timer(execute, sql, params, many, context):
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.record_query(sql, time.perf_counter() - started)
+
+
+def install_sql_hook(connection):
+    """Подключает учёт запросов к соединению (однократно)."""
+    if _sql_timer not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_sql_timer)
+
+
+class TimedTemplate(Template):
+    def render(self, context=None, request=None):
+        metrics = _current.get()
+        # Вложенные include рендерятся внутри внешнего шаблона и не считаются отдельно
+        if metrics is None or metrics.rendering:
+            return super().render(context, request)
+        metrics.rendering = True
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            metrics.render_time += time.perf_counter() - started
+            metrics.rendering = False
+
+
+class InstrumentedDjangoTemplates(DjangoTemplates):
+    """Бэкенд DjangoTemplates, который замеряет время рендеринга шаблонов."""
+
+    def from_string(self, template_code):
+        return TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return TimedTemplate(self.engine.get_template(template_name), self)
+        except TemplateDoesNotExist as exc:
+            reraise(exc, self)
+
+
+class RequestMetricsMiddleware:
+    """
+    Должен стоять первым в MIDDLEWARE, чтобы общее время включало все
+    остальные middleware, в том числе ответы из кэша страниц.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+        self.skip_prefixes = tuple(
+            '/' + url.lstrip('/') for url in (settings.STATIC_URL, settings.MEDIA_URL)
+            if url and '//' not in url
+        )
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if request.path_info.startswith(self.skip_prefixes):
+            return self.get_response(request)
+        # Соединения, открытые до подключения сигнала connection_created
+        for connection in connections.all(initialized_only=True):
+            install_sql_hook(connection)
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, metrics)
+
+    async def __acall__(self, request):
+        if request.path_info.startswith(self.skip_prefixes):
+            return await self.get_response(request)
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, metrics)
+
+    def finish(self, request, response, metrics):
+        data = metrics.as_dict()
+        response['Server-Timing'] = metrics.server_timing(data['duration_ms'])
+        match = request.resolver_match
+        data.update({
+            'method': request.method,
+            'path': request.path,
+            'view': match.view_name if match else None,
+            'status': response.status_code,
+        })
+        logger.info('request', extra={'data': data})
+        return response
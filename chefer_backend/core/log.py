@@ -0,0 +1,168 @@
+"""
+Обработчики, фильтры и форматтеры логов.
+
+QueuedHandler кладёт записи в ограниченную очередь, а форматирует и пишет их
+фоновый QueueListener, поэтому поток запроса не ждёт ни диска, ни ротации
+файлов. При переполнении очереди действует политика `overflow`, а число
+потерянных записей сообщается предупреждением, как только в очереди
+появляется место.
+"""
+import atexit
+import itertools
+import json
+import logging
+from logging.handlers import QueueHandler, QueueListener
+from queue import Empty, Full, Queue
+
+from django.utils.module_loading import import_string
+
+OVERFLOW_POLICIES = ('drop_new', 'drop_oldest', 'block')
+
+
+class JsonFormatter(logging.Formatter):
+    """Одна строка JSON на запись; словарь из `extra={'data': ...}` добавляется к полям."""
+
+    def format(self, record):
+        payload = {
+            'time': self.formatTime(record, '%Y-%m-%dT%H:%M:%S'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        payload.update(getattr(record, 'data', {}))
+        if record.exc_info:
+            payload['exc_info'] = self.formatException(record.exc_info)
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
+
+class DebugSamplingFilter(logging.Filter):
+    """Пропускает каждую `every`-ю DEBUG-запись каждого логгера; остальные уровни — все."""
+
+    def __init__(self, every=10):
+        super().__init__()
+        self.every = max(1, int(every))
+        self._counters = {}
+
+    def filter(self, record):
+        if record.levelno != logging.DEBUG or self.every == 1:
+            return True
+        counter = self._counters.get(record.name)
+        if counter is None:
+            counter = self._counters.setdefault(record.name, itertools.count())
+        return next(counter) % self.every == 0
+
+
+class _Listener(QueueListener):
+    def enqueue_sentinel(self):
+        # Маркер конца ждёт места в очереди: писатель её всё равно разгрузит
+        self.queue.put(self._sentinel)
+
+
+def _build_target(spec):
+    spec = dict(spec)
+    handler_class = import_string(spec.pop('class'))
+    level = spec.pop('level', None)
+    handler = handler_class(**spec)
+    if level is not None:
+        handler.setLevel(level)
+    return handler
+
+
+class QueuedHandler(QueueHandler):
+    """
+    QueueHandler с собственным QueueListener.
+
+    Очередь — первый аргумент, как у logging.handlers.QueueHandler.
+    `targets` — описания обработчиков, в которые пишет фоновый поток:
+    словари с ключом `class` и аргументами конструктора, например
+    {'class': 'logging.handlers.RotatingFileHandler', 'filename': ..., 'maxBytes': ...}.
+    Форматтер, назначенный этому обработчику, передаётся целям и применяется
+    в фоновом потоке.
+
+    Политики переполнения: `drop_new` — отбросить новую запись, `drop_oldest`
+    — вытеснить самую старую, `block` — ждать не дольше `block_timeout`
+    секунд и затем отбросить.
+
+    В LOGGING обработчик описывается через фабрику queued_handler
+    (`'()': 'core.log.queued_handler'`): начиная с Python 3.12 dictConfig
+    собирает подклассы QueueHandler из `class` по-своему и требует ключ
+    `handlers` со ссылками на другие обработчики.
+    """
+
+    def __init__(self, queue, targets=(), overflow='drop_new', block_timeout=0.05):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f'Unknown overflow policy {overflow!r}, expected one of {OVERFLOW_POLICIES}')
+        super().__init__(queue)
+        self.overflow = overflow
+        self.block_timeout = block_timeout
+        self.dropped = 0
+        self._reported = 0
+        self.listener = _Listener(self.queue, *(_build_target(spec) for spec in targets),
+                                  respect_handler_level=True)
+        self.listener.start()
+        atexit.register(self.close)
+
+    def setFormatter(self, fmt):
+        # Сама запись в очереди не форматируется: это работа фонового потока
+        for handler in self.listener.handlers:
+            handler.setFormatter(fmt)
+
+    def prepare(self, record):
+        # В отличие от QueueHandler.prepare запись не форматируется здесь:
+        # msg, args и exc_info уходят в очередь как есть, сообщение и
+        # traceback собирает форматтер цели в фоновом потоке
+        return record
+
+    def _put(self, record):
+        if self.overflow == 'block':
+            self.queue.put(record, timeout=self.block_timeout)
+            return
+        try:
+            self.queue.put_nowait(record)
+        except Full:
+            if self.overflow != 'drop_oldest':
+                raise
+            try:
+                self.queue.get_nowait()
+            except Empty:
+                pass
+            else:
+                # Вытесненная запись считается обработанной, иначе flush() не дождётся
+                self.queue.task_done()
+                self.dropped += 1
+            self.queue.put_nowait(record)
+
+    def enqueue(self, record):
+        try:
+            # Отчёт о потерях — только когда в очереди есть место и для него
+            if self.dropped != self._reported and self.queue.qsize() < self.queue.maxsize - 1:
+                self._put(self._dropped_record())
+            self._put(record)
+        except Full:
+            self.dropped += 1
+
+    def _dropped_record(self):
+        lost = self.dropped - self._reported
+        self._reported = self.dropped
+        return logging.makeLogRecord({
+            'name': __name__, 'levelno': logging.WARNING, 'levelname': 'WARNING',
+            'msg': f'Log queue overflow: {lost} records dropped ({self.overflow})',
+        })
+
+    def flush(self):
+        """Дожидается записи всего, что уже в очереди."""
+        if self.listener._thread is not None:
+            # Писатель отмечает каждую запись через task_done()
+            self.queue.join()
+
+    def close(self):
+        if self.listener._thread is not None:
+            self.listener.stop()
+            for handler in self.listener.handlers:
+                handler.close()
+        super().close()
+
+
+def queued_handler(targets, queue_size=10000, overflow='drop_new', block_timeout=0.05):
+    """Фабрика QueuedHandler с ограниченной очередью для `'()'` в LOGGING."""
+    return QueuedHandler(Queue(queue_size), targets, overflow=overflow, block_timeout=block_timeout)
@@ -0,0 +1,197 @@
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.db.backends.signals import connection_created
+from django.test.utils import override_settings
+
+from core.bench import seed_catalog, temporary_database
+from core.models import Dish
+from core.search import get_search_backend
+
+HOST = 'localhost'
+
+
+def _percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def _summary(mode, latencies, errors, elapsed):
+    return {
+        'mode': mode,
+        'requests': len(latencies),
+        'errors': errors,
+        'rps': len(latencies) / elapsed,
+        'p50_ms': _percentile(latencies, 0.50) * 1000,
+        'p95_ms': _percentile(latencies, 0.95) * 1000,
+        'p99_ms': _percentile(latencies, 0.99) * 1000,
+    }
+
+
+def _wsgi_environ(path):
+    path, _, query = path.partition('?')
+    return {
+        'REQUEST_METHOD': 'GET', 'PATH_INFO': path, 'QUERY_STRING': query, 'SCRIPT_NAME': '',
+        'SERVER_NAME': HOST, 'SERVER_PORT': '80', 'HTTP_HOST': HOST, 'SERVER_PROTOCOL': 'HTTP/1.1',
+        'wsgi.version': (1, 0), 'wsgi.url_scheme': 'http', 'wsgi.input': BytesIO(),
+        'wsgi.errors': sys.stderr, 'wsgi.multithread': True, 'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+    }
+
+
+def _asgi_scope(path):
+    path, _, query = path.partition('?')
+    return {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET',
+        'scheme': 'http', 'path': path, 'raw_path': path.encode(), 'query_string': query.encode(),
+        'root_path': '', 'headers': [(b'host', HOST.encode())],
+        'client': ('127.0.0.1', 50000), 'server': (HOST, 80),
+    }
+
+
+def run_wsgi(paths, concurrency):
+    """Пул потоков перед WSGIHandler — как воркер gunicorn с --threads."""
+    handler = WSGIHandler()
+
+    def request(path):
+        status = []
+        started = time.perf_counter()
+        body = b''.join(handler(_wsgi_environ(path), lambda s, headers: status.append(s)))
+        return time.perf_counter() - started, status[0].startswith('200') and bool(body)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(request, paths))
+    return results, time.perf_counter() - started
+
+
+def run_asgi(paths, concurrency):
+    """Один цикл событий перед ASGIHandler — как воркер uvicorn."""
+    handler = ASGIHandler()
+
+    async def request(path, semaphore):
+        async with semaphore:
+            messages = []
+            body = [{'type': 'http.request', 'body': b'', 'more_body': False}]
+
+            async def receive():
+                if body:
+                    return body.pop()
+                # Клиент не отключается: Django отменит ожидание после ответа
+                await asyncio.Event().wait()
+
+            async def send(message):
+                messages.append(message)
+
+            started = time.perf_counter()
+            await handler(_asgi_scope(path), receive, send)
+            status = next(m['status'] for m in messages if m['type'] == 'http.response.start')
+            return time.perf_counter() - started, status == 200
+
+    async def main():
+        semaphore = asyncio.Semaphore(concurrency)
+        return await asyncio.gather(*(request(path, semaphore) for path in paths))
+
+    started = time.perf_counter()
+    results = asyncio.run(main())
+    return results, time.perf_counter() - started
+
+
+class Command(BaseCommand):
+    help = 'Нагрузочное сравнение WSGI (sync views) и ASGI (async views) на публичных страницах'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--mode', choices=('both', 'wsgi', 'asgi'), default='both')
+        parser.add_argument('--requests', type=int, default=600)
+        parser.add_argument('--concurrency', type=int, default=16)
+        parser.add_argument('--items', type=int, default=300)
+        parser.add_argument('--db-latency', type=float, default=0.0,
+                            help='Имитация сетевой задержки базы на каждый запрос, мс')
+        parser.add_argument('--page-cache', action='store_true',
+                            help='Не отключать PageCacheMiddleware (по умолчанию меряются сами представления)')
+        parser.add_argument('--json', action='store_true', help='Вывести результат одной строкой JSON')
+
+    def handle(self, *args, **options):
+        if options['mode'] == 'both':
+            return self._compare(options)
+
+        expected = options['mode'] == 'asgi'
+        if settings.CORE_ASYNC_VIEWS != expected:
+            raise CommandError(f'Run with CORE_ASYNC_VIEWS={int(expected)} for --mode {options["mode"]}')
+        summary = self._run(options)
+        if options['json']:
+            self.stdout.write(json.dumps(summary))
+        else:
+            self._report([summary])
+
+    def _compare(self, options):
+        # Маршруты выбираются при импорте urls, поэтому каждый режим — отдельный процесс
+        summaries = []
+        for mode in ('wsgi', 'asgi'):
+            command = [
+                sys.executable, str(settings.BASE_DIR / 'manage.py'), 'bench_asgi', '--json',
+                '--mode', mode, '--requests', str(options['requests']),
+                '--concurrency', str(options['concurrency']), '--items', str(options['items']),
+                '--db-latency', str(options['db_latency']),
+            ]
+            if options['page_cache']:
+                command.append('--page-cache')
+            env = {**os.environ, 'CORE_ASYNC_VIEWS': '1' if mode == 'asgi' else '0'}
+            output = subprocess.run(command, env=env, check=True, capture_output=True, text=True).stdout
+            summaries.append(json.loads(output.strip().splitlines()[-1]))
+        self._report(summaries)
+
+    def _run(self, options):
+        middleware = list(settings.MIDDLEWARE)
+        if not options['page_cache']:
+            middleware.remove('core.middleware.PageCacheMiddleware')
+        simulated = {'latency': 0.0}
+
+        def slow_execute(execute, sql, params, many, context):
+            if simulated['latency']:
+                time.sleep(simulated['latency'])
+            return execute(sql, params, many, context)
+
+        def install_latency(sender, connection, **kwargs):
+            connection.execute_wrappers.append(slow_execute)
+
+        connection_created.connect(install_latency)
+        try:
+            with temporary_database(), override_settings(MIDDLEWARE=middleware, DEBUG=False):
+                catalog = seed_catalog(items=options['items'])
+                get_search_backend().rebuild()
+                dish_id = Dish.objects.values_list('id', flat=True).first()
+                routes = [
+                    '/', '/menu/', '/menu/?search=salad', '/blog/',
+                    f'/dish/{dish_id}/', f'/dishes/tag/{catalog["tags"][0].name}/',
+                ]
+                paths = [routes[i % len(routes)] for i in range(options['requests'])]
+                runner = run_asgi if options['mode'] == 'asgi' else run_wsgi
+                # Прогрев: снимки меню, кэш выборок, шаблоны
+                runner(routes, 1)
+
+                simulated['latency'] = options['db_latency'] / 1000
+                results, elapsed = runner(paths, options['concurrency'])
+        finally:
+            connection_created.disconnect(install_latency)
+        latencies = [duration for duration, _ in results]
+        errors = sum(1 for _, ok in results if not ok)
+        return _summary(options['mode'], latencies, errors, elapsed)
+
+    def _report(self, summaries):
+        self.stdout.write(f'{"mode":<6} {"requests":>9} {"errors":>7} {"req/s":>8} {"p50, ms":>8} {"p95, ms":>8} {"p99, ms":>8}')
+        for s in summaries:
+            self.stdout.write(
+                f'{s["mode"]:<6} {s["requests"]:>9} {s["errors"]:>7} {s["rps"]:>8.1f} '
+                f'{s["p50_ms"]:>8.1f} {s["p95_ms"]:>8.1f} {s["p99_ms"]:>8.1f}'
+            )
@@ -0,0 +1,83 @@
+import pickle
+import time
+from datetime import datetime, timezone
+
+from django.core.management.base import BaseCommand
+
+from core.models import BlogPost, Feature
+from core.records import BlogPostRow, CachedRows, FeatureRow
+
+
+def _queryset_payload(model_class, instances):
+    """Так get_cached_data кэшировал раньше: вычисленный QuerySet с экземплярами."""
+    queryset = model_class.objects.all()
+    queryset._result_cache = instances
+    queryset._prefetch_done = True
+    return queryset
+
+
+def _feature_instances(count):
+    instances = []
+    for i in range(1, count + 1):
+        feature = Feature(
+            id=i, title=f'Feature {i}', description=f'Feature {i}: ' + 'fresh seasonal produce ' * 5,
+            image=f'features/feature-{i}.png', link=None,
+            discount_title='Main Course Discount', discount=20,
+        )
+        feature._state.adding = False
+        instances.append(feature)
+    return instances
+
+
+def _blog_instances(count):
+    instances = []
+    for i in range(1, count + 1):
+        post = BlogPost(
+            id=i, title=f'Post {i}', content=f'Post {i}. ' + 'Long article body. ' * 200,
+            image=f'blog/post-{i}.jpg', created_at=datetime(2025, 5, 1, tzinfo=timezone.utc),
+            author='Admin',
+        )
+        post._state.adding = False
+        instances.append(post)
+    return instances
+
+
+def _feature_rows(instances):
+    return CachedRows(
+        FeatureRow(f.id, f.title, f.description, f.image.url, f.link, f.discount_title, f.discount)
+        for f in instances
+    )
+
+
+def _blog_rows(instances):
+    return CachedRows(
+        BlogPostRow(p.id, p.title, p.image.url, p.created_at, p.author)
+        for p in instances
+    )
+
+
+class Command(BaseCommand):
+    help = 'Сравнивает размер pickle и время загрузки: QuerySet против компактных записей get_cached_data'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=50, help='Количество записей в кэшируемой выборке')
+        parser.add_argument('--repeat', type=int, default=2000, help='Количество загрузок для замера')
+
+    def handle(self, *args, **options):
+        rows, repeat = options['rows'], options['repeat']
+        cases = [
+            ('Feature', Feature, _feature_instances(rows), _feature_rows),
+            ('BlogPost', BlogPost, _blog_instances(rows), _blog_rows),
+        ]
+        self.stdout.write(f'{"model":<10} {"payload":<10} {"bytes":>10} {"load, us":>10}')
+        for name, model_class, instances, to_rows in cases:
+            for label, payload in (
+                ('queryset', _queryset_payload(model_class, instances)),
+                ('rows', to_rows(instances)),
+            ):
+                blob = pickle.dumps(payload, pickle.HIGHEST_PROTOCOL)
+                started = time.perf_counter()
+                for _ in range(repeat):
+                    pickle.loads(blob)
+                elapsed = (time.perf_counter() - started) / repeat * 1e6
+                self.stdout.write(f'{name:<10} {label:<10} {len(blob):>10} {elapsed:>10.1f}')
@@ -0,0 +1,45 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, reset_queries
+from django.test.utils import CaptureQueriesContext
+
+from core.bench import seed_catalog, temporary_database
+from core.search import SQLiteFTS5SearchBackend, SubstringSearchBackend
+
+QUERIES = ('salad', 'grilled salmon', 'pan', 'spicy beef soup', 'walnut honey')
+
+
+class Command(BaseCommand):
+    help = 'Поиск по меню на синтетическом каталоге: icontains против FTS5'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--items', type=int, default=100_000)
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            self.stderr.write('FTS5 benchmark requires SQLite')
+            return
+        with temporary_database():
+            started = time.perf_counter()
+            catalog = seed_catalog(items=options['items'])
+            fts = SQLiteFTS5SearchBackend()
+            fts.rebuild()
+            self.stdout.write(f'Seeded {options["items"]} menu items in {time.perf_counter() - started:.1f} s')
+
+            menu_id = catalog['menus'][0].id
+            backends = (('icontains', SubstringSearchBackend()), ('fts5', fts))
+            self.stdout.write(f'{"query":<18} {"backend":<10} {"hits":>7} {"queries":>8} {"ms/search":>10}')
+            for query in QUERIES:
+                for label, backend in backends:
+                    with CaptureQueriesContext(connection) as captured:
+                        hits = backend.search(query, menu_id=menu_id)
+                    started = time.perf_counter()
+                    for _ in range(options['repeat']):
+                        backend.search(query, menu_id=menu_id)
+                    elapsed = (time.perf_counter() - started) / options['repeat'] * 1000
+                    self.stdout.write(
+                        f'{query:<18} {label:<10} {len(hits):>7} {len(captured):>8} {elapsed:>10.2f}'
+                    )
+                    reset_queries()
@@ -0,0 +1,71 @@
+import time
+
+from django.core import mail
+from django.core.mail import get_connection, send_mail
+from django.core.mail.backends.locmem import EmailBackend
+from django.core.management.base import BaseCommand
+
+from core.newsletter import deliver_newsletter
+
+BACKEND = 'core.management.commands.bench_newsletter.LatencyEmailBackend'
+
+
+class LatencyEmailBackend(EmailBackend):
+    """
+    locmem-бэкенд с имитацией стоимости установки соединения (как у SMTP:
+    TCP, TLS, AUTH). Задержка задаётся в Command.handle.
+    """
+    connect_latency = 0.0
+
+    def open(self):
+        if getattr(self, '_opened', False):
+            return False
+        time.sleep(self.connect_latency)
+        self._opened = True
+        return True
+
+    def close(self):
+        self._opened = False
+
+    def send_messages(self, messages):
+        new_connection = self.open()
+        try:
+            return super().send_messages(messages)
+        finally:
+            if new_connection:
+                self.close()
+
+
+class Command(BaseCommand):
+    help = 'Пропускная способность рассылки: send_mail на каждого подписчика против deliver_newsletter (locmem)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipients', type=int, default=5000)
+        parser.add_argument('--batch-size', type=int, default=200)
+        parser.add_argument('--workers', type=int, default=4)
+        parser.add_argument('--connect-latency', type=float, default=0.0,
+                            help='Имитация открытия соединения, мс')
+
+    def handle(self, *args, **options):
+        LatencyEmailBackend.connect_latency = options['connect_latency'] / 1000
+        emails = [f'subscriber{i}@example.com' for i in range(options['recipients'])]
+
+        mail.outbox = []
+        started = time.perf_counter()
+        for email in emails:
+            send_mail('Subject', 'Body', 'noreply@chefer.com', [email], connection=get_connection(BACKEND))
+        baseline = time.perf_counter() - started
+        self._report('send_mail per subscriber', len(mail.outbox), baseline)
+
+        mail.outbox = []
+        report = deliver_newsletter(
+            'Subject', 'Body', emails, from_email='noreply@chefer.com', backend=BACKEND,
+            batch_size=options['batch_size'], workers=options['workers'],
+        )
+        self._report(
+            f'deliver_newsletter ({options["workers"]} workers x {options["batch_size"]})',
+            len(mail.outbox), report.elapsed,
+        )
+
+    def _report(self, label, sent, elapsed):
+        self.stdout.write(f'{label:<40} {sent:>7} sent {elapsed:>8.3f} s {sent / elapsed:>10.0f} emails/s')
@@ -0,0 +1,70 @@
+import json
+import statistics
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.http import HttpResponse
+from django.test import RequestFactory
+from django.test.utils import override_settings
+
+from core.ratelimit import check_rate, ratelimit
+
+SCOPE = 'bench'
+
+
+def _view(request):
+    return HttpResponse('ok')
+
+
+def _time_per_call(func, requests, rounds):
+    timings = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        for request in requests:
+            func(request)
+        timings.append((time.perf_counter() - started) / len(requests))
+    return statistics.median(timings) * 1e6
+
+
+class Command(BaseCommand):
+    help = 'Накладные расходы ограничителя частоты (token bucket в кэше) на запрос, мкс'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=5000)
+        parser.add_argument('--rounds', type=int, default=5)
+        parser.add_argument('--json', action='store_true', help='Вывести результат в JSON')
+
+    def handle(self, *args, **options):
+        factory = RequestFactory()
+        count = options['requests']
+        # Лимиты заведомо не достигаются: меряется стоимость проверки, а не отказа
+        limits = {SCOPE: {'ip': f'{count * options["rounds"] * 10}/s', 'email': f'{count * 10}/s'}}
+        same_client = [factory.post('/', {'email': 'guest@example.com'})] * count
+        many_clients = [
+            factory.post('/', {'email': f'guest{i}@example.com'}, REMOTE_ADDR=f'10.{i // 65536 % 256}.{i // 256 % 256}.{i % 256}')
+            for i in range(count)
+        ]
+        limited_view = ratelimit(SCOPE)(_view)
+
+        with override_settings(RATE_LIMITS=limits):
+            cache.clear()
+            results = {
+                'cache': settings.CACHES['default']['BACKEND'],
+                'view_us': _time_per_call(_view, same_client, options['rounds']),
+                'limited_view_us': _time_per_call(limited_view, same_client, options['rounds']),
+                'check_hot_key_us': _time_per_call(lambda r: check_rate(r, SCOPE), same_client, options['rounds']),
+                'check_distinct_keys_us': _time_per_call(
+                    lambda r: check_rate(r, SCOPE), many_clients, options['rounds'],
+                ),
+            }
+            cache.clear()
+        results['overhead_us'] = results['limited_view_us'] - results['view_us']
+
+        if options['json']:
+            self.stdout.write(json.dumps(results))
+            return
+        self.stdout.write(f'cache backend: {results["cache"]}')
+        for name in ('view_us', 'limited_view_us', 'overhead_us', 'check_hot_key_us', 'check_distinct_keys_us'):
+            self.stdout.write(f'{name:<24} {results[name]:>8.1f}')
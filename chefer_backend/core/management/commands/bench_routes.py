@@ -0,0 +1,89 @@
+import json
+import platform
+from datetime import datetime, timezone
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+
+from core.bench import (
+    BASELINE_PATH, EXACT_METRICS, compare_with_baseline, measure_routes, prepare_catalog,
+    seed_catalog, temporary_database,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Число запросов, время и пиковая память для каждого маршрута core.urls '
+        'на синтетическом каталоге; сверка с базовой линией'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--items', type=int, default=1000)
+        parser.add_argument('--menus', type=int, default=3)
+        parser.add_argument('--categories', type=int, default=20)
+        parser.add_argument('--tags', type=int, default=15)
+        parser.add_argument('--posts', type=int, default=50)
+        parser.add_argument('--comments', type=int, default=500)
+        parser.add_argument('--features', type=int, default=3)
+        parser.add_argument('--repeat', type=int, default=5, help='Прогретых запросов на маршрут')
+        parser.add_argument('--baseline', default=str(BASELINE_PATH))
+        parser.add_argument('--tolerance', type=float, default=1.5,
+                            help='Допустимый множитель для времени и памяти')
+        parser.add_argument('--queries-only', action='store_true',
+                            help='Сравнивать только число запросов (время зависит от машины)')
+        parser.add_argument('--update-baseline', action='store_true',
+                            help='Записать результат как новую базовую линию')
+        parser.add_argument('--output', help='Файл для результатов в JSON')
+
+    def handle(self, *args, **options):
+        catalog_options = {
+            key: options[key] for key in ('items', 'menus', 'categories', 'tags', 'posts', 'comments', 'features')
+        }
+        # Страницы с ошибками рендерятся как в рабочем режиме, без отладочной страницы
+        with temporary_database(), override_settings(DEBUG=False):
+            catalog = seed_catalog(**catalog_options)
+            prepare_catalog()
+            results = measure_routes(catalog, repeat=options['repeat'])
+
+        report = {
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'python': platform.python_version(),
+            'catalog': catalog_options,
+            'routes': results,
+        }
+        self._print(results)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(report, f, indent=2)
+
+        if options['update_baseline']:
+            with open(options['baseline'], 'w') as f:
+                json.dump(report, f, indent=2, sort_keys=True)
+                f.write('\n')
+            self.stdout.write(f'Baseline written to {options["baseline"]}')
+            return
+
+        try:
+            with open(options['baseline']) as f:
+                baseline = json.load(f)
+        except FileNotFoundError:
+            raise CommandError(f'No baseline at {options["baseline"]}; run with --update-baseline')
+        metrics = EXACT_METRICS if options['queries_only'] else None
+        violations = compare_with_baseline(
+            results, baseline['routes'], options['tolerance'],
+            **({'metrics': metrics} if metrics else {}),
+        )
+        if violations:
+            raise CommandError('Baseline exceeded:\n  ' + '\n  '.join(violations))
+        self.stdout.write(self.style.SUCCESS('All routes within baseline'))
+
+    def _print(self, results):
+        self.stdout.write(
+            f'{"route":<22} {"status":>6} {"q cold":>7} {"q warm":>7} {"ms":>9} {"peak, KB":>9}'
+        )
+        for name, r in results.items():
+            time_ms = f'{r["time_ms"]:.2f}' if r['time_ms'] is not None else '-'
+            self.stdout.write(
+                f'{name:<22} {r["status"]:>6} {r["queries_cold"]:>7} {r["queries_warm"]:>7} '
+                f'{time_ms:>9} {r["peak_kb"]:>9.1f}'
+            )
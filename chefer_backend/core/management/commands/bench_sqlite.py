@@ -0,0 +1,159 @@
+import json
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connection, connections, transaction
+from django.test.utils import override_settings
+
+from core.bench import seed_catalog, temporary_database
+from core.db import sqlite_pragmas
+from core.models import BlogPost, Comment
+
+# Настройки SQLite по умолчанию: журнал отката, отложенные транзакции, без PRAGMA
+CONFIGS = {
+    'default': {'pragmas': {}, 'options': {}},
+    'tuned': {
+        'pragmas': settings.SQLITE_PRAGMAS,
+        'options': settings.DATABASES['default'].get('OPTIONS', {}),
+    },
+}
+
+
+def _percentile(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def _reader(post_ids, stop, stats):
+    """Чтение как на странице записи блога: запись и страница одобренных комментариев."""
+    latencies, errors, i = [], 0, 0
+    try:
+        while not stop.is_set():
+            post_id = post_ids[i % len(post_ids)]
+            i += 1
+            started = time.perf_counter()
+            try:
+                BlogPost.objects.get(pk=post_id)
+                list(Comment.objects.filter(post_id=post_id, is_approved=True)
+                     .order_by('-created_at')[:20])
+            except OperationalError:
+                errors += 1
+                continue
+            latencies.append(time.perf_counter() - started)
+    finally:
+        connections.close_all()
+    stats.append(('reader', latencies, errors))
+
+
+def _writer(post_ids, stop, stats, number):
+    latencies, errors, i = [], 0, 0
+    try:
+        while not stop.is_set():
+            i += 1
+            started = time.perf_counter()
+            try:
+                with transaction.atomic():
+                    Comment.objects.create(
+                        post_id=post_ids[i % len(post_ids)], name=f'Writer {number}',
+                        email=f'writer{number}@example.com', content='Benchmark comment', is_approved=True,
+                    )
+            except OperationalError:
+                errors += 1
+                continue
+            latencies.append(time.perf_counter() - started)
+    finally:
+        connections.close_all()
+    stats.append(('writer', latencies, errors))
+
+
+class Command(BaseCommand):
+    help = (
+        'Пропускная способность чтения SQLite при параллельной записи комментариев: '
+        'настройки по умолчанию против SQLITE_PRAGMAS'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--config', choices=('both', *CONFIGS), default='both')
+        parser.add_argument('--readers', type=int, default=8)
+        parser.add_argument('--writers', type=int, default=2)
+        parser.add_argument('--duration', type=float, default=5.0, help='Длительность замера, с')
+        parser.add_argument('--posts', type=int, default=50)
+        parser.add_argument('--comments', type=int, default=2000)
+        parser.add_argument('--json', action='store_true', help='Вывести результат в JSON')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            self.stderr.write('bench_sqlite measures SQLite only')
+            return
+        names = CONFIGS if options['config'] == 'both' else [options['config']]
+        summaries = [self._run(name, options) for name in names]
+        if options['json']:
+            self.stdout.write(json.dumps(summaries))
+        else:
+            self._report(summaries)
+
+    def _run(self, name, options):
+        config = CONFIGS[name]
+        db_options = connection.settings_dict['OPTIONS']
+        saved_options = dict(db_options)
+        db_options.clear()
+        db_options.update(config['options'])
+        connections.close_all()
+        try:
+            with tempfile.TemporaryDirectory() as directory, \
+                    override_settings(SQLITE_PRAGMAS=config['pragmas'], DEBUG=False), \
+                    temporary_database(test_name=Path(directory) / 'bench.sqlite3'):
+                catalog = seed_catalog(items=10, posts=options['posts'], comments=options['comments'])
+                pragmas = sqlite_pragmas(connection, ('journal_mode', 'synchronous', 'busy_timeout'))
+                # Потоки открывают собственные соединения к файлу тестовой базы
+                connection.close()
+                post_ids = [post.id for post in catalog['posts']]
+                stats = self._load(post_ids, options)
+        finally:
+            db_options.clear()
+            db_options.update(saved_options)
+            connections.close_all()
+
+        summary = {'config': name, **pragmas, 'duration': options['duration']}
+        for role in ('reader', 'writer'):
+            latencies = [value for kind, values, _ in stats if kind == role for value in values]
+            summary[f'{role}_ops'] = len(latencies) / options['duration']
+            summary[f'{role}_p95_ms'] = _percentile(latencies, 0.95) * 1000
+            summary[f'{role}_errors'] = sum(errors for kind, _, errors in stats if kind == role)
+        return summary
+
+    def _load(self, post_ids, options):
+        stop, stats = threading.Event(), []
+        threads = [
+            threading.Thread(target=_reader, args=(post_ids, stop, stats))
+            for _ in range(options['readers'])
+        ] + [
+            threading.Thread(target=_writer, args=(post_ids, stop, stats, number))
+            for number in range(options['writers'])
+        ]
+        for thread in threads:
+            thread.start()
+        time.sleep(options['duration'])
+        stop.set()
+        for thread in threads:
+            thread.join()
+        return stats
+
+    def _report(self, summaries):
+        self.stdout.write(
+            f'{"config":<8} {"journal":>8} {"sync":>5} {"reads/s":>9} {"read p95":>9} '
+            f'{"writes/s":>9} {"write p95":>10} {"locked":>7}'
+        )
+        for s in summaries:
+            self.stdout.write(
+                f'{s["config"]:<8} {s["journal_mode"]:>8} {s["synchronous"]:>5} '
+                f'{s["reader_ops"]:>9.1f} {s["reader_p95_ms"]:>9.2f} '
+                f'{s["writer_ops"]:>9.1f} {s["writer_p95_ms"]:>10.2f} '
+                f'{s["reader_errors"] + s["writer_errors"]:>7}'
+            )
@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.captcha_pool import fill, pool_low, remove_expired
+
+
+class Command(BaseCommand):
+    help = ('Готовит пачку капч с картинками в кэше и удаляет просроченные капчи '
+            '(пополнение из отдельного процесса имеет смысл с общим кэшем)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size', type=int, default=None, help='Размер пачки (по умолчанию CAPTCHA_POOL_SIZE)')
+        parser.add_argument('--loop', action='store_true', help='Пополнять постоянно, когда пул на исходе')
+        parser.add_argument('--interval', type=float, default=10.0, help='Пауза между проверками в режиме --loop, с')
+
+    def handle(self, *args, **options):
+        while True:
+            deleted = remove_expired()
+            if deleted:
+                self.stdout.write(f'Removed {deleted} expired captchas')
+            if not options['loop'] or pool_low():
+                started = time.perf_counter()
+                batch = fill(options['size'])
+                self.stdout.write(f'Filled captcha batch {batch} in {time.perf_counter() - started:.2f}s')
+            if not options['loop']:
+                return
+            time.sleep(options['interval'])
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+
+from core.export import CHUNK_SIZE, EXPORT_FIELDS, EXPORTERS
+from core.models import ContactMessage, NewsletterSubscriber
+
+MODELS = {
+    'contacts': ContactMessage,
+    'subscribers': NewsletterSubscriber,
+}
+
+
+class Command(BaseCommand):
+    help = 'Потоковая выгрузка сообщений или подписчиков в CSV/JSON без загрузки таблицы в память'
+
+    def add_arguments(self, parser):
+        parser.add_argument('model', choices=MODELS)
+        parser.add_argument('--format', choices=EXPORTERS, default='csv')
+        parser.add_argument('--output', help='Файл для выгрузки (по умолчанию stdout)')
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+        parser.add_argument('--unread', action='store_true', help='Только непрочитанные сообщения')
+
+    def handle(self, *args, **options):
+        model = MODELS[options['model']]
+        queryset = model.objects.order_by('pk')
+        if options['unread'] and model is ContactMessage:
+            queryset = queryset.filter(is_read=False)
+        chunks = EXPORTERS[options['format']](queryset, EXPORT_FIELDS[model], options['chunk_size'])
+        if not options['output']:
+            for chunk in chunks:
+                self.stdout.write(chunk, ending='')
+            return
+        with open(options['output'], 'w', encoding='utf-8', newline='') as f:
+            for chunk in chunks:
+                f.write(chunk)
+        self.stdout.write(f'Exported {options["model"]} to {options["output"]}')
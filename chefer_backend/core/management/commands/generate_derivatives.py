@@ -0,0 +1,33 @@
+from django.apps import apps
+from django.core.management.base import BaseCommand
+from django.db.models import ImageField
+
+from core.caching import bump_generation
+from core.images import generate_derivatives, get_manifest
+
+
+class Command(BaseCommand):
+    help = 'Создаёт производные (ширины, WebP/AVIF) для всех ImageField приложения core'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help='Пересоздать уже существующие производные')
+
+    def handle(self, *args, **options):
+        created = skipped = failed = 0
+        for model in apps.get_app_config('core').get_models():
+            fields = [field.attname for field in model._meta.fields if isinstance(field, ImageField)]
+            if not fields:
+                continue
+            created_before = created
+            for names in model.objects.values_list(*fields).iterator():
+                for name in filter(None, names):
+                    if not options['force'] and get_manifest(name) is not None:
+                        skipped += 1
+                    elif generate_derivatives(name) is None:
+                        failed += 1
+                    else:
+                        created += 1
+            # Закэшированные страницы модели получат новый srcset
+            if created > created_before:
+                bump_generation(model)
+        self.stdout.write(f'created={created} skipped={skipped} failed={failed}')
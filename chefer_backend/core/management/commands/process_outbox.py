@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.outbox import BATCH_SIZE, MAX_ATTEMPTS, drain
+
+
+class Command(BaseCommand):
+    help = 'Отправляет письма из очереди OutboundEmail (с повторами и dead letters)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+        parser.add_argument('--max-attempts', type=int, default=MAX_ATTEMPTS)
+        parser.add_argument('--loop', action='store_true', help='Работать постоянно, опрашивая очередь')
+        parser.add_argument('--sleep', type=float, default=2.0, help='Пауза между опросами в режиме --loop, с')
+
+    def handle(self, *args, **options):
+        while True:
+            stats = drain(options['batch_size'], options['max_attempts'])
+            if stats.claimed:
+                self.stdout.write(
+                    f'claimed={stats.claimed} sent={stats.sent} retried={stats.retried} dead={stats.dead}'
+                )
+            if not options['loop']:
+                return
+            time.sleep(options['sleep'])
@@ -0,0 +1,29 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.replication import data_version, replicate
+from core.routers import replicas
+
+
+class Command(BaseCommand):
+    help = 'Копирует основную базу SQLite в реплики из DATABASE_REPLICAS (замена репликации для разработки)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help='Копировать постоянно, после новых коммитов')
+        parser.add_argument('--interval', type=float, default=1.0,
+                            help='Пауза между проверками в режиме --loop (задаёт отставание реплик), с')
+
+    def handle(self, *args, **options):
+        if not replicas():
+            raise CommandError('No replicas configured: set DATABASE_REPLICAS, e.g. DATABASE_REPLICAS=replica1')
+        version = None
+        while True:
+            current = data_version()
+            if current != version:
+                aliases = replicate()
+                version = current
+                self.stdout.write(f'Replicated to {", ".join(aliases)}')
+            if not options['loop']:
+                return
+            time.sleep(options['interval'])
@@ -0,0 +1,108 @@
+"""
+Раздача файлов из MEDIA_ROOT.
+
+Режим задаёт настройка MEDIA_SERVE_BACKEND:
+- 'nginx' — ответ с заголовком X-Accel-Redirect на внутренний location
+  MEDIA_ACCEL_PREFIX; файл, диапазоны и условные запросы обслуживает nginx;
+- 'sendfile' — заголовок X-Sendfile с абсолютным путём (Apache mod_xsendfile,
+  lighttpd);
+- 'python' — FileResponse. Сервер с wsgi.file_wrapper (gunicorn) отдаёт
+  его через os.sendfile без чтения файла в Python, включая диапазоны байт.
+  ETag, If-None-Match/If-Modified-Since и Range обрабатываются здесь.
+
+Пример для nginx:
+
+    location /protected-media/ {
+        internal;
+        alias /srv/chefer/media/;
+    }
+"""
+import mimetypes
+import os
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured, SuspiciousFileOperation
+from django.core.handlers.asgi import ASGIRequest
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseNotModified
+from django.utils._os import safe_join
+from django.utils.http import http_date
+from django.views.decorators.http import require_safe
+
+from .http import BLOCK_SIZE, FileRange, aiter_file, file_etag, is_modified, requested_range
+
+BACKENDS = ('python', 'nginx', 'sendfile')
+
+
+def _content_type(path):
+    content_type, encoding = mimetypes.guess_type(path)
+    # .gz и подобные отдаются как есть, без Content-Encoding
+    return 'application/octet-stream' if encoding or not content_type else content_type
+
+
+def _resolve(path):
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+    except SuspiciousFileOperation:
+        raise Http404('Invalid media path')
+    if not os.path.isfile(full_path):
+        raise Http404('Media file not found')
+    return full_path
+
+
+@require_safe
+def serve_media(request, path):
+    full_path = _resolve(path)
+    content_type = _content_type(full_path)
+    backend = settings.MEDIA_SERVE_BACKEND
+
+    if backend == 'nginx':
+        response = HttpResponse(content_type=content_type)
+        response['X-Accel-Redirect'] = settings.MEDIA_ACCEL_PREFIX + quote(path)
+    elif backend == 'sendfile':
+        response = HttpResponse(content_type=content_type)
+        response['X-Sendfile'] = full_path
+    elif backend == 'python':
+        response = _file_response(request, full_path, content_type)
+    else:
+        raise ImproperlyConfigured(f'MEDIA_SERVE_BACKEND must be one of {BACKENDS}, got {backend!r}')
+    response['Cache-Control'] = f'public, max-age={settings.MEDIA_MAX_AGE}'
+    return response
+
+
+def _file_response(request, full_path, content_type):
+    stat = os.stat(full_path)
+    etag = file_etag(stat)
+    if not is_modified(request, etag, stat.st_mtime):
+        response = HttpResponseNotModified()
+        response['ETag'] = etag
+        return response
+
+    byte_range = requested_range(request, etag, stat.st_size)
+    if byte_range is False:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{stat.st_size}'
+        return response
+    start, end = byte_range or (0, stat.st_size - 1)
+    length = max(0, end - start + 1)
+    status = 206 if byte_range else 200
+
+    if request.method == 'HEAD':
+        response = HttpResponse(status=status, content_type=content_type)
+    else:
+        file = open(full_path, 'rb')
+        if byte_range:
+            file = FileRange(file, start, length)
+        if isinstance(request, ASGIRequest):
+            response = FileResponse(status=status, content_type=content_type)
+            response.streaming_content = aiter_file(file)
+        else:
+            response = FileResponse(file, status=status, content_type=content_type)
+            response.block_size = BLOCK_SIZE
+    response['Content-Length'] = length
+    if byte_range:
+        response['Content-Range'] = f'bytes {start}-{end}/{stat.st_size}'
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(stat.st_mtime)
+    response['Accept-Ranges'] = 'bytes'
+    return response
@@ -0,0 +1,139 @@
+"""
+Кэш целых страниц для анонимных GET-запросов.
+
+Страница кэшируется под ключом, включающим поколения моделей, от которых она
+зависит (см. PAGE_CACHE_DEPENDENCIES), и только те параметры запроса, которые
+читает её представление (PAGE_CACHE_QUERY_PARAMS). Сигналы сбрасывают поколение при
+изменении модели, поэтому правка, например, BlogPost делает недоступными
+ровно те страницы, которые показывают посты. Те же модели перечисляются в
+заголовке `Surrogate-Key` для очистки на стороне CDN.
+
+Страница, собранная до появления производных её изображений (пустой srcset,
+см. core.images), хранится не дольше IMAGE_MISSING_MANIFEST_TTL.
+
+CSRF-токен в формах не кэшируется: перед сохранением он заменяется меткой,
+а при выдаче подставляется токен текущего посетителя.
+"""
+import hashlib
+import re
+import time
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.middleware.csrf import get_token
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+from django.utils.http import http_date
+
+from .caching import DEFAULT_TIMEOUT, query_key, versioned_key
+from .images import MISSING_MANIFEST_TTL
+from .routers import is_primary_pinned
+from .staticfiles import static_version
+
+# Имя URL -> модели, от которых зависит страница. Лента Instagram есть на всех.
+PAGE_CACHE_DEPENDENCIES = getattr(settings, 'PAGE_CACHE_DEPENDENCIES', {
+    'index': (
+        'core.Feature', 'core.Testimonial', 'core.TeamMember', 'core.BlogPost', 'core.Chef',
+        'core.Category', 'core.Menu', 'core.MenuItem', 'core.Dish', 'core.Tag', 'core.InstagramImage',
+    ),
+    'blog': ('core.BlogPost', 'core.InstagramImage'),
+    'team': ('core.TeamMember', 'core.Chef', 'core.InstagramImage'),
+    'about': ('core.Chef', 'core.Feature', 'core.InstagramImage'),
+})
+
+# Имя URL -> параметры запроса, которые читает представление страницы; с
+# любыми другими (?utm_source=... и т.п.) отдаётся та же запись кэша.
+# Страницы из PAGE_CACHE_DEPENDENCIES параметров не читают: index всегда
+# показывает первое меню, а переход по меню и страницам ведёт на /menu/
+PAGE_CACHE_QUERY_PARAMS = getattr(settings, 'PAGE_CACHE_QUERY_PARAMS', {})
+
+CSRF_PLACEHOLDER = b'__PAGE_CACHE_CSRF_TOKEN__'
+CSRF_INPUT_RE = re.compile(rb'(name="csrfmiddlewaretoken" value=")[^"]*(")')
+
+
+class PageCacheMiddleware(MiddlewareMixin):
+    """
+    Должен стоять после AuthenticationMiddleware и MessageMiddleware.
+    MiddlewareMixin делает его пригодным и для WSGI, и для ASGI.
+    """
+
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        self.dependencies = {
+            url_name: tuple(apps.get_model(label) for label in labels)
+            for url_name, labels in PAGE_CACHE_DEPENDENCIES.items()
+        }
+
+    def process_response(self, request, response):
+        key = getattr(request, '_page_cache_key', None)
+        if key and self._storable(response):
+            self._store(request, key, response)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        url_name = getattr(request.resolver_match, 'url_name', None)
+        models = self.dependencies.get(url_name)
+        if not models or not self._cacheable(request):
+            return None
+        query = query_key(request, PAGE_CACHE_QUERY_PARAMS.get(url_name, ()))
+        # Ссылки на статику в странице зависят от манифеста collectstatic
+        key = versioned_key(f'page:{static_version()}:{request.get_host()}:{request.path}?{query}', *models)
+        entry = cache.get(key)
+        if entry is None:
+            request._page_cache_key = key
+            request._page_cache_models = models
+            return None
+
+        response = HttpResponse(
+            entry['content'].replace(CSRF_PLACEHOLDER, get_token(request).encode()),
+            content_type=entry['content_type'],
+        )
+        self._set_validators(response, entry['etag'], entry['last_modified'], models)
+        response['X-Page-Cache'] = 'hit'
+        return get_conditional_response(
+            request, etag=entry['etag'], last_modified=entry['last_modified'], response=response,
+        )
+
+    def _cacheable(self, request):
+        return (
+            request.method in ('GET', 'HEAD')
+            # Отложенные сообщения и сессия делают страницу персональной
+            and 'messages' not in request.COOKIES
+            and settings.SESSION_COOKIE_NAME not in request.COOKIES
+            and not request.user.is_authenticated
+            # Сразу после записи страница собирается из основной базы, мимо кэша
+            and not is_primary_pinned()
+        )
+
+    def _storable(self, response):
+        return (
+            response.status_code == 200
+            and not response.streaming
+            and not response.cookies
+            and 'no-store' not in response.get('Cache-Control', '')
+        )
+
+    def _store(self, request, key, response):
+        content = CSRF_INPUT_RE.sub(rb'\g<1>' + CSRF_PLACEHOLDER + rb'\g<2>', response.content)
+        etag = 'W/"%s"' % hashlib.md5(content).hexdigest()
+        last_modified = int(time.time())
+        # Производные ещё создаются: страница скоро изменится
+        timeout = MISSING_MANIFEST_TTL if getattr(request, 'pending_derivatives', 0) else DEFAULT_TIMEOUT
+        cache.set(key, {
+            'content': content,
+            'content_type': response['Content-Type'],
+            'etag': etag,
+            'last_modified': last_modified,
+        }, timeout)
+        self._set_validators(response, etag, last_modified, request._page_cache_models)
+        response['X-Page-Cache'] = 'miss'
+
+    def _set_validators(self, response, etag, last_modified, models):
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        response['Surrogate-Key'] = ' '.join(model._meta.label_lower for model in models)
+        # Страница содержит CSRF-токен посетителя: кэши должны перепроверять её
+        patch_cache_control(response, no_cache=True)
+        patch_vary_headers(response, ('Cookie',))
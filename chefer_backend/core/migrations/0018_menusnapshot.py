@@ -0,0 +1,22 @@
+# Generated by Django 5.2 on 2026-10-18 19:38
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0017_menuitem_menu'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MenuSnapshot',
+            fields=[
+                ('menu', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='snapshot', serialize=False, to='core.menu')),
+                ('payload', models.JSONField(default=dict)),
+                ('built_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
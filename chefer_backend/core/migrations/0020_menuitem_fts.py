@@ -0,0 +1,37 @@
+from django.db import migrations
+
+FTS_TABLE = 'core_menuitem_fts'
+
+
+def create_fts_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+        "menu_id UNINDEXED, dish_name, title, dish_description, description, category_name, "
+        "prefix='2 3 4')"
+    )
+    schema_editor.execute(
+        f"INSERT INTO {FTS_TABLE} (rowid, menu_id, dish_name, title, dish_description, description, category_name) "
+        "SELECT mi.id, d.menu_id, COALESCE(d.name, ''), mi.title, COALESCE(d.description, ''), mi.description, c.name "
+        "FROM core_menuitem mi "
+        "JOIN core_category c ON c.id = mi.category_id "
+        "LEFT JOIN core_dish d ON d.id = mi.dish_id"
+    )
+
+
+def drop_fts_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0019_outboundemail'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_fts_index, drop_fts_index),
+    ]
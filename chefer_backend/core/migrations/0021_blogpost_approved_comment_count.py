@@ -0,0 +1,28 @@
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_counts(apps, schema_editor):
+    BlogPost = apps.get_model('core', 'BlogPost')
+    Comment = apps.get_model('core', 'Comment')
+    approved = Comment.objects.filter(
+        post=OuterRef('pk'), is_approved=True,
+    ).order_by().values('post').annotate(total=Count('pk')).values('total')
+    BlogPost.objects.update(approved_comment_count=Coalesce(Subquery(approved), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0020_menuitem_fts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='blogpost',
+            name='approved_comment_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_counts, migrations.RunPython.noop),
+    ]
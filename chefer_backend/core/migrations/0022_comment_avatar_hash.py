@@ -0,0 +1,34 @@
+import hashlib
+
+from django.db import migrations, models
+
+
+BATCH_SIZE = 1000
+
+
+def backfill_avatar_hashes(apps, schema_editor):
+    Comment = apps.get_model('core', 'Comment')
+    # Порции по диапазонам pk: каждая прочитана целиком до записи, и курсор
+    # по таблице не остаётся открытым во время bulk_update
+    last_pk = 0
+    while batch := list(Comment.objects.only('id', 'email').filter(pk__gt=last_pk).order_by('pk')[:BATCH_SIZE]):
+        for comment in batch:
+            comment.avatar_hash = hashlib.md5(comment.email.strip().lower().encode('utf-8')).hexdigest()
+        Comment.objects.bulk_update(batch, ['avatar_hash'])
+        last_pk = batch[-1].pk
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0021_blogpost_approved_comment_count'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='avatar_hash',
+            field=models.CharField(blank=True, editable=False, max_length=32),
+        ),
+        migrations.RunPython(backfill_avatar_hashes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-18 20:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0023_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='outboundemail',
+            name='newsletter_job',
+            field=models.CharField(blank=True, db_index=True, max_length=32),
+        ),
+    ]
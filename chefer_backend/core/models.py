@@ -1,6 +1,8 @@
 import hashlib
+from functools import lru_cache
 from django.db import models
 from django.contrib.auth.models import User
+from django.utils import timezone
 
 class Chef(models.Model):
     name = models.CharField(max_length=100)
@@ -58,10 +60,17 @@ class BlogPost(models.Model):
     image = models.ImageField(upload_to='blog/')
     created_at = models.DateTimeField(auto_now_add=True)
     author = models.CharField(max_length=100, default='Admin')
+    # Поддерживается сигналами Comment и действиями CommentAdmin (core.comments)
+    approved_comment_count = models.PositiveIntegerField(default=0, editable=False)
 
     def __str__(self):
         return self.title
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['-created_at'], name='blogpost_created_idx'),
+        ]
+
 
 class Category(models.Model):
     name = models.CharField(max_length=50)
@@ -87,6 +96,22 @@ class MenuItem(models.Model):
     def __str__(self):
         return f"{self.title} ({self.category.name})"
 
+    class Meta:
+        indexes = [
+            # Пункты категории с переходом к блюду (и меню блюда) без обращения к таблице
+            models.Index(fields=['category', 'dish'], name='menuitem_category_dish_idx'),
+        ]
+
+
+class MenuSnapshot(models.Model):
+    """Материализованное представление меню для страниц `menu` и `index`."""
+    menu = models.OneToOneField(Menu, on_delete=models.CASCADE, primary_key=True, related_name='snapshot')
+    payload = models.JSONField(default=dict)
+    built_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Snapshot of {self.menu_id}"
+
 
 class Testimonial(models.Model):
     client_name = models.CharField(max_length=100)
@@ -135,16 +160,88 @@ class ContactMessage(models.Model):
         ordering = ['-created_at']
         verbose_name = 'Contact Message'
         verbose_name_plural = 'Contact Messages'
+        indexes = [
+            # Список в админке: сортировка по дате и фильтр непрочитанных
+            models.Index(fields=['-created_at'], name='contact_created_idx'),
+            models.Index(
+                fields=['-created_at'], name='contact_unread_idx',
+                condition=models.Q(is_read=False),
+            ),
+        ]
         
 
+class OutboundEmail(models.Model):
+    """Очередь исходящих писем, которую разбирает команда `process_outbox`."""
+    STATUS_PENDING = 'pending'
+    STATUS_SENT = 'sent'
+    STATUS_DEAD = 'dead'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_SENT, 'Sent'),
+        (STATUS_DEAD, 'Dead'),
+    ]
+
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    from_email = models.EmailField()
+    to_email = models.EmailField()
+    contact_message = models.ForeignKey(ContactMessage, on_delete=models.SET_NULL, null=True, blank=True, related_name='outbound_emails')
+    # Идентификатор рассылки (core.newsletter.start_delivery), по нему считается прогресс
+    newsletter_job = models.CharField(max_length=32, blank=True, db_index=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    claimed_by = models.CharField(max_length=32, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.subject} -> {self.to_email} ({self.status})"
+
+    class Meta:
+        ordering = ['next_attempt_at']
+        verbose_name = 'Outbound Email'
+        verbose_name_plural = 'Outbound Emails'
+        indexes = [
+            # claim_batch выбирает только ожидающие письма, которым пора уйти
+            models.Index(
+                fields=['next_attempt_at'], name='outbox_pending_idx',
+                condition=models.Q(status='pending'),
+            ),
+        ]
+
+
 class NewsletterSubscriber(models.Model):
     email = models.EmailField(unique=True)
     subscribed_at = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
         return self.email
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-subscribed_at'], name='subscriber_subscribed_idx'),
+        ]
     
 
+GRAVATAR_URL = 'https://www.gravatar.com/avatar/'
+
+
+def gravatar_hash(email):
+    return hashlib.md5(email.strip().lower().encode('utf-8')).hexdigest()
+
+
+@lru_cache(maxsize=32)
+def _gravatar_query(size):
+    return f'?s={size}&d=identicon'
+
+
+def gravatar_url(avatar_hash, size=50):
+    """URL аватара по сохранённому хешу; строка параметров для размера кэшируется."""
+    return GRAVATAR_URL + avatar_hash + _gravatar_query(size)
+
+
 class Comment(models.Model):
     post = models.ForeignKey(BlogPost, on_delete=models.CASCADE, related_name='comments')
     name = models.CharField(max_length=100)
@@ -152,14 +249,34 @@ class Comment(models.Model):
     content = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
     is_approved = models.BooleanField(default=False)
-    
+    # MD5 нормализованного email для Gravatar, вычисляется при сохранении
+    avatar_hash = models.CharField(max_length=32, blank=True, editable=False)
+
+    def save(self, *args, **kwargs):
+        self.avatar_hash = gravatar_hash(self.email)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'email' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'avatar_hash'}
+        super().save(*args, **kwargs)
+
     def get_gravatar_url(self, size=50):
-        email = self.email.strip().lower().encode('utf-8')
-        hash = hashlib.md5(email).hexdigest()
-        return f"https://www.gravatar.com/avatar/{hash}?s={size}&d=identicon"
+        return gravatar_url(self.avatar_hash or gravatar_hash(self.email), size)
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Страница одобренных комментариев поста и пересчёт их числа
+            models.Index(
+                fields=['post', '-created_at'], name='comment_approved_post_idx',
+                condition=models.Q(is_approved=True),
+            ),
+            # Очередь модерации в админке: неодобренные по дате. Булевы условия
+            # SQLite не ищет по обычному индексу, поэтому индекс частичный
+            models.Index(
+                fields=['-created_at'], name='comment_pending_idx',
+                condition=models.Q(is_approved=False),
+            ),
+        ]
 
     def __str__(self):
         return f'Comment by {self.name} on {self.post.title}'
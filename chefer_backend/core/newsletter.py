@@ -0,0 +1,171 @@
+"""
+Пакетная рассылка писем подписчикам.
+
+Подписчики читаются из базы порциями. Фоновая рассылка (start_delivery)
+ставит письма в очередь исходящих писем (core.outbox) одним bulk_create на
+порцию: отправляет их `process_outbox` с арендой, повторами и dead letters,
+так что перезапуск веб-процесса рассылку не прерывает, а прогресс по
+статусам писем виден из любого процесса.
+
+Синхронная рассылка (deliver_newsletter) отправляет каждую порцию через одно
+соединение почтового бэкенда, порции обрабатываются ограниченным пулом
+потоков, а прогресс доступен через callback.
+"""
+import itertools
+import logging
+import threading
+import time
+import uuid
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import asdict, dataclass, field
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.db.models import Count, Max, Min
+
+from .models import OutboundEmail
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = getattr(settings, 'NEWSLETTER_BATCH_SIZE', 200)
+WORKERS = getattr(settings, 'NEWSLETTER_WORKERS', 4)
+
+
+@dataclass
+class DeliveryReport:
+    total: int = 0
+    sent: int = 0
+    failed: int = 0
+    batches: int = 0
+    started_at: float = field(default_factory=time.perf_counter)
+    finished: bool = False
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.started_at
+
+    @property
+    def throughput(self):
+        """Писем в секунду."""
+        elapsed = self.elapsed
+        return self.sent / elapsed if elapsed else 0.0
+
+    def as_dict(self):
+        data = asdict(self)
+        data.pop('started_at')
+        data['elapsed'] = round(self.elapsed, 3)
+        data['throughput'] = round(self.throughput, 1)
+        return data
+
+
+def iter_batches(recipients, batch_size=BATCH_SIZE):
+    """
+    Разбивает адреса на порции. QuerySet читается через iterator(), поэтому
+    весь список подписчиков не загружается в память.
+    """
+    if hasattr(recipients, 'values_list'):
+        recipients = recipients.order_by('pk').values_list('email', flat=True).iterator(chunk_size=batch_size)
+    iterator = iter(recipients)
+    while batch := list(itertools.islice(iterator, batch_size)):
+        yield batch
+
+
+def send_batch(subject, message, from_email, emails, backend=None):
+    """
+    Отправляет порцию писем через одно соединение. Возвращает число
+    отправленных: ошибка на одном адресе не отменяет уже отправленные.
+    """
+    sent = 0
+    with get_connection(backend) as connection:
+        for email in emails:
+            try:
+                sent += connection.send_messages([EmailMessage(subject, message, from_email, [email])]) or 0
+            except Exception as e:
+                logger.warning(f"Newsletter: failed to send to {email}: {str(e)}")
+    return sent
+
+
+def deliver_newsletter(subject, message, recipients, from_email=None, batch_size=BATCH_SIZE,
+                       workers=WORKERS, backend=None, progress=None):
+    """
+    Рассылает письмо всем адресам из `recipients` (QuerySet подписчиков или
+    итерируемое адресов) и возвращает DeliveryReport.
+
+    В пул одновременно отдаётся не больше `workers * 2` порций, так что
+    чтение из базы не убегает вперёд отправки. `progress(report)` вызывается
+    после каждой завершённой порции.
+    """
+    from_email = from_email or settings.DEFAULT_FROM_EMAIL
+    report = DeliveryReport()
+    lock = threading.Lock()
+
+    def run(emails):
+        try:
+            sent = send_batch(subject, message, from_email, emails, backend)
+        except Exception as e:
+            logger.error(f"Newsletter batch of {len(emails)} failed: {str(e)}", exc_info=True)
+            sent = 0
+        with lock:
+            report.sent += sent
+            report.failed += len(emails) - sent
+            report.batches += 1
+            if progress:
+                progress(report)
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        pending = set()
+        for emails in iter_batches(recipients, batch_size):
+            report.total += len(emails)
+            pending.add(pool.submit(run, emails))
+            if len(pending) >= workers * 2:
+                _, pending = wait(pending, return_when=FIRST_COMPLETED)
+        wait(pending)
+
+    report.finished = True
+    if progress:
+        progress(report)
+    logger.info(f"Newsletter delivered: {report.as_dict()}")
+    return report
+
+
+def start_delivery(subject, message, recipients, from_email=None, batch_size=BATCH_SIZE):
+    """
+    Ставит рассылку в очередь OutboundEmail и возвращает её идентификатор.
+    Письма отправляет `manage.py process_outbox --loop`.
+    """
+    job_id = uuid.uuid4().hex
+    from_email = from_email or settings.DEFAULT_FROM_EMAIL
+    with transaction.atomic():
+        for emails in iter_batches(recipients, batch_size):
+            OutboundEmail.objects.bulk_create([
+                OutboundEmail(subject=subject, body=message, from_email=from_email, to_email=email,
+                              newsletter_job=job_id)
+                for email in emails
+            ])
+    return job_id
+
+
+def get_delivery_progress(job_id):
+    """
+    Прогресс рассылки по статусам её писем в очереди, в тех же полях, что
+    DeliveryReport.as_dict(); None, если рассылки нет.
+    """
+    emails = OutboundEmail.objects.filter(newsletter_job=job_id)
+    counts = dict(emails.order_by().values_list('status').annotate(count=Count('id')))
+    if not counts:
+        return None
+    total = sum(counts.values())
+    sent = counts.get(OutboundEmail.STATUS_SENT, 0)
+    failed = counts.get(OutboundEmail.STATUS_DEAD, 0)
+    span = emails.aggregate(started=Min('created_at'), last_sent=Max('sent_at'))
+    elapsed = (span['last_sent'] - span['started']).total_seconds() if span['last_sent'] else 0.0
+    return {
+        'total': total,
+        'sent': sent,
+        'failed': failed,
+        'pending': total - sent - failed,
+        'finished': sent + failed == total,
+        'elapsed': round(elapsed, 3),
+        'throughput': round(sent / elapsed, 1) if elapsed else 0.0,
+    }
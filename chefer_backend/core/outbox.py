@@ -0,0 +1,134 @@
+"""
+Очередь исходящих писем (transactional outbox).
+
+Представления только записывают письма в `OutboundEmail` в той же
+транзакции, что и основные данные. Отправкой занимается команда
+`process_outbox`: она захватывает порцию писем, отправляет её через одно
+соединение, повторяет неудачные попытки с экспоненциальной задержкой и
+переводит письма в статус `dead` после исчерпания попыток.
+"""
+import logging
+import uuid
+from dataclasses import dataclass
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.utils import timezone
+
+from .models import OutboundEmail
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = getattr(settings, 'OUTBOX_BATCH_SIZE', 50)
+MAX_ATTEMPTS = getattr(settings, 'OUTBOX_MAX_ATTEMPTS', 5)
+RETRY_BASE = getattr(settings, 'OUTBOX_RETRY_BASE', 30)
+RETRY_MAX = getattr(settings, 'OUTBOX_RETRY_MAX', 60 * 60)
+# Захваченная порция снова станет доступной, если обработчик упадёт
+LEASE = timedelta(seconds=getattr(settings, 'OUTBOX_LEASE', 5 * 60))
+
+
+@dataclass
+class OutboxStats:
+    claimed: int = 0
+    sent: int = 0
+    retried: int = 0
+    dead: int = 0
+
+
+def enqueue_email(subject, body, to_email, from_email=None, contact_message=None):
+    """Ставит письмо в очередь. Вызывается внутри транзакции представления."""
+    return OutboundEmail.objects.create(
+        subject=subject,
+        body=body,
+        from_email=from_email or settings.DEFAULT_FROM_EMAIL,
+        to_email=to_email,
+        contact_message=contact_message,
+    )
+
+
+def retry_delay(attempts):
+    """Экспоненциальная задержка перед следующей попыткой, в секундах."""
+    return min(RETRY_BASE * 2 ** (attempts - 1), RETRY_MAX)
+
+
+def claim_batch(batch_size=BATCH_SIZE):
+    """
+    Захватывает порцию готовых к отправке писем: помечает их токеном и
+    сдвигает next_attempt_at на время аренды, чтобы параллельный обработчик
+    их не взял.
+    """
+    now = timezone.now()
+    ids = list(
+        OutboundEmail.objects.filter(
+            status=OutboundEmail.STATUS_PENDING, next_attempt_at__lte=now,
+        ).order_by('next_attempt_at', 'id').values_list('id', flat=True)[:batch_size]
+    )
+    if not ids:
+        return []
+    token = uuid.uuid4().hex
+    OutboundEmail.objects.filter(
+        id__in=ids, status=OutboundEmail.STATUS_PENDING, next_attempt_at__lte=now,
+    ).update(claimed_by=token, next_attempt_at=now + LEASE)
+    return list(OutboundEmail.objects.filter(claimed_by=token))
+
+
+def process_batch(batch_size=BATCH_SIZE, max_attempts=MAX_ATTEMPTS):
+    """Отправляет одну порцию писем и возвращает OutboxStats."""
+    stats = OutboxStats()
+    batch = claim_batch(batch_size)
+    stats.claimed = len(batch)
+    if not batch:
+        return stats
+
+    sent, failed = [], []
+    try:
+        connection = get_connection()
+        connection.open()
+    except Exception as e:
+        logger.error(f"Outbox: cannot open mail connection: {str(e)}", exc_info=True)
+        failed = [(email, str(e)) for email in batch]
+    else:
+        with connection:
+            for email in batch:
+                message = EmailMessage(email.subject, email.body, email.from_email, [email.to_email])
+                try:
+                    connection.send_messages([message])
+                except Exception as e:
+                    logger.warning(f"Outbox: failed to send email {email.id} to {email.to_email}: {str(e)}")
+                    failed.append((email, str(e)))
+                else:
+                    sent.append(email.id)
+
+    now = timezone.now()
+    if sent:
+        OutboundEmail.objects.filter(id__in=sent).update(
+            status=OutboundEmail.STATUS_SENT, sent_at=now, claimed_by='', last_error='',
+        )
+        stats.sent = len(sent)
+    for email, error in failed:
+        email.attempts += 1
+        email.last_error = error
+        email.claimed_by = ''
+        if email.attempts >= max_attempts:
+            email.status = OutboundEmail.STATUS_DEAD
+            stats.dead += 1
+            logger.error(f"Outbox: email {email.id} to {email.to_email} moved to dead letters after {email.attempts} attempts")
+        else:
+            email.next_attempt_at = now + timedelta(seconds=retry_delay(email.attempts))
+            stats.retried += 1
+        email.save(update_fields=['attempts', 'last_error', 'claimed_by', 'status', 'next_attempt_at'])
+    return stats
+
+
+def drain(batch_size=BATCH_SIZE, max_attempts=MAX_ATTEMPTS):
+    """Обрабатывает порции, пока в очереди есть готовые письма."""
+    total = OutboxStats()
+    while True:
+        stats = process_batch(batch_size, max_attempts)
+        if not stats.claimed:
+            return total
+        total.claimed += stats.claimed
+        total.sent += stats.sent
+        total.retried += stats.retried
+        total.dead += stats.dead
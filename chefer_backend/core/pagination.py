@@ -0,0 +1,116 @@
+"""
+Курсорная (keyset) пагинация по ключу (name, id).
+
+Страница ищется по курсору — ключу последнего (или первого) элемента
+соседней страницы, поэтому ссылки «дальше/назад» не сдвигаются, когда в
+список добавляются элементы. Пагинатор работает с уже отсортированной по
+этому ключу последовательностью — категориями из снимка меню, которые
+страница получает одним запросом; общее количество для номеров страниц
+передаётся готовым (`count`).
+"""
+import base64
+import binascii
+import json
+import math
+from bisect import bisect_left, bisect_right
+
+
+def encode_cursor(obj):
+    raw = json.dumps([obj.name, obj.id], ensure_ascii=False).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Ключ (name, id) из курсора или None для некорректного значения."""
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        name, pk = json.loads(raw)
+        return str(name), int(pk)
+    except (binascii.Error, ValueError, TypeError):
+        return None
+
+
+class KeysetPage:
+    def __init__(self, object_list, paginator, number, has_next, has_previous):
+        self.object_list = object_list
+        self.paginator = paginator
+        self.number = number
+        self._has_next = has_next
+        self._has_previous = has_previous
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self._has_next or self._has_previous
+
+    def next_page_number(self):
+        return self.number + 1
+
+    def previous_page_number(self):
+        return self.number - 1
+
+    @property
+    def next_cursor(self):
+        return encode_cursor(self.object_list[-1]) if self._has_next and self.object_list else ''
+
+    @property
+    def previous_cursor(self):
+        return encode_cursor(self.object_list[0]) if self._has_previous and self.object_list else ''
+
+
+class KeysetPaginator:
+    def __init__(self, object_list, per_page, count=None):
+        self.object_list = object_list
+        self.per_page = per_page
+        self.count = count
+        self._keys = [(obj.name, obj.id) for obj in object_list]
+
+    @property
+    def num_pages(self):
+        if self.count is None:
+            return None
+        return max(1, math.ceil(self.count / self.per_page))
+
+    @property
+    def page_range(self):
+        return range(1, (self.num_pages or 0) + 1)
+
+    def get_page(self, after=None, before=None, number=None):
+        """
+        Страница после курсора `after`, перед курсором `before` или, если
+        курсоров нет, страница с номером `number` (для прямых ссылок).
+        """
+        try:
+            number = max(1, int(number))
+        except (TypeError, ValueError):
+            number = 1
+        after, before = decode_cursor(after), decode_cursor(before)
+        if after is not None:
+            start = bisect_right(self._keys, after)
+        elif before is not None:
+            start = max(0, bisect_left(self._keys, before) - self.per_page)
+        else:
+            start = min((number - 1) * self.per_page, max(0, len(self._keys) - 1))
+            start -= start % self.per_page
+        end = start + self.per_page
+        return KeysetPage(
+            list(self.object_list[start:end]), self,
+            number=start // self.per_page + 1,
+            has_next=end < len(self._keys),
+            has_previous=start > 0,
+        )
@@ -0,0 +1,151 @@
+"""
+Ограничение частоты POST-запросов форм (token bucket в кэше Django).
+
+Для каждой области (contact, newsletter, comment) в настройке RATE_LIMITS
+задаются корзины по IP и по e-mail из формы, например '5/10m' — до 5
+запросов подряд с пополнением 5 жетонов за 10 минут. Запрос проходит, только
+если жетон есть во всех его корзинах; иначе ответ 429 с Retry-After, и до
+формы и базы дело не доходит.
+
+Состояние корзины — пара (жетоны, время) под одним ключом. Проверка — одно
+get_many и одно set_many. Чтение и запись не атомарны, поэтому при
+параллельных запросах лимит может быть превышен на единицы. Для защиты от
+потока ботов этого достаточно. С LocMemCache (кэш по умолчанию) корзины
+у каждого процесса свои.
+"""
+import functools
+import hashlib
+import ipaddress
+import math
+import re
+import time
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+
+RATE_RE = re.compile(r'^(\d+)/(\d*)([smhd])$')
+PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+KEY_PREFIX = 'ratelimit'
+
+
+@functools.lru_cache(maxsize=None)
+def parse_rate(rate):
+    """'5/10m' -> (ёмкость 5, пополнение жетонов в секунду)."""
+    match = RATE_RE.match(rate.replace(' ', ''))
+    if not match:
+        raise ValueError(f'Invalid rate {rate!r}, expected e.g. "5/m" or "10/15m"')
+    count, multiplier, unit = match.groups()
+    period = int(multiplier or 1) * PERIODS[unit]
+    return int(count), int(count) / period
+
+
+def client_ip(request):
+    """
+    IP клиента; за RATELIMIT_TRUSTED_PROXIES доверенными прокси — из
+    X-Forwarded-For. IPv6-адреса группируются по сети /64.
+    """
+    address = request.META.get('REMOTE_ADDR', '')
+    proxies = getattr(settings, 'RATELIMIT_TRUSTED_PROXIES', 0)
+    if proxies:
+        forwarded = [part.strip() for part in request.META.get('HTTP_X_FORWARDED_FOR', '').split(',') if part.strip()]
+        if len(forwarded) >= proxies:
+            address = forwarded[-proxies]
+    if ':' not in address:
+        return address
+    try:
+        ip = ipaddress.ip_address(address)
+    except ValueError:
+        return address
+    if ip.version == 6 and not ip.ipv4_mapped:
+        return str(ipaddress.ip_network(f'{ip}/64', strict=False).network_address)
+    return str(ip.ipv4_mapped or ip)
+
+
+def _identities(request, scope, email_field):
+    limits = settings.RATE_LIMITS.get(scope, {})
+    values = {'ip': client_ip(request)}
+    email = request.POST.get(email_field, '').strip().lower()
+    if email:
+        values['email'] = email
+    buckets = {}
+    for kind, value in values.items():
+        if kind in limits:
+            digest = hashlib.md5(value.encode()).hexdigest()
+            buckets[f'{KEY_PREFIX}:{scope}:{kind}:{digest}'] = parse_rate(limits[kind])
+    return buckets
+
+
+def _take(buckets, found, now):
+    """Новые состояния корзин и None, либо {} и через сколько секунд повторить."""
+    updates, retry_after = {}, 0
+    for key, (capacity, refill) in buckets.items():
+        tokens, updated = found.get(key, (capacity, now))
+        tokens = min(capacity, tokens + (now - updated) * refill)
+        if tokens < 1:
+            retry_after = max(retry_after, math.ceil((1 - tokens) / refill))
+        updates[key] = (tokens - 1, now)
+    if retry_after:
+        return {}, retry_after
+    return updates, None
+
+
+def _timeout(buckets):
+    # Через столько секунд любая корзина полна: хранить её дольше незачем
+    return max(math.ceil(capacity / refill) for capacity, refill in buckets.values())
+
+
+def check_rate(request, scope, email_field='email'):
+    """Списывает жетоны; возвращает None или число секунд для Retry-After."""
+    buckets = _identities(request, scope, email_field)
+    if not buckets:
+        return None
+    updates, retry_after = _take(buckets, cache.get_many(buckets), time.time())
+    if updates:
+        cache.set_many(updates, _timeout(buckets))
+    return retry_after
+
+
+async def acheck_rate(request, scope, email_field='email'):
+    buckets = _identities(request, scope, email_field)
+    if not buckets:
+        return None
+    updates, retry_after = _take(buckets, await cache.aget_many(buckets), time.time())
+    if updates:
+        await cache.aset_many(updates, _timeout(buckets))
+    return retry_after
+
+
+def too_many_requests(retry_after):
+    response = HttpResponse(
+        'Too many requests. Please try again later.', status=429, content_type='text/plain; charset=utf-8',
+    )
+    response['Retry-After'] = str(retry_after)
+    return response
+
+
+def ratelimit(scope, email_field='email', methods=('POST',)):
+    """Декоратор представления (синхронного или асинхронного) с лимитами RATE_LIMITS[scope]."""
+    def decorator(view):
+        def applies(request):
+            return request.method in methods and getattr(settings, 'RATELIMIT_ENABLED', True)
+
+        if iscoroutinefunction(view):
+            @functools.wraps(view)
+            async def wrapper(request, *args, **kwargs):
+                if applies(request):
+                    retry_after = await acheck_rate(request, scope, email_field)
+                    if retry_after:
+                        return too_many_requests(retry_after)
+                return await view(request, *args, **kwargs)
+        else:
+            @functools.wraps(view)
+            def wrapper(request, *args, **kwargs):
+                if applies(request):
+                    retry_after = check_rate(request, scope, email_field)
+                    if retry_after:
+                        return too_many_requests(retry_after)
+                return view(request, *args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,235 @@
+"""
+Компактные записи для кэша.
+
+Вместо QuerySet с полными экземплярами моделей (`_state`, кэши связей)
+get_cached_data хранит кортежи неизменяемых NamedTuple-записей только с теми
+полями, которые читают шаблоны. Поля `*_url` хранят готовый URL изображения,
+а одноимённое свойство без суффикса отдаёт объект с `.url`, как ImageField.
+"""
+from datetime import datetime
+from typing import NamedTuple, Optional
+
+from .models import (
+    BlogPost, Category, Chef, Comment, Feature, InstagramImage, TeamMember, Testimonial, gravatar_url,
+)
+
+
+class ImageURL(NamedTuple):
+    url: str
+
+    def __bool__(self):
+        return bool(self.url)
+
+    def __str__(self):
+        return self.url
+
+
+class FeatureRow(NamedTuple):
+    id: int
+    title: str
+    description: str
+    image_url: str
+    link: Optional[str]
+    discount_title: Optional[str]
+    discount: Optional[int]
+
+    @property
+    def pk(self):
+        return self.id
+
+    @property
+    def image(self):
+        return ImageURL(self.image_url)
+
+    def __str__(self):
+        return self.title
+
+
+class TestimonialRow(NamedTuple):
+    id: int
+    client_name: str
+    profession: Optional[str]
+    content: str
+    image_url: str
+
+    @property
+    def pk(self):
+        return self.id
+
+    @property
+    def image(self):
+        return ImageURL(self.image_url)
+
+    def __str__(self):
+        return self.client_name
+
+
+class TeamMemberRow(NamedTuple):
+    id: int
+    name: str
+    role: str
+    profile_image_url: str
+    social_twitter: Optional[str]
+    social_facebook: Optional[str]
+    social_linkedin: Optional[str]
+
+    @property
+    def pk(self):
+        return self.id
+
+    @property
+    def profile_image(self):
+        return ImageURL(self.profile_image_url)
+
+    def __str__(self):
+        return self.name
+
+
+class BlogPostRow(NamedTuple):
+    id: int
+    title: str
+    image_url: str
+    created_at: datetime
+    author: str
+
+    @property
+    def pk(self):
+        return self.id
+
+    @property
+    def image(self):
+        return ImageURL(self.image_url)
+
+    def __str__(self):
+        return self.title
+
+
+class ChefRow(NamedTuple):
+    id: int
+    name: str
+    profile_image_url: str
+    social_twitter: Optional[str]
+    social_facebook: Optional[str]
+    social_linkedin: Optional[str]
+
+    @property
+    def pk(self):
+        return self.id
+
+    @property
+    def profile_image(self):
+        return ImageURL(self.profile_image_url)
+
+    def __str__(self):
+        return self.name
+
+
+class CategoryRow(NamedTuple):
+    id: int
+    name: str
+
+    @property
+    def pk(self):
+        return self.id
+
+    def __str__(self):
+        return self.name
+
+
+class InstagramImageRow(NamedTuple):
+    id: int
+    image_url: str
+    link: Optional[str]
+
+    @property
+    def pk(self):
+        return self.id
+
+    @property
+    def image(self):
+        return ImageURL(self.image_url)
+
+    def __str__(self):
+        return f"Instagram Image {self.id}"
+
+
+class CommentRow(NamedTuple):
+    id: int
+    name: str
+    avatar_hash: str
+    content: str
+    created_at: datetime
+
+    @property
+    def pk(self):
+        return self.id
+
+    def get_gravatar_url(self, size=50):
+        return gravatar_url(self.avatar_hash, size)
+
+    def __str__(self):
+        return f"Comment by {self.name}"
+
+
+ROW_TYPES = {
+    Feature: FeatureRow,
+    Testimonial: TestimonialRow,
+    TeamMember: TeamMemberRow,
+    BlogPost: BlogPostRow,
+    Chef: ChefRow,
+    Category: CategoryRow,
+    InstagramImage: InstagramImageRow,
+    Comment: CommentRow,
+}
+
+
+class CachedRows(tuple):
+    """Кортеж записей с `first()`, который используют шаблоны (`features.first`)."""
+
+    def first(self):
+        return self[0] if self else None
+
+
+def _row_builder(queryset):
+    """
+    Столбцы values_list и функция, превращающая строку выборки в запись.
+    Для моделей без описанной записи возвращает (None, None).
+    """
+    row_type = ROW_TYPES.get(queryset.model)
+    if row_type is None:
+        return None, None
+
+    columns = [name[:-len('_url')] if name.endswith('_url') else name for name in row_type._fields]
+    storages = {
+        index: queryset.model._meta.get_field(column).storage
+        for index, (name, column) in enumerate(zip(row_type._fields, columns))
+        if name.endswith('_url')
+    }
+
+    def build(values):
+        if storages:
+            values = list(values)
+            for index, storage in storages.items():
+                values[index] = storage.url(values[index]) if values[index] else ''
+        return row_type(*values)
+
+    return columns, build
+
+
+def to_rows(queryset):
+    """
+    Выполняет queryset через values_list и упаковывает результат в записи.
+    Для моделей без описанной записи возвращает сами экземпляры.
+    """
+    columns, build = _row_builder(queryset)
+    if columns is None:
+        return CachedRows(queryset)
+    return CachedRows([build(values) for values in queryset.values_list(*columns)])
+
+
+async def ato_rows(queryset):
+    """Асинхронный вариант to_rows на async-итерации ORM."""
+    columns, build = _row_builder(queryset)
+    if columns is None:
+        return CachedRows([obj async for obj in queryset])
+    return CachedRows([build(values) async for values in queryset.values_list(*columns)])
@@ -0,0 +1,54 @@
+"""
+Замена репликации для локальной работы с репликами SQLite.
+
+Файлы реплик получают снимок основной базы через backup API SQLite.
+Копирование по расписанию (команда replicate_sqlite) даёт отставание реплик,
+как у настоящей асинхронной репликации.
+
+Кэш выборок и страниц, заполненный с отстающей реплики, лежит под уже новыми
+поколениями. Поэтому после каждой копии поколения кэшируемых моделей
+сбрасываются ещё раз. Копирует другой процесс, и сброс доходит до процессов
+сайта только через общий кэш (Redis), поэтому без него replicate() не работает.
+"""
+import logging
+import sqlite3
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from .caching import bump_generation
+from .routers import check_replica_cache, replicas
+
+logger = logging.getLogger(__name__)
+
+
+def replicate(aliases=None, primary=DEFAULT_DB_ALIAS):
+    """Копирует основную базу в каждую реплику и сбрасывает поколения кэша."""
+    from .signals import CACHED_MODELS
+
+    errors = check_replica_cache()
+    if errors:
+        raise ImproperlyConfigured(errors[0].msg)
+    source = connections[primary]
+    source.ensure_connection()
+    aliases = replicas() if aliases is None else aliases
+    for alias in aliases:
+        target = sqlite3.connect(str(connections[alias].settings_dict['NAME']))
+        try:
+            source.connection.backup(target)
+        finally:
+            target.close()
+    for model in CACHED_MODELS:
+        bump_generation(model)
+    logger.debug(f"Replicated {primary} to {', '.join(aliases)}")
+    return aliases
+
+
+def data_version(alias=DEFAULT_DB_ALIAS):
+    """
+    Счётчик изменений базы, сделанных другими соединениями: позволяет
+    копировать только после новых коммитов.
+    """
+    with connections[alias].cursor() as cursor:
+        cursor.execute('PRAGMA data_version')
+        return cursor.fetchone()[0]
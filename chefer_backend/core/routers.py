@@ -0,0 +1,127 @@
+"""
+Маршрутизация запросов между основной базой и репликами.
+
+Запись всегда идёт в основную базу. Чтения моделей каталога
+(DATABASE_REPLICATED_MODELS) распределяются по репликам из DATABASE_REPLICAS.
+Служебные модели (очередь писем, подписчики, сессии) читаются из основной
+базы: их читают сразу после записи.
+
+Реплика может отставать, поэтому чтения закрепляются за основной базой:
+- во время изменяющего запроса (POST и т.п.) и во всей админке;
+- ещё DATABASE_PRIMARY_PIN_SECONDS после изменяющего запроса (cookie), чтобы
+  страница после редиректа показала только что записанное;
+- внутри транзакции на основной базе.
+
+Реплики обновляет отдельный процесс (replicate_sqlite) и затем сбрасывает
+поколения кэша. Процессы сайта увидят этот сброс только через общий кэш,
+поэтому без него реплики не используются: проверка check_replica_cache
+(core.E001) выводится командой `check` и при запуске сервера.
+"""
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core import checks
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.urls import reverse
+
+from .caching import is_shared_cache
+
+PIN_COOKIE = 'db_primary_pin'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS', 'TRACE')
+
+_pinned = ContextVar('db_primary_pinned', default=False)
+
+
+def replicas():
+    return getattr(settings, 'DATABASE_REPLICAS', ())
+
+
+def check_replica_cache(app_configs=None, **kwargs):
+    """Системная проверка: реплики требуют общего кэша."""
+    if replicas() and not is_shared_cache():
+        return [checks.Error(
+            'DATABASE_REPLICAS requires a cache shared between processes: otherwise pages and '
+            'querysets cached from a lagging replica stay stale until CORE_CACHE_TIMEOUT.',
+            hint='Set REDIS_URL or remove DATABASE_REPLICAS.',
+            id='core.E001',
+        )]
+    return []
+
+
+def is_primary_pinned():
+    return _pinned.get()
+
+
+@contextmanager
+def pin_primary(enabled=True):
+    """Направляет все чтения внутри блока в основную базу."""
+    token = _pinned.set(enabled or _pinned.get())
+    try:
+        yield
+    finally:
+        _pinned.reset(token)
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        aliases = replicas()
+        if not aliases or model._meta.label not in settings.DATABASE_REPLICATED_MODELS:
+            return None
+        if _pinned.get() or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return random.choice(aliases)
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплики — копии основной базы, объекты из них можно связывать
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        # Схема реплик приходит вместе с данными при репликации
+        return False if db in replicas() else None
+
+
+class PrimaryPinMiddleware:
+    """
+    Закрепляет чтения за основной базой (см. описание модуля). Должен стоять
+    перед PageCacheMiddleware: закреплённые запросы кэш страниц пропускает.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        with pin_primary(self._should_pin(request)):
+            response = self.get_response(request)
+        return self._finish(request, response)
+
+    async def __acall__(self, request):
+        with pin_primary(self._should_pin(request)):
+            response = await self.get_response(request)
+        return self._finish(request, response)
+
+    def _should_pin(self, request):
+        return bool(replicas()) and (
+            request.method not in SAFE_METHODS
+            or PIN_COOKIE in request.COOKIES
+            or request.path.startswith(reverse('admin:index'))
+        )
+
+    def _finish(self, request, response):
+        if replicas() and request.method not in SAFE_METHODS:
+            response.set_cookie(
+                PIN_COOKIE, '1', max_age=settings.DATABASE_PRIMARY_PIN_SECONDS,
+                httponly=True, samesite='Lax',
+            )
+        return response
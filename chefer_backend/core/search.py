@@ -0,0 +1,180 @@
+"""
+Полнотекстовый поиск по пунктам меню.
+
+Бэкенд выбирается по настройке `MENU_SEARCH_BACKEND` или по типу базы:
+SQLite — виртуальная таблица FTS5, PostgreSQL — `tsvector`, иначе —
+запасной вариант на `icontains`. Все бэкенды отвечают на поиск одним
+запросом и возвращают id пунктов меню в порядке релевантности.
+
+Индекс FTS5 обновляется сигналами из `core.signals` в той же транзакции,
+что и изменение данных.
+"""
+import re
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+from django.utils.module_loading import import_string
+
+from .models import MenuItem
+
+FTS_TABLE = 'core_menuitem_fts'
+
+# Поля индекса в порядке столбцов FTS5 и соответствующие пути ORM
+INDEXED_FIELDS = (
+    ('dish_name', 'dish__name'),
+    ('title', 'title'),
+    ('dish_description', 'dish__description'),
+    ('description', 'description'),
+    ('category_name', 'category__name'),
+)
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def tokenize(query):
+    return TOKEN_RE.findall(query.lower())
+
+
+class SubstringSearchBackend:
+    """Запасной бэкенд: icontains по всем полям, но одним запросом."""
+
+    def search(self, query, menu_id=None):
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+        items = MenuItem.objects.all()
+        if menu_id is not None:
+            items = items.filter(dish__menu_id=menu_id)
+        for token in tokens:
+            condition = Q()
+            for _, lookup in INDEXED_FIELDS:
+                condition |= Q(**{f'{lookup}__icontains': token})
+            items = items.filter(condition)
+        return list(items.values_list('id', flat=True))
+
+    def index_items(self, item_ids):
+        pass
+
+    def remove_items(self, item_ids):
+        pass
+
+    def rebuild(self):
+        pass
+
+
+class SQLiteFTS5SearchBackend:
+    """
+    FTS5 с префиксным поиском и ранжированием bm25. Каждый токен запроса
+    превращается в `"token"*`, токены объединяются через AND.
+    """
+    # Вес столбцов для bm25: совпадение в названии важнее описания
+    WEIGHTS = (10.0, 10.0, 2.0, 2.0, 5.0)
+
+    def match_expression(self, tokens):
+        return ' '.join(f'"{token}"*' for token in tokens)
+
+    def search(self, query, menu_id=None):
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+        weights = ', '.join(str(weight) for weight in self.WEIGHTS)
+        sql = f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s'
+        params = [self.match_expression(tokens)]
+        if menu_id is not None:
+            sql += ' AND menu_id = %s'
+            params.append(menu_id)
+        sql += f' ORDER BY bm25({FTS_TABLE}, {weights})'
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return [row[0] for row in cursor.fetchall()]
+
+    def _rows(self, items):
+        columns = ['id', 'dish__menu_id'] + [lookup for _, lookup in INDEXED_FIELDS]
+        for values in items.values_list(*columns):
+            item_id, menu_id, *texts = values
+            yield (item_id, menu_id, *(text or '' for text in texts))
+
+    def _insert(self, rows):
+        columns = ', '.join(['rowid', 'menu_id'] + [name for name, _ in INDEXED_FIELDS])
+        placeholders = ', '.join(['%s'] * (len(INDEXED_FIELDS) + 2))
+        with connection.cursor() as cursor:
+            cursor.executemany(f'INSERT INTO {FTS_TABLE} ({columns}) VALUES ({placeholders})', list(rows))
+
+    def index_items(self, item_ids):
+        item_ids = list(item_ids)
+        if not item_ids:
+            return
+        self.remove_items(item_ids)
+        self._insert(self._rows(MenuItem.objects.filter(id__in=item_ids)))
+
+    def remove_items(self, item_ids):
+        item_ids = list(item_ids)
+        if not item_ids:
+            return
+        placeholders = ', '.join(['%s'] * len(item_ids))
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})', item_ids)
+
+    def rebuild(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE}')
+        self._insert(self._rows(MenuItem.objects.order_by('id')))
+
+
+class PostgresSearchBackend:
+    """
+    Адаптер для PostgreSQL: `tsvector` по тем же полям с весами и префиксным
+    `to_tsquery`. Для больших каталогов стоит добавить GIN-индекс по
+    выражению вектора; отдельная синхронизация индекса не нужна.
+    """
+    CONFIG = 'simple'
+    WEIGHTS = ('A', 'A', 'C', 'C', 'B')
+
+    def search(self, query, menu_id=None):
+        from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+        vector = None
+        for (_, lookup), weight in zip(INDEXED_FIELDS, self.WEIGHTS):
+            part = SearchVector(lookup, weight=weight, config=self.CONFIG)
+            vector = part if vector is None else vector + part
+        search_query = SearchQuery(' & '.join(f'{token}:*' for token in tokens), search_type='raw', config=self.CONFIG)
+        items = MenuItem.objects.annotate(rank=SearchRank(vector, search_query)).filter(rank__gt=0)
+        if menu_id is not None:
+            items = items.filter(dish__menu_id=menu_id)
+        return list(items.order_by('-rank', 'id').values_list('id', flat=True))
+
+    def index_items(self, item_ids):
+        pass
+
+    def remove_items(self, item_ids):
+        pass
+
+    def rebuild(self):
+        pass
+
+
+_backend = None
+
+
+def get_search_backend():
+    global _backend
+    if _backend is None:
+        path = getattr(settings, 'MENU_SEARCH_BACKEND', None)
+        if path:
+            _backend = import_string(path)()
+        elif connection.vendor == 'sqlite':
+            _backend = SQLiteFTS5SearchBackend()
+        elif connection.vendor == 'postgresql':
+            _backend = PostgresSearchBackend()
+        else:
+            _backend = SubstringSearchBackend()
+    return _backend
+
+
+def search_menu_items(query, menu_id=None):
+    """Возвращает id пунктов меню, подходящих под запрос, по убыванию релевантности."""
+    return get_search_backend().search(query, menu_id=menu_id)
@@ -0,0 +1,156 @@
+from django.apps import apps
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models import ImageField
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from .caching import bump_generation_on_commit
+from .images import schedule_derivatives
+from .instrumentation import install_sql_hook
+from .comments import refresh_approved_comment_counts
+from .db import apply_sqlite_pragmas
+from .models import (
+    BlogPost, Category, Chef, Comment, Dish, Feature, InstagramImage, Menu, MenuItem, Tag, TeamMember,
+    Testimonial,
+)
+from .search import get_search_backend
+from .snapshots import schedule_snapshot_rebuild, snapshot_menu_ids
+
+
+# Снимки меню зависят от этих моделей: изменение пересобирает снимки тех меню,
+# где объект был до изменения и где он оказался после
+MENU_SNAPSHOT_SOURCES = (Menu, Category, MenuItem, Dish, Tag)
+
+
+def remember_snapshot_menus(sender, instance, using='default', raw=False, **kwargs):
+    # Вне транзакции on_commit сработал бы сразу, до записи: прежние меню
+    # запоминаются и планируются вместе с новыми в post_save
+    if not raw and instance.pk is not None:
+        instance._snapshot_menu_ids = snapshot_menu_ids(instance, using)
+
+
+def rebuild_menu_snapshots_handler(sender, instance, using='default', raw=False, **kwargs):
+    if raw:
+        return
+    previous = instance.__dict__.pop('_snapshot_menu_ids', set())
+    schedule_snapshot_rebuild(previous | snapshot_menu_ids(instance, using), using)
+
+
+def rebuild_menu_snapshots_on_delete(sender, instance, using='default', **kwargs):
+    # Удаление идёт в транзакции: пересборка после коммита видит итог
+    schedule_snapshot_rebuild(snapshot_menu_ids(instance, using), using)
+
+
+for model in MENU_SNAPSHOT_SOURCES:
+    pre_save.connect(remember_snapshot_menus, sender=model, dispatch_uid=f'menu_snapshot_pre_save_{model.__name__}')
+    post_save.connect(rebuild_menu_snapshots_handler, sender=model, dispatch_uid=f'menu_snapshot_save_{model.__name__}')
+    pre_delete.connect(rebuild_menu_snapshots_on_delete, sender=model, dispatch_uid=f'menu_snapshot_delete_{model.__name__}')
+
+
+@receiver(m2m_changed, sender=Dish.tags.through, dispatch_uid='menu_snapshot_dish_tags')
+def dish_tags_changed(sender, instance, action, reverse, pk_set, using='default', **kwargs):
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    if not reverse:
+        menu_ids = {instance.menu_id}
+    elif action == 'pre_clear':
+        menu_ids = snapshot_menu_ids(instance, using)
+    else:
+        menu_ids = Dish.objects.using(using).filter(pk__in=pk_set).values_list('menu_id', flat=True)
+    schedule_snapshot_rebuild(menu_ids, using)
+
+
+# Модели, чьи выборки кэшируются по поколениям (get_cached_data,
+# instagram_context, кэш страниц): изменение сбрасывает поколение. У Comment
+# поколения по постам, их сбрасывают обработчики ниже
+CACHED_MODELS = (
+    Feature, Testimonial, TeamMember, BlogPost, Chef, Category, InstagramImage,
+    Menu, MenuItem, Dish, Tag, Comment,
+)
+
+
+def bump_generation_handler(sender, using='default', raw=False, **kwargs):
+    if raw:
+        return
+    bump_generation_on_commit(sender, using)
+
+
+for model in CACHED_MODELS:
+    if model is Comment:
+        continue
+    post_save.connect(bump_generation_handler, sender=model, dispatch_uid=f'cache_generation_save_{model.__name__}')
+    post_delete.connect(bump_generation_handler, sender=model, dispatch_uid=f'cache_generation_delete_{model.__name__}')
+
+
+@receiver(m2m_changed, dispatch_uid='cache_generation_m2m')
+def cached_model_m2m_changed(sender, instance, action, model, using='default', **kwargs):
+    if not action.startswith('post_'):
+        return
+    for changed in {type(instance), model}:
+        if changed in CACHED_MODELS:
+            bump_generation_on_commit(changed, using)
+
+
+# Счётчик и кэш одобренных комментариев поста; новый неодобренный
+# комментарий не меняет ни то, ни другое
+@receiver(post_save, sender=Comment, dispatch_uid='approved_comment_count_save')
+def comment_saved(sender, instance, created, raw=False, using='default', **kwargs):
+    if not raw and (instance.is_approved or not created):
+        refresh_approved_comment_counts([instance.post_id])
+        bump_generation_on_commit((Comment, instance.post_id), using)
+
+
+@receiver(post_delete, sender=Comment, dispatch_uid='approved_comment_count_delete')
+def comment_deleted(sender, instance, using='default', **kwargs):
+    if instance.is_approved:
+        refresh_approved_comment_counts([instance.post_id])
+        bump_generation_on_commit((Comment, instance.post_id), using)
+
+
+# Поисковый индекс пунктов меню обновляется в той же транзакции
+@receiver(post_save, sender=MenuItem, dispatch_uid='search_index_menu_item_save')
+def index_menu_item(sender, instance, raw=False, **kwargs):
+    if not raw:
+        get_search_backend().index_items([instance.pk])
+
+
+@receiver(post_delete, sender=MenuItem, dispatch_uid='search_index_menu_item_delete')
+def unindex_menu_item(sender, instance, **kwargs):
+    get_search_backend().remove_items([instance.pk])
+
+
+@receiver(post_save, sender=Dish, dispatch_uid='search_index_dish_save')
+@receiver(post_save, sender=Category, dispatch_uid='search_index_category_save')
+def reindex_related_menu_items(sender, instance, raw=False, **kwargs):
+    if not raw:
+        get_search_backend().index_items(instance.menu_items.values_list('id', flat=True))
+
+
+# Производные изображений создаются фоновым пулом после коммита; по готовности
+# пул сбрасывает поколение модели, чтобы кэш страниц получил srcset
+def schedule_image_derivatives(sender, instance, raw=False, using='default', **kwargs):
+    if raw:
+        return
+    for field in sender._meta.fields:
+        if isinstance(field, ImageField):
+            name = getattr(instance, field.attname).name
+            if name:
+                transaction.on_commit(lambda name=name: schedule_derivatives(name, sender), using=using)
+
+
+for model in apps.get_app_config('core').get_models():
+    if any(isinstance(field, ImageField) for field in model._meta.fields):
+        post_save.connect(schedule_image_derivatives, sender=model, dispatch_uid=f'image_derivatives_{model.__name__}')
+
+
+# Учёт SQL-запросов для метрик запроса (core.instrumentation)
+@receiver(connection_created, dispatch_uid='request_metrics_sql_hook')
+def instrument_connection(sender, connection, **kwargs):
+    install_sql_hook(connection)
+
+
+# PRAGMA SQLite для каждого нового соединения (core.db)
+@receiver(connection_created, dispatch_uid='sqlite_pragmas')
+def configure_connection(sender, connection, **kwargs):
+    apply_sqlite_pragmas(connection)
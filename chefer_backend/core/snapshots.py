@@ -0,0 +1,262 @@
+"""
+Материализованные снимки меню (read model).
+
+Снимок меню строится одним проходом по `MenuItem` -> `Dish` -> `Tag` и
+хранится в `MenuSnapshot.payload` в виде JSON. Страницы `menu` и `index`
+читают его одним запросом и получают лёгкие записи, которые шаблоны
+используют так же, как модели (`item.image.url`, `item.dish.tags.all`).
+"""
+from collections import defaultdict
+
+from asgiref.sync import sync_to_async
+from django.db import connections, transaction
+
+from .models import Category, Dish, Menu, MenuItem, MenuSnapshot, Tag
+
+
+class SnapshotImage:
+    __slots__ = ('url',)
+
+    def __init__(self, url):
+        self.url = url
+
+    def __bool__(self):
+        return bool(self.url)
+
+    def __str__(self):
+        return self.url
+
+
+class SnapshotTags(tuple):
+    """Кортеж тегов с методом `all()`, как у related manager."""
+
+    def all(self):
+        return self
+
+
+class SnapshotRecord:
+    """
+    Базовая запись снимка. Сравнивается по pk как с другими записями,
+    так и с экземплярами исходной модели.
+    """
+    __slots__ = ()
+    model = None
+
+    @property
+    def pk(self):
+        return self.id
+
+    def __eq__(self, other):
+        if isinstance(other, (type(self), self.model)):
+            return self.id == other.pk
+        return NotImplemented
+
+    def __hash__(self):
+        return hash((self.model, self.id))
+
+
+class TagRecord(SnapshotRecord):
+    __slots__ = ('id', 'name')
+    model = Tag
+
+    def __init__(self, id, name):
+        self.id = id
+        self.name = name
+
+    def __str__(self):
+        return self.name
+
+
+class DishRecord(SnapshotRecord):
+    __slots__ = ('id', 'name', 'description', 'price', 'image', 'tags')
+    model = Dish
+
+    def __init__(self, id, name, description, price, image, tags):
+        self.id = id
+        self.name = name
+        self.description = description
+        self.price = price
+        self.image = SnapshotImage(image)
+        self.tags = SnapshotTags(TagRecord(**tag) for tag in tags)
+
+    def __str__(self):
+        return self.name
+
+
+class MenuItemRecord(SnapshotRecord):
+    __slots__ = ('id', 'title', 'description', 'price', 'image', 'available', 'dish')
+    model = MenuItem
+
+    def __init__(self, id, title, description, price, image, available, dish):
+        self.id = id
+        self.title = title
+        self.description = description
+        self.price = price
+        self.image = SnapshotImage(image)
+        self.available = available
+        self.dish = DishRecord(**dish) if dish else None
+
+    def __str__(self):
+        return self.title
+
+
+class CategoryRecord(SnapshotRecord):
+    __slots__ = ('id', 'name', 'items', 'filtered_items')
+    model = Category
+
+    def __init__(self, id, name, items):
+        self.id = id
+        self.name = name
+        self.items = tuple(MenuItemRecord(**item) for item in items)
+        self.filtered_items = self.items
+
+    def __str__(self):
+        return self.name
+
+
+def _image_url(image):
+    return image.url if image else ''
+
+
+def build_menu_payloads(menu_ids=None):
+    """
+    Строит payload снимков для указанных меню (или для всех).
+
+    Выполняет фиксированное число запросов независимо от размера каталога:
+    меню, пункты меню с категориями и блюдами, теги блюд.
+    """
+    menus = Menu.objects.all()
+    if menu_ids is not None:
+        menus = menus.filter(id__in=menu_ids)
+    payloads = {menu_id: [] for menu_id in menus.values_list('id', flat=True)}
+    if not payloads:
+        return {}
+
+    items = MenuItem.objects.filter(
+        dish__menu_id__in=list(payloads)
+    ).select_related('category', 'dish').prefetch_related(
+        'dish__tags'
+    ).order_by('category__name', 'category_id', 'id')
+
+    grouped = defaultdict(dict)
+    for item in items:
+        dish = item.dish
+        categories = grouped[dish.menu_id]
+        category = categories.get(item.category_id)
+        if category is None:
+            category = categories[item.category_id] = {
+                'id': item.category_id,
+                'name': item.category.name,
+                'items': [],
+            }
+        category['items'].append({
+            'id': item.id,
+            'title': item.title,
+            'description': item.description,
+            'price': str(item.price),
+            'image': _image_url(item.image),
+            'available': item.available,
+            'dish': {
+                'id': dish.id,
+                'name': dish.name,
+                'description': dish.description,
+                'price': str(dish.price),
+                'image': _image_url(dish.image),
+                'tags': [{'id': tag.id, 'name': tag.name} for tag in dish.tags.all()],
+            },
+        })
+
+    for menu_id, categories in grouped.items():
+        payloads[menu_id] = list(categories.values())
+    return {menu_id: {'categories': categories} for menu_id, categories in payloads.items()}
+
+
+def rebuild_menu_snapshots(menu_ids=None):
+    """Пересобирает и сохраняет снимки меню. Возвращает {menu_id: payload}."""
+    payloads = build_menu_payloads(menu_ids)
+    MenuSnapshot.objects.bulk_create(
+        [MenuSnapshot(menu_id=menu_id, payload=payload) for menu_id, payload in payloads.items()],
+        update_conflicts=True,
+        unique_fields=['menu'],
+        update_fields=['payload', 'built_at'],
+    )
+    return payloads
+
+
+# Путь от модели-источника к меню, в снимок которого она попадает
+SNAPSHOT_MENU_LOOKUPS = {
+    Menu: 'id',
+    Dish: 'menu_id',
+    MenuItem: 'dish__menu_id',
+    Category: 'menu_items__dish__menu_id',
+    Tag: 'dishes__menu_id',
+}
+
+
+def snapshot_menu_ids(instance, using='default'):
+    """Меню, снимки которых показывают `instance` в его текущем состоянии в базе."""
+    model = type(instance)
+    return set(
+        model._default_manager.using(using).filter(pk=instance.pk)
+        .values_list(SNAPSHOT_MENU_LOOKUPS[model], flat=True)
+    )
+
+
+class _PendingRebuild:
+    """Callback on_commit, который копит меню для одной пересборки."""
+
+    def __init__(self):
+        self.menu_ids = set()
+
+    def __call__(self):
+        rebuild_menu_snapshots(self.menu_ids)
+
+
+def schedule_snapshot_rebuild(menu_ids, using='default'):
+    """
+    Планирует пересборку снимков меню `menu_ids` после коммита транзакции.
+
+    Несколько изменений в одной транзакции (например, каскадное удаление
+    меню со всеми блюдами) приводят к одной пересборке затронутых меню.
+    """
+    menu_ids = set(menu_ids) - {None}
+    if not menu_ids:
+        return
+    connection = connections[using]
+    savepoints = set(connection.savepoint_ids)
+    for sids, func, _ in connection.run_on_commit:
+        # Callback из отменяемой точки сохранения мог бы потерять эти меню
+        if isinstance(func, _PendingRebuild) and sids <= savepoints:
+            func.menu_ids |= menu_ids
+            return
+    pending = _PendingRebuild()
+    pending.menu_ids |= menu_ids
+    transaction.on_commit(pending, using=using)
+
+
+def _category_records(payload):
+    return [CategoryRecord(**category) for category in payload.get('categories', [])]
+
+
+def get_menu_categories(menu):
+    """
+    Возвращает категории меню из снимка одним запросом.
+    Если снимка ещё нет, снимки всех меню строятся и сохраняются.
+    """
+    if menu is None:
+        return []
+    payload = MenuSnapshot.objects.filter(menu=menu).values_list('payload', flat=True).first()
+    if payload is None:
+        payload = rebuild_menu_snapshots().get(menu.id, {})
+    return _category_records(payload)
+
+
+async def aget_menu_categories(menu):
+    """Асинхронный вариант get_menu_categories."""
+    if menu is None:
+        return []
+    payload = await MenuSnapshot.objects.filter(menu=menu).values_list('payload', flat=True).afirst()
+    if payload is None:
+        # Пересборка — редкий случай и пишет в базу, её достаточно выполнить синхронно
+        payload = (await sync_to_async(rebuild_menu_snapshots)()).get(menu.id, {})
+    return _category_records(payload)
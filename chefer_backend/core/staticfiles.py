@@ -0,0 +1,276 @@
+"""
+Статика: имена с хэшем содержимого, сжатые копии и раздача из процесса.
+
+CompressedManifestStaticFilesStorage при collectstatic пишет файлы с хэшем
+содержимого в имени (ManifestStaticFilesStorage) и рядом с каждым текстовым
+файлом — копии `.gz` и `.br` (brotli — если установлен пакет Brotli).
+Без манифеста (collectstatic не запускался) ссылки строятся на исходные
+имена, а не падают с ошибкой.
+
+StaticFilesMiddleware отдаёт файлы из STATIC_ROOT без URL-маршрутов:
+выбирает сжатую копию по Accept-Encoding, отвечает на Range и условные
+запросы, а файлам с хэшем в имени ставит `Cache-Control: immutable`. Под ASGI
+он работает асинхронно и читает файл порциями в потоках.
+"""
+import gzip
+import logging
+import mimetypes
+import os
+import re
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage, staticfiles_storage
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.base import ContentFile
+from django.http import FileResponse, HttpResponse, HttpResponseNotModified
+from django.utils._os import safe_join
+from django.utils.cache import patch_vary_headers
+from django.utils.http import http_date
+
+from .http import FileRange, aiter_file, file_etag, is_modified, requested_range
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+COMPRESSIBLE_EXTENSIONS = (
+    '.css', '.js', '.mjs', '.map', '.json', '.svg', '.html', '.txt', '.xml',
+    '.ttf', '.otf', '.eot', '.ico',
+)
+# Сжатая копия сохраняется, только если она заметно меньше оригинала
+MIN_COMPRESS_SIZE = 256
+MIN_COMPRESS_RATIO = 0.95
+
+IMMUTABLE_MAX_AGE = 60 * 60 * 24 * 365
+STATIC_MAX_AGE = getattr(settings, 'STATIC_MAX_AGE', 60)
+
+# Варианты в порядке предпочтения: кодировка -> суффикс файла
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+HASHED_NAME_RE = re.compile(r'\.[0-9a-f]{12}\.[^/.]+$')
+
+
+def _compress(content):
+    variants = {'.gz': gzip.compress(content, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        variants['.br'] = brotli.compress(content, quality=11)
+    return variants
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    manifest_strict = False
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+        compressed = 0
+        for name in set(self.hashed_files.values()):
+            if name.endswith(COMPRESSIBLE_EXTENSIONS):
+                compressed += self._write_compressed(name)
+        logger.info(f"Wrote {compressed} compressed static files")
+
+    def _write_compressed(self, name):
+        with self.open(name) as f:
+            content = f.read()
+        if len(content) < MIN_COMPRESS_SIZE:
+            return 0
+        written = 0
+        for suffix, data in _compress(content).items():
+            if len(data) > len(content) * MIN_COMPRESS_RATIO:
+                continue
+            if self.exists(name + suffix):
+                self.delete(name + suffix)
+            self._save(name + suffix, ContentFile(data))
+            written += 1
+        return written
+
+    def stored_name(self, name):
+        try:
+            return super().stored_name(name)
+        except ValueError:
+            # Файла нет в STATIC_ROOT (collectstatic не запускался): исходное имя
+            return name
+
+    def _stored_name(self, name, hashed_files):
+        try:
+            return super()._stored_name(name, hashed_files)
+        except ValueError:
+            # Ссылка из CSS на отсутствующий файл остаётся как есть, а не
+            # прерывает collectstatic
+            logger.warning(f"Static file {name} referenced from CSS/JS is missing")
+            return name
+
+
+def static_version():
+    """Хэш манифеста статики: меняется после collectstatic с новыми файлами."""
+    return getattr(staticfiles_storage, 'manifest_hash', '') or ''
+
+
+class StaticFile:
+    __slots__ = ('path', 'size', 'mtime', 'etag', 'variants', 'signature')
+
+    def __init__(self, path):
+        stat = os.stat(path)
+        self.path = path
+        self.size = stat.st_size
+        self.mtime = int(stat.st_mtime)
+        self.etag = file_etag(stat)
+        self.signature = (stat.st_mtime_ns, stat.st_size)
+        # encoding -> (путь, размер)
+        self.variants = {}
+        for encoding, suffix in ENCODINGS:
+            try:
+                self.variants[encoding] = (path + suffix, os.stat(path + suffix).st_size)
+            except FileNotFoundError:
+                pass
+
+    def is_current(self):
+        """False, если файл с тех пор перезаписан или удалён."""
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return False
+        return (stat.st_mtime_ns, stat.st_size) == self.signature
+
+
+def _accepted_encodings(header):
+    accepted = set()
+    for item in header.split(','):
+        coding, _, params = item.strip().partition(';')
+        if params.strip().replace(' ', '') in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000'):
+            continue
+        accepted.add(coding.strip().lower())
+    return accepted
+
+
+class StaticFilesMiddleware:
+    """
+    Ставится сразу после SecurityMiddleware. runserver отдаёт статику сам,
+    до middleware; в DEBUG файлы, которых нет в STATIC_ROOT, ищутся finders.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+        self.prefix = '/' + settings.STATIC_URL.lstrip('/')
+        self.root = settings.STATIC_ROOT
+        self.files = {}
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        static_file = self.match(request)
+        if static_file is not None:
+            return self.serve(request, static_file)
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        static_file = self.match(request)
+        if static_file is not None:
+            return self.serve(request, static_file, asynchronous=True)
+        return await self.get_response(request)
+
+    def match(self, request):
+        if request.path_info.startswith(self.prefix) and request.method in ('GET', 'HEAD'):
+            return self.find(request.path_info[len(self.prefix):])
+        return None
+
+    def find(self, name):
+        # В DEBUG файлы меняются: метаданные читаются заново на каждый запрос.
+        # Иначе имя с хэшем содержимого неизменно, а файл без хэша collectstatic
+        # может перезаписать — его метаданные сверяются с os.stat
+        static_file = None if settings.DEBUG else self.files.get(name)
+        if static_file is not None and (HASHED_NAME_RE.search(name) or static_file.is_current()):
+            return static_file
+        try:
+            path = safe_join(self.root, name) if self.root else None
+        except SuspiciousFileOperation:
+            return None
+        if path is None or not os.path.isfile(path):
+            path = finders.find(name) if settings.DEBUG else None
+            if not path or not os.path.isfile(path):
+                self.files.pop(name, None)
+                return None
+        static_file = StaticFile(path)
+        if not settings.DEBUG:
+            self.files[name] = static_file
+        return static_file
+
+    def serve(self, request, static_file, asynchronous=False):
+        byte_range = requested_range(request, static_file.etag, static_file.size)
+        if byte_range is not None:
+            if byte_range is False:
+                response = HttpResponse(status=416)
+                response['Content-Range'] = f'bytes */{static_file.size}'
+                return response
+            return self._partial(request, static_file, *byte_range, asynchronous=asynchronous)
+
+        path, size, encoding = static_file.path, static_file.size, None
+        accepted = _accepted_encodings(request.headers.get('Accept-Encoding', ''))
+        for candidate, _ in ENCODINGS:
+            if candidate in accepted and candidate in static_file.variants:
+                (path, size), encoding = static_file.variants[candidate], candidate
+                break
+        # У каждой кодировки свой ETag: это разные представления файла
+        etag = static_file.etag if encoding is None else f'{static_file.etag[:-1]}-{encoding}"'
+        if not is_modified(request, etag, static_file.mtime):
+            response = HttpResponseNotModified()
+        elif request.method == 'HEAD':
+            response = HttpResponse(content_type=self._content_type(static_file))
+            response['Content-Length'] = size
+        else:
+            response = self._file_response(open(path, 'rb'), 200, self._content_type(static_file), asynchronous)
+            response['Content-Length'] = size
+        if encoding and response.status_code == 200:
+            response['Content-Encoding'] = encoding
+        self._set_headers(request, response, static_file, etag)
+        return response
+
+    def _partial(self, request, static_file, start, end, asynchronous=False):
+        # Диапазоны отдаются из несжатого файла: смещения относятся к нему
+        length = end - start + 1
+        content_type = self._content_type(static_file)
+        if request.method == 'HEAD':
+            response = HttpResponse(status=206, content_type=content_type)
+        else:
+            file = FileRange(open(static_file.path, 'rb'), start, length)
+            response = self._file_response(file, 206, content_type, asynchronous)
+        response['Content-Length'] = length
+        response['Content-Range'] = f'bytes {start}-{end}/{static_file.size}'
+        self._set_headers(request, response, static_file, static_file.etag)
+        return response
+
+    def _file_response(self, file, status, content_type, asynchronous):
+        if not asynchronous:
+            return FileResponse(file, status=status, content_type=content_type)
+        # Синхронный итератор ASGIHandler собрал бы в память целиком
+        response = FileResponse(status=status, content_type=content_type)
+        response.streaming_content = aiter_file(file)
+        return response
+
+    def _content_type(self, static_file):
+        content_type, _ = mimetypes.guess_type(static_file.path)
+        content_type = content_type or 'application/octet-stream'
+        if content_type.startswith('text/') or content_type in ('application/javascript', 'image/svg+xml'):
+            content_type += '; charset=utf-8'
+        return content_type
+
+    def _set_headers(self, request, response, static_file, etag):
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(static_file.mtime)
+        response['Accept-Ranges'] = 'bytes'
+        if HASHED_NAME_RE.search(request.path_info):
+            response['Cache-Control'] = f'public, max-age={IMMUTABLE_MAX_AGE}, immutable'
+        else:
+            response['Cache-Control'] = f'public, max-age={STATIC_MAX_AGE}'
+        if static_file.variants:
+            patch_vary_headers(response, ('Accept-Encoding',))
@@ -0,0 +1,74 @@
+import hashlib
+
+from django import template
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.safestring import mark_safe
+
+from core.caching import DEFAULT_TIMEOUT, query_key, versioned_key
+from core.images import MISSING_MANIFEST_TTL
+from core.staticfiles import static_version
+
+register = template.Library()
+
+# Шаблон фрагмента -> модели, данные которых он показывает
+FRAGMENT_CACHE_DEPENDENCIES = getattr(settings, 'FRAGMENT_CACHE_DEPENDENCIES', {
+    'includes/menu_part.html': ('core.Menu', 'core.Category', 'core.MenuItem', 'core.Dish', 'core.Tag'),
+    'includes/feature_part.html': ('core.Feature',),
+    'includes/team_section.html': ('core.Chef',),
+    'includes/testimonial_part.html': ('core.Testimonial',),
+    'includes/blog_part.html': ('core.BlogPost',),
+    'includes/insta.html': ('core.InstagramImage',),
+})
+
+
+def _fragment_key(template_name, vary, extra):
+    digest = hashlib.md5(repr((vary, sorted(extra.items()))).encode()).hexdigest()
+    models = [apps.get_model(label) for label in FRAGMENT_CACHE_DEPENDENCIES[template_name]]
+    return versioned_key(f'fragment:{static_version()}:{template_name}:{digest}', *models)
+
+
+@register.simple_tag(takes_context=True)
+def cached_include(context, template_name, *vary, **extra):
+    """
+    {% include %} с кэшированием результата под поколениями моделей из
+    FRAGMENT_CACHE_DEPENDENCIES. Позиционные аргументы после имени шаблона —
+    всё, кроме этих моделей, от чего зависит фрагмент (например, имя
+    страницы); именованные, как `with` у include, добавляются в контекст:
+
+        {% cached_include "includes/menu_part.html" request|query_params:"menu search category page after before" %}
+
+    Производные изображений фрагмента сбрасывают поколение его модели, когда
+    готовы; до тех пор фрагмент с пустым srcset хранится не дольше
+    IMAGE_MISSING_MANIFEST_TTL и помечает запрос для кэша страниц.
+    """
+    fragment = context.template.engine.get_template(template_name)
+
+    def render():
+        with context.push(**extra):
+            return fragment.render(context)
+
+    if template_name not in FRAGMENT_CACHE_DEPENDENCIES:
+        return mark_safe(render())
+    request = context.get('request')
+    key = _fragment_key(template_name, vary, extra)
+    entry = cache.get(key)
+    if entry is None:
+        before = getattr(request, 'pending_derivatives', 0)
+        html = render()
+        pending = getattr(request, 'pending_derivatives', 0) - before
+        entry = (html, pending)
+        cache.set(key, entry, MISSING_MANIFEST_TTL if pending else DEFAULT_TIMEOUT)
+    elif entry[1] and request is not None:
+        request.pending_derivatives = getattr(request, 'pending_derivatives', 0) + entry[1]
+    return mark_safe(entry[0])
+
+
+@register.filter
+def query_params(request, names):
+    """
+    Нормализованные параметры запроса из списка `names` для аргументов
+    cached_include: остальные параметры (utm_* и т.п.) фрагмент не меняют.
+    """
+    return query_key(request, names.split())
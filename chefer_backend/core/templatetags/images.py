@@ -0,0 +1,21 @@
+from django import template
+
+from core.images import build_srcset, derivatives_pending
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def srcset(context, image, fmt='webp'):
+    """
+    Атрибут srcset из производных изображения:
+    <img src="{{ item.image.url }}" srcset="{% srcset item.image %}" sizes="...">
+
+    Пока производных нет, запрос помечается, и кэш страниц и фрагментов
+    хранит результат не дольше IMAGE_MISSING_MANIFEST_TTL.
+    """
+    value = build_srcset(image, fmt)
+    request = context.get('request')
+    if not value and request is not None and derivatives_pending(image):
+        request.pending_derivatives = getattr(request, 'pending_derivatives', 0) + 1
+    return value
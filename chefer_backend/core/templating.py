@@ -0,0 +1,35 @@
+"""
+Предварительная компиляция шаблонов.
+
+Cached loader компилирует шаблон при первом обращении, то есть в первом
+запросе каждого процесса. preload_templates() делает это при старте сервера
+(wsgi.py/asgi.py), если включена настройка TEMPLATE_PRELOAD.
+"""
+import logging
+import time
+from pathlib import Path
+
+from django.template import TemplateSyntaxError, engines
+from django.template.backends.django import DjangoTemplates
+
+logger = logging.getLogger(__name__)
+
+
+def preload_templates():
+    """Компилирует все шаблоны из DIRS движков DjangoTemplates; возвращает их число."""
+    started = time.perf_counter()
+    loaded = 0
+    for backend in engines.all():
+        if not isinstance(backend, DjangoTemplates):
+            continue
+        for directory in map(Path, backend.engine.dirs):
+            for path in sorted(directory.rglob('*.html')):
+                name = path.relative_to(directory).as_posix()
+                try:
+                    backend.engine.get_template(name)
+                except TemplateSyntaxError as exc:
+                    logger.error(f"Cannot preload template {name}: {exc}")
+                else:
+                    loaded += 1
+    logger.info(f"Preloaded {loaded} templates in {(time.perf_counter() - started) * 1000:.1f} ms")
+    return loaded
@@ -5,6 +5,7 @@ from django.test import Client
 from core.models import Menu, Category, Dish, MenuItem, Tag, Feature
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.core.cache import cache
+from django.utils import timezone
     
 
 @pytest.fixture
@@ -263,3 +264,1067 @@ def test_menu_invalid_id(client):
     """Test menu with invalid ID"""
     response = client.get(reverse('menu') + '?menu=999999')
     assert response.status_code == 404
+
+
+@pytest.mark.django_db
+def test_menu_query_ceiling(client, test_data, django_assert_max_num_queries):
+    """Menu page is served from the snapshot with a fixed number of queries"""
+    # Первый запрос строит снимки, дальше они читаются одним запросом
+    client.get(reverse('menu'))
+    with django_assert_max_num_queries(3) as captured:
+        response = client.get(reverse('menu') + f'?menu={test_data["menu2"].id}&search=steak')
+    assert response.status_code == 200
+    assert response.context['categories'][0].filtered_items[0].dish == test_data['dish4']
+    catalog_tables = ('"core_menuitem"', '"core_category"', '"core_dish"', '"core_tag"')
+    assert not [q for q in captured.captured_queries if any(t in q['sql'] for t in catalog_tables)]
+
+
+@pytest.mark.django_db(transaction=True)
+def test_menu_snapshot_rebuilt_on_save(client, test_data):
+    """Saving a dish rebuilds the menu snapshot"""
+    client.get(reverse('menu'))
+    dish = test_data['dish1']
+    dish.name = 'Caesar Salad'
+    dish.save()
+    dish.tags.add(test_data['tag2'])
+    response = client.get(reverse('menu'))
+    dishes = [item.dish for category in response.context['categories'] for item in category.filtered_items]
+    renamed = next(d for d in dishes if d == dish)
+    assert renamed.name == 'Caesar Salad'
+    assert test_data['tag2'] in renamed.tags.all()
+
+
+@pytest.mark.django_db(transaction=True)
+def test_menu_snapshot_rebuild_limited_to_affected_menus(test_data):
+    """Editing a dish rebuilds only the snapshots of the menus it leaves or joins"""
+    from core.models import MenuSnapshot
+    from core.snapshots import rebuild_menu_snapshots
+    rebuild_menu_snapshots()
+    MenuSnapshot.objects.update(built_at=timezone.now() - timezone.timedelta(days=1))
+
+    def rebuilt():
+        stale = timezone.now() - timezone.timedelta(hours=1)
+        return set(MenuSnapshot.objects.filter(built_at__gt=stale).values_list('menu_id', flat=True))
+
+    dish = test_data['dish1']
+    dish.name = 'Caesar Salad'
+    dish.save()
+    assert rebuilt() == {test_data['menu1'].id}
+
+    MenuSnapshot.objects.update(built_at=timezone.now() - timezone.timedelta(days=1))
+    moved = test_data['dish3']
+    moved.menu = test_data['menu3']
+    moved.save()
+    assert rebuilt() == {test_data['menu2'].id, test_data['menu3'].id}
+    payload = MenuSnapshot.objects.get(menu=test_data['menu2']).payload
+    assert moved.id not in [item['dish']['id'] for category in payload['categories'] for item in category['items']]
+
+    MenuSnapshot.objects.update(built_at=timezone.now() - timezone.timedelta(days=1))
+    test_data['tag2'].dishes.clear()
+    assert rebuilt() == {test_data['menu1'].id}
+
+
+@pytest.mark.django_db(transaction=True)
+def test_cached_data_invalidated_on_save(client, test_data):
+    """Editing a cached model bumps its generation so the next read is fresh"""
+    from core.views import get_cached_data
+    assert [f.title for f in get_cached_data(Feature, 'features')] == ['Special Offer']
+
+    feature = Feature.objects.get()
+    feature.title = 'Weekend Offer'
+    feature.save()
+    assert [f.title for f in get_cached_data(Feature, 'features')] == ['Weekend Offer']
+
+    feature.delete()
+    assert not get_cached_data(Feature, 'features')
+
+
+@pytest.mark.django_db
+def test_cached_data_stores_compact_rows(test_data, django_assert_num_queries):
+    """get_cached_data caches lightweight rows with the fields templates read"""
+    from core.records import FeatureRow
+    from core.views import get_cached_data
+    features = get_cached_data(Feature, 'features')
+    assert isinstance(features.first(), FeatureRow)
+    assert features.first().image.url.startswith('/media/features/')
+    assert features.first().discount == 20
+
+    # Повторное чтение — только обращение к кэшу
+    with django_assert_num_queries(0):
+        assert get_cached_data(Feature, 'features') == features
+
+
+@pytest.mark.django_db
+def test_deliver_newsletter_batches(mailoutbox):
+    """Subscribers are streamed in batches and every address gets one email"""
+    from core.models import NewsletterSubscriber
+    from core.newsletter import deliver_newsletter
+    for i in range(5):
+        NewsletterSubscriber.objects.create(email=f'reader{i}@example.com')
+
+    progress = []
+    report = deliver_newsletter('News', 'Hello', NewsletterSubscriber.objects.all(),
+                                batch_size=2, workers=2, progress=lambda r: progress.append(r.sent))
+
+    assert (report.total, report.sent, report.failed, report.batches) == (5, 5, 0, 3)
+    assert report.finished and progress[-1] == 5
+    assert sorted(m.to[0] for m in mailoutbox) == [f'reader{i}@example.com' for i in range(5)]
+
+
+@pytest.mark.django_db
+def test_send_newsletter_view(admin_client, mailoutbox, settings):
+    """Staff can send the newsletter to all subscribers"""
+    from core.models import NewsletterSubscriber
+    settings.NEWSLETTER_BACKGROUND = False
+    NewsletterSubscriber.objects.create(email='reader@example.com')
+    response = admin_client.post(reverse('send_newsletter'), {'subject': 'News', 'message': 'Hello'})
+    assert response.status_code == 302
+    assert [m.to for m in mailoutbox] == [['reader@example.com']]
+
+
+@pytest.mark.django_db
+def test_background_newsletter_goes_through_outbox(admin_client, mailoutbox, monkeypatch):
+    """Background delivery queues one outbox email per subscriber and reports progress from the queue"""
+    from django.core.mail.backends.locmem import EmailBackend
+    from core.models import NewsletterSubscriber, OutboundEmail
+    from core.newsletter import get_delivery_progress, send_batch
+    from core.outbox import drain
+    for i in range(3):
+        NewsletterSubscriber.objects.create(email=f'reader{i}@example.com')
+
+    response = admin_client.post(reverse('send_newsletter'), {'subject': 'News', 'message': 'Hello'})
+    job_id = response['Location'].split('job=')[1]
+    assert mailoutbox == []
+    assert OutboundEmail.objects.filter(newsletter_job=job_id).count() == 3
+    assert get_delivery_progress(job_id)['pending'] == 3
+    assert get_delivery_progress('unknown') is None
+
+    drain()
+    progress = get_delivery_progress(job_id)
+    assert (progress['sent'], progress['failed'], progress['finished']) == (3, 0, True)
+    assert sorted(m.to[0] for m in mailoutbox) == [f'reader{i}@example.com' for i in range(3)]
+
+    # Сбой на одном адресе не засчитывает неудачными уже отправленные письма
+    send = EmailBackend.send_messages
+
+    def flaky(self, messages):
+        if messages[0].to == ['bounce@example.com']:
+            raise ConnectionError('mailbox unavailable')
+        return send(self, messages)
+    monkeypatch.setattr(EmailBackend, 'send_messages', flaky)
+    assert send_batch('News', 'Hello', 'noreply@chefer.com', ['a@example.com', 'bounce@example.com', 'b@example.com']) == 2
+
+
+@pytest.mark.django_db
+def test_contact_queues_emails(client, mailoutbox, monkeypatch):
+    """Contact form stores the message and queues emails without sending"""
+    from captcha.conf import settings as captcha_settings
+    from core.models import ContactMessage, OutboundEmail
+    from core.outbox import drain
+    monkeypatch.setattr(captcha_settings, 'CAPTCHA_TEST_MODE', True)
+    response = client.post(reverse('contact'), {
+        'name': 'Anna', 'email': 'anna@example.com', 'subject': 'Booking request',
+        'message': 'A table for four, please.', 'captcha_0': 'x', 'captcha_1': 'PASSED',
+    })
+    assert response.status_code == 200
+    assert response.context['success_message']
+    message = ContactMessage.objects.get()
+    assert message.outbound_emails.filter(status=OutboundEmail.STATUS_PENDING).count() == 2
+    assert mailoutbox == []
+
+    stats = drain()
+    assert (stats.sent, stats.retried) == (2, 0)
+    assert sorted(m.to[0] for m in mailoutbox) == ['admin@chefer.com', 'anna@example.com']
+
+
+@pytest.mark.django_db
+def test_outbox_retries_then_dead_letters(monkeypatch):
+    """Failed sends are retried with backoff and dead-lettered after max attempts"""
+    from django.core.mail.backends.locmem import EmailBackend
+    from core.models import OutboundEmail
+    from core.outbox import enqueue_email, process_batch
+
+    def fail(self, messages):
+        raise ConnectionError('relay down')
+    monkeypatch.setattr(EmailBackend, 'send_messages', fail)
+
+    email = enqueue_email('Hi', 'Body', 'guest@example.com')
+    stats = process_batch(max_attempts=2)
+    email.refresh_from_db()
+    assert stats.retried == 1
+    assert email.status == OutboundEmail.STATUS_PENDING and email.attempts == 1
+    assert email.next_attempt_at > timezone.now()
+
+    OutboundEmail.objects.update(next_attempt_at=timezone.now())
+    assert process_batch(max_attempts=2).dead == 1
+    email.refresh_from_db()
+    assert email.status == OutboundEmail.STATUS_DEAD and email.last_error == 'relay down'
+
+
+@pytest.mark.django_db(transaction=True)
+def test_instagram_feed_cached_and_invalidated(test_image, django_assert_num_queries):
+    """Instagram feed is lazy, cached in-process and refreshed after a save"""
+    from core.context_processors import instagram_context
+    from core.models import InstagramImage
+    InstagramImage.objects.create(image=test_image, link='https://instagram.com/p/1')
+
+    with django_assert_num_queries(0):
+        context = instagram_context(None)
+    assert [image.link for image in context['instagram_images']] == ['https://instagram.com/p/1']
+    with django_assert_num_queries(0):
+        assert len(instagram_context(None)['instagram_images']) == 1
+
+    InstagramImage.objects.create(image=test_image)
+    assert len(instagram_context(None)['instagram_images']) == 2
+
+
+@pytest.mark.django_db
+def test_menu_search_index(test_data):
+    """Full-text index supports prefix matching and follows edits through signals"""
+    from core.search import search_menu_items
+    menu1 = test_data['menu1']
+    assert search_menu_items('veget', menu1.id) == [MenuItem.objects.get(title='Green Salad').id]
+    assert search_menu_items('@#$%', menu1.id) == []
+
+    dish = test_data['dish2']
+    dish.name = 'Harissa Chicken'
+    dish.save()
+    assert search_menu_items('hariss', menu1.id) == [dish.menu_items.get().id]
+
+    dish.menu_items.all().delete()
+    assert search_menu_items('hariss', menu1.id) == []
+
+
+def test_image_derivatives_and_srcset(settings, tmp_path):
+    """Derivatives are generated per width and exposed through the srcset tag"""
+    from io import BytesIO
+    from PIL import Image
+    from django.core.files.base import ContentFile
+    from django.core.files.storage import default_storage
+    from django.template import Context, Template
+    from core.images import generate_derivatives
+    from core.records import ImageURL
+    settings.MEDIA_ROOT = str(tmp_path)
+
+    buffer = BytesIO()
+    Image.new('RGB', (800, 600), 'orange').save(buffer, format='JPEG')
+    name = default_storage.save('dishes/photo.jpg', ContentFile(buffer.getvalue()))
+
+    manifest = generate_derivatives(name)
+    assert manifest['webp'] == [320, 640, 800]
+    with Image.open(tmp_path / 'derivatives' / 'dishes' / 'photo-320w.webp') as thumb:
+        assert thumb.size == (320, 240)
+
+    # Записи из кэша знают только URL — имя восстанавливается по MEDIA_URL
+    image = ImageURL(default_storage.url(name))
+    html = Template('{% load images %}{% srcset image %}').render(Context({'image': image}))
+    assert html == ', '.join(f'/media/derivatives/dishes/photo-{w}w.webp {w}w' for w in (320, 640, 800))
+
+
+def test_image_manifest_cache_remembers_misses_and_is_bounded(settings, tmp_path, monkeypatch):
+    """Missing manifests are cached briefly, generation replaces the miss and the cache stays bounded"""
+    from io import BytesIO
+    from unittest import mock
+    from PIL import Image
+    from django.core.files.base import ContentFile
+    from django.core.files.storage import default_storage
+    from core import images
+    settings.MEDIA_ROOT = str(tmp_path)
+    monkeypatch.setattr(images, '_manifests', images.OrderedDict())
+    monkeypatch.setattr(images, 'MANIFEST_CACHE_SIZE', 2)
+
+    buffer = BytesIO()
+    Image.new('RGB', (400, 300), 'green').save(buffer, format='JPEG')
+    name = default_storage.save('dishes/miss.jpg', ContentFile(buffer.getvalue()))
+
+    with mock.patch.object(default_storage, 'exists', wraps=default_storage.exists) as exists:
+        assert images.get_manifest(name) is None
+        assert images.get_manifest(name) is None
+        assert exists.call_count == 1
+
+    # Промах истёк — хранилище спрашивается снова
+    monkeypatch.setattr(images, 'MISSING_MANIFEST_TTL', 0)
+    images._manifests.clear()
+    with mock.patch.object(default_storage, 'exists', wraps=default_storage.exists) as exists:
+        images.get_manifest(name)
+        images.get_manifest(name)
+        assert exists.call_count == 2
+
+    manifest = images.generate_derivatives(name)
+    assert images.get_manifest(name) == manifest
+
+    images.get_manifest('dishes/a.jpg')
+    images.get_manifest('dishes/b.jpg')
+    assert list(images._manifests) == ['dishes/a.jpg', 'dishes/b.jpg']
+
+
+@pytest.mark.django_db
+def test_cached_page_gets_srcset_once_derivatives_are_built(client, settings, tmp_path, monkeypatch):
+    """Finishing the derivative job bumps the owner's generation, so a page cached without srcset is rebuilt"""
+    from io import BytesIO
+    from PIL import Image
+    from core import images
+    from core.models import BlogPost
+    settings.MEDIA_ROOT = str(tmp_path)
+    monkeypatch.setattr(images, '_manifests', images.OrderedDict())
+    cache.clear()
+
+    buffer = BytesIO()
+    Image.new('RGB', (700, 400), 'blue').save(buffer, format='JPEG')
+    post = BlogPost.objects.create(
+        title='Harvest', content='...', image=SimpleUploadedFile('harvest.jpg', buffer.getvalue()),
+    )
+
+    before = client.get(reverse('blog'))
+    assert before['X-Page-Cache'] == 'miss' and b'.webp' not in before.content
+    assert client.get(reverse('blog'))['X-Page-Cache'] == 'hit'
+
+    images.ensure_derivatives(post.image.name, model=BlogPost)
+    after = client.get(reverse('blog'))
+    assert after['X-Page-Cache'] == 'miss'
+    assert f'/media/derivatives/{post.image.name[:-4]}-320w.webp 320w'.encode() in after.content
+
+
+@pytest.mark.django_db
+def test_page_with_pending_derivatives_cached_briefly(client, settings, tmp_path, monkeypatch, test_image):
+    """A page rendered before its derivatives exist is cached only for IMAGE_MISSING_MANIFEST_TTL"""
+    from io import BytesIO
+    from unittest import mock
+    from PIL import Image
+    from core import images
+    from core.caching import DEFAULT_TIMEOUT, bump_generation
+    from core.models import BlogPost
+    settings.MEDIA_ROOT = str(tmp_path)
+    monkeypatch.setattr(images, '_manifests', images.OrderedDict())
+    cache.clear()
+
+    def page_timeouts():
+        with mock.patch.object(cache, 'set', wraps=cache.set) as cache_set:
+            assert client.get(reverse('blog'))['X-Page-Cache'] == 'miss'
+        return [call.args[2] for call in cache_set.call_args_list if call.args[0].startswith('page:')]
+
+    buffer = BytesIO()
+    Image.new('RGB', (500, 300), 'red').save(buffer, format='JPEG')
+    post = BlogPost.objects.create(title='Pending', content='...', image=SimpleUploadedFile('p.jpg', buffer.getvalue()))
+    assert page_timeouts() == [images.MISSING_MANIFEST_TTL]
+
+    images.ensure_derivatives(post.image.name, model=BlogPost)
+    assert page_timeouts() == [DEFAULT_TIMEOUT]
+
+    # У файла, который не картинка, производных не будет — ждать нечего
+    broken = BlogPost.objects.create(title='Broken', content='...', image=test_image)
+    images.ensure_derivatives(broken.image.name, model=BlogPost)
+    assert images.get_manifest(broken.image.name) == {}
+    bump_generation(BlogPost)
+    assert page_timeouts() == [DEFAULT_TIMEOUT]
+
+
+@pytest.mark.django_db
+def test_keyset_pagination(test_data, django_assert_num_queries):
+    """Cursor pagination walks the sorted snapshot categories by (name, id)"""
+    from core.models import Category
+    from core.pagination import KeysetPaginator
+    categories = list(Category.objects.order_by('name', 'id'))
+    names = [c.name for c in categories]
+
+    paginator = KeysetPaginator(categories, 3, count=len(categories))
+    with django_assert_num_queries(0):
+        first = paginator.get_page()
+    second = paginator.get_page(after=first.next_cursor)
+    third = paginator.get_page(after=second.next_cursor)
+    assert [c.name for page in (first, second, third) for c in page] == names
+    assert (second.number, third.number) == (2, 3)
+    assert not third.has_next() and third.has_previous()
+    assert [c.name for c in paginator.get_page(before=third.previous_cursor)] == names[3:6]
+    assert list(paginator.get_page(number=2)) == list(second)
+    assert list(paginator.page_range) == [1, 2, 3]
+
+
+@pytest.mark.django_db(transaction=True)
+def test_page_cache_for_anonymous_visitors(client, test_image, django_assert_num_queries):
+    """Anonymous pages are served from cache until a dependency changes"""
+    from core.models import BlogPost
+    cache.clear()
+    post = BlogPost.objects.create(title='Spring menu', content='...', image=test_image)
+
+    first = client.get(reverse('blog'))
+    assert first['X-Page-Cache'] == 'miss'
+    assert first['Surrogate-Key'] == 'core.blogpost core.instagramimage'
+    with django_assert_num_queries(0):
+        second = client.get(reverse('blog'))
+    assert second['X-Page-Cache'] == 'hit'
+    assert second.content.count(b'Spring menu') == first.content.count(b'Spring menu') > 0
+    assert b'__PAGE_CACHE_CSRF_TOKEN__' not in second.content
+    # Параметры, которые страница не читает, не создают новых записей
+    with django_assert_num_queries(0):
+        assert client.get(reverse('blog') + '?utm_source=mail&x=1')['X-Page-Cache'] == 'hit'
+    # index параметров не читает: все варианты — одна запись
+    assert client.get(reverse('index') + '?page=2&menu=1')['X-Page-Cache'] == 'miss'
+    assert client.get(reverse('index'))['X-Page-Cache'] == 'hit'
+    assert client.get(reverse('index') + '?utm_source=mail&menu=3')['X-Page-Cache'] == 'hit'
+
+    assert client.get(reverse('blog'), HTTP_IF_NONE_MATCH=second['ETag']).status_code == 304
+
+    post.title = 'Autumn menu'
+    post.save()
+    third = client.get(reverse('blog'))
+    assert third['X-Page-Cache'] == 'miss' and b'Autumn menu' in third.content
+
+
+@pytest.mark.django_db
+def test_async_views_match_sync_views(rf, test_data):
+    """Async views render the same pages as their sync counterparts"""
+    import re
+    from asgiref.sync import async_to_sync
+    from django.http import Http404
+    from django.test import AsyncRequestFactory
+    from core import async_views, views
+
+    def page(response):
+        return re.sub(rb'value="[\w-]{32,}"', b'', response.content)
+
+    menu1 = test_data['menu1']
+    cases = [
+        ('index', '/', ()),
+        ('menu', f'/menu/?menu={menu1.id}&search=salad', ()),
+        ('blog', '/blog/', ()),
+        ('dishes_by_tag', '/dishes/tag/Spicy/', ('Spicy',)),
+        ('dish_detail', f'/dish/{test_data["dish1"].id}/', (test_data['dish1'].id,)),
+    ]
+    for name, path, args in cases:
+        expected = getattr(views, name)(rf.get(path), *args)
+        actual = async_to_sync(getattr(async_views, name))(AsyncRequestFactory().get(path), *args)
+        assert actual.status_code == 200
+        assert page(actual) == page(expected), name
+
+    with pytest.raises(Http404):
+        async_to_sync(async_views.dish_detail)(AsyncRequestFactory().get('/dish/0/'), 0)
+
+
+@pytest.mark.django_db
+def test_route_query_counts_within_baseline():
+    """Every route stays within the stored query-count baseline on a small catalog"""
+    import json
+    from core.bench import (
+        BASELINE_PATH, EXACT_METRICS, compare_with_baseline, measure_routes, prepare_catalog, seed_catalog,
+    )
+    catalog = seed_catalog(items=60, categories=8, tags=5, posts=4, comments=20, features=2)
+    prepare_catalog()
+    results = measure_routes(catalog, repeat=0)
+
+    with open(BASELINE_PATH) as f:
+        baseline = json.load(f)['routes']
+    assert set(results) == set(baseline)
+    # Число запросов не зависит от размера каталога, поэтому базовая линия
+    # с полного прогона применима и здесь
+    assert compare_with_baseline(results, baseline, metrics=EXACT_METRICS) == []
+
+
+@pytest.mark.django_db
+def test_request_metrics_logged_and_exposed(client, test_data, caplog):
+    """Each request logs one JSON metrics record and returns Server-Timing"""
+    import json
+    import logging
+    from core.log import JsonFormatter
+    metrics_logger = logging.getLogger('core.requests')
+    metrics_logger.addHandler(caplog.handler)
+    try:
+        client.get(reverse('menu'))
+        response = client.get(reverse('menu') + '?search=salad')
+        # Статика и медиа не измеряются
+        def logged():
+            return len([r for r in caplog.records if r.name == 'core.requests'])
+        records = logged()
+        assert 'Server-Timing' not in client.get(test_data['dish1'].image.url)
+        assert 'Server-Timing' not in client.get('/static/css/missing.css')
+        assert logged() == records
+    finally:
+        metrics_logger.removeHandler(caplog.handler)
+
+    assert response['Server-Timing'].startswith('sql;dur=')
+    record = [r for r in caplog.records if r.name == 'core.requests'][-1]
+    data = json.loads(JsonFormatter().format(record))
+    assert data['view'] == 'menu' and data['status'] == 200
+    assert data['queries'] > 0 and 0 < len(data['slow_queries']) <= 3
+    assert data['sql_ms'] >= sum(query['ms'] for query in data['slow_queries']) - 0.01
+    assert data['render_ms'] > 0
+    # features уже в кэше после первого запроса
+    assert data['cache_hits'] == 1 and data['cache_misses'] == 0
+
+
+def test_queued_log_handler_overflow_and_sampling(tmp_path):
+    """Queued logging writes in the background, drops on overflow and samples DEBUG"""
+    import logging
+    from core.log import DebugSamplingFilter, queued_handler
+    path = tmp_path / 'app.log'
+    handler = queued_handler(
+        [{'class': 'logging.handlers.RotatingFileHandler', 'filename': path, 'maxBytes': 10_000, 'backupCount': 2}],
+        queue_size=3, overflow='drop_oldest',
+    )
+    handler.setFormatter(logging.Formatter('%(levelname)s %(message)s'))
+    handler.addFilter(DebugSamplingFilter(every=5))
+    logger = logging.getLogger('core.tests.queued')
+    logger.propagate = False
+    logger.setLevel(logging.DEBUG)
+    logger.addHandler(handler)
+    try:
+        # Писатель остановлен: очередь переполняется, старые записи вытесняются
+        handler.listener.stop()
+        for i in range(5):
+            logger.info('message %d', i)
+        assert handler.dropped == 2
+        handler.listener.start()
+        handler.flush()
+        logger.info('after overflow')
+        handler.flush()
+        for i in range(10):
+            logger.debug('chatter %d', i)
+        handler.flush()
+    finally:
+        logger.removeHandler(handler)
+        handler.close()
+
+    lines = path.read_text().splitlines()
+    assert lines[:3] == ['INFO message 2', 'INFO message 3', 'INFO message 4']
+    assert lines[3].startswith('WARNING Log queue overflow') and lines[4] == 'INFO after overflow'
+    assert lines[5:] == ['DEBUG chatter 0', 'DEBUG chatter 5']
+
+
+
+def test_logging_config_builds_queued_handlers(settings, tmp_path):
+    """settings.LOGGING passes dictConfig and tracebacks are formatted by the writer thread"""
+    import copy
+    import json
+    import logging
+    import logging.config
+    config = copy.deepcopy(settings.LOGGING)
+    config['handlers']['requests']['targets'][0]['filename'] = tmp_path / 'requests.log'
+    try:
+        logging.config.dictConfig(config)
+        handler = logging.getLogger('core.requests').handlers[0]
+        try:
+            1 / 0
+        except ZeroDivisionError:
+            logging.getLogger('core.requests').exception('failed %s', 'request', extra={'data': {'path': '/'}})
+        handler.flush()
+    finally:
+        logging.config.dictConfig(settings.LOGGING)
+
+    record = json.loads((tmp_path / 'requests.log').read_text())
+    assert record['message'] == 'failed request' and record['path'] == '/'
+    assert 'ZeroDivisionError' in record['exc_info']
+
+@pytest.mark.django_db
+def test_approved_comment_count_and_cached_pages(
+    client, test_image, settings, django_assert_num_queries, django_capture_on_commit_callbacks,
+):
+    """Approved comment counts are maintained and comment pages are served from cache"""
+    from django.contrib.admin.sites import site
+    from core.comments import get_approved_comments_page
+    from core.models import BlogPost, Comment
+    cache.clear()
+    post = BlogPost.objects.create(title='Post', content='...', image=test_image)
+    for i in range(25):
+        Comment.objects.create(post=post, name=f'Reader {i}', email=f'r{i}@example.com', content='Hi', is_approved=i < 22)
+    Comment.objects.create(post=post, name='Spam', email='spam@example.com', content='Buy')
+    post.refresh_from_db()
+    assert post.approved_comment_count == 22
+
+    page = get_approved_comments_page(post, 2, per_page=20)
+    assert len(page) == 2 and page.paginator.num_pages == 2
+    with django_assert_num_queries(0):
+        cached = get_approved_comments_page(post, 2, per_page=20)
+        assert [c.name for c in cached] == [c.name for c in page]
+
+    # Неодобренные комментарии не сбрасывают кэш, одобренный — только у своего поста
+    other = BlogPost.objects.create(title='Other', content='...', image=test_image)
+    assert len(get_approved_comments_page(other, 1)) == 0
+    with django_capture_on_commit_callbacks(execute=True):
+        Comment.objects.create(post=post, name='Bot', email='bot@example.com', content='Buy')
+        Comment.objects.create(post=other, name='Bot', email='bot@example.com', content='Buy')
+        Comment.objects.create(post=other, name='Ann', email='ann@example.com', content='Hi', is_approved=True)
+    other.refresh_from_db()
+    assert [c.name for c in get_approved_comments_page(other, 1)] == ['Ann']
+    with django_assert_num_queries(0):
+        get_approved_comments_page(post, 2, per_page=20)
+
+    # Модерация из админки пересчитывает счётчик
+    admin = site._registry[Comment]
+    admin.message_user = lambda *args, **kwargs: None
+    admin.approve_comments(None, Comment.objects.filter(post=post, is_approved=False))
+    post.refresh_from_db()
+    assert post.approved_comment_count == 27
+
+    response = client.get(reverse('blog_detail', args=[post.pk]) + '?page=2')
+    assert b'Comments (27)' in response.content
+    assert response.context['comments'].number == 2
+
+
+@pytest.mark.django_db
+def test_comment_avatar_hash_stored_on_save(test_image):
+    """The Gravatar hash is computed once on save and reused for every URL"""
+    import hashlib
+    from unittest import mock
+    from core.models import BlogPost, Comment
+    post = BlogPost.objects.create(title='Post', content='...', image=test_image)
+    comment = Comment.objects.create(post=post, name='Ann', email=' Ann@Example.com ', content='Hi', is_approved=True)
+    expected = hashlib.md5(b'ann@example.com').hexdigest()
+    assert Comment.objects.get().avatar_hash == expected
+
+    comment.email = 'bob@example.com'
+    comment.save(update_fields=['email'])
+    assert Comment.objects.get().avatar_hash == hashlib.md5(b'bob@example.com').hexdigest()
+
+    cache.clear()
+    from core.comments import get_approved_comments_page
+    post.refresh_from_db()
+    page = get_approved_comments_page(post)
+    assert len(page) == 1
+    with mock.patch('hashlib.md5') as md5:
+        urls = {row.get_gravatar_url() for row in page} | {c.get_gravatar_url(80) for c in Comment.objects.all()}
+    md5.assert_not_called()
+    assert urls == {
+        f'https://www.gravatar.com/avatar/{Comment.objects.get().avatar_hash}?s=50&d=identicon',
+        f'https://www.gravatar.com/avatar/{Comment.objects.get().avatar_hash}?s=80&d=identicon',
+    }
+
+
+@pytest.mark.django_db
+def test_hot_queries_use_indexes(test_data):
+    """EXPLAIN on SQLite shows the composite and partial indexes on hot paths"""
+    from django.db import connection
+    from core.models import BlogPost, Comment, ContactMessage, NewsletterSubscriber, OutboundEmail
+    if connection.vendor != 'sqlite':
+        pytest.skip('EXPLAIN output format is SQLite-specific')
+    post = BlogPost.objects.create(title='Post', content='...', image='blog/post.jpg')
+
+    def plan(queryset):
+        return queryset.explain()
+
+    assert 'comment_approved_post_idx' in plan(post.comments.filter(is_approved=True)[20:40])
+    assert 'comment_pending_idx' in plan(Comment.objects.filter(is_approved=False))
+    assert 'menuitem_category_dish_idx' in plan(
+        MenuItem.objects.filter(category=test_data['cat2'], dish__menu=test_data['menu1']).values('id')
+    )
+    assert 'contact_unread_idx' in plan(ContactMessage.objects.filter(is_read=False))
+    assert 'contact_created_idx' in plan(ContactMessage.objects.all()[:10])
+    assert 'subscriber_subscribed_idx' in plan(NewsletterSubscriber.objects.order_by('-subscribed_at')[:10])
+    assert 'blogpost_created_idx' in plan(BlogPost.objects.order_by('-created_at')[:3])
+    assert 'outbox_pending_idx' in plan(OutboundEmail.objects.filter(
+        status=OutboundEmail.STATUS_PENDING, next_attempt_at__lte=timezone.now(),
+    ).order_by('next_attempt_at')[:50])
+
+
+@pytest.mark.django_db
+def test_sqlite_pragmas_applied_to_new_connections(tmp_path, settings):
+    """Every new SQLite connection gets SQLITE_PRAGMAS, including WAL on a file database"""
+    from django.db import connection
+    from django.db.backends.sqlite3.base import DatabaseWrapper
+    from core.db import sqlite_pragmas
+    if connection.vendor != 'sqlite':
+        pytest.skip('SQLite-specific')
+    values = sqlite_pragmas(connection, ('synchronous', 'busy_timeout', 'temp_store', 'cache_size'))
+    assert values == {'synchronous': 1, 'busy_timeout': 5000, 'temp_store': 2, 'cache_size': -64000}
+
+    file_connection = DatabaseWrapper({**connection.settings_dict, 'NAME': str(tmp_path / 'db.sqlite3')})
+    try:
+        values = sqlite_pragmas(file_connection, ('journal_mode', 'mmap_size'))
+    finally:
+        file_connection.close()
+    assert values == {'journal_mode': 'wal', 'mmap_size': settings.SQLITE_PRAGMAS['mmap_size']}
+
+
+@pytest.mark.django_db(transaction=True)
+def test_replica_reads_with_primary_pin_after_post(tmp_path, settings):
+    """Catalog reads go to a lagging SQLite replica except right after a POST"""
+    from django.core.cache import caches
+    from django.core.exceptions import ImproperlyConfigured
+    from django.db import connections
+    from core.models import BlogPost, OutboundEmail
+    from core.replication import replicate
+    from core.routers import PIN_COOKIE
+    connections.settings['replica'] = {
+        **connections['default'].settings_dict, 'NAME': str(tmp_path / 'replica.sqlite3'),
+    }
+    settings.DATABASE_REPLICAS = ['replica']
+    # Сброс поколений из процесса replicate_sqlite не дошёл бы до LocMemCache сайта
+    from core.routers import check_replica_cache
+    assert [error.id for error in check_replica_cache()] == ['core.E001']
+    with pytest.raises(ImproperlyConfigured):
+        replicate()
+    settings.CACHES = {'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': str(tmp_path / 'cache'),
+    }}
+    assert check_replica_cache() == []
+
+    def replicate_in_other_process():
+        # Свой экземпляр кэша, как у отдельного процесса; общее у них — только хранилище
+        web_cache = caches['default']
+        caches['default'] = caches.create_connection('default')
+        try:
+            replicate()
+        finally:
+            caches['default'] = web_cache
+
+    # Псевдоним появился после начала теста: соединение открывается явно
+    connections['replica'].connect()
+    try:
+        post = BlogPost.objects.create(title='Original', content='...', image='blog/post.jpg')
+        replicate_in_other_process()
+        BlogPost.objects.filter(pk=post.pk).update(title='Edited')  # реплика отстаёт
+
+        assert BlogPost.objects.get(pk=post.pk).title == 'Original'
+        assert OutboundEmail.objects.db_manager().db == 'default'
+        client = Client()
+        url = reverse('blog_detail', args=[post.pk])
+        assert b'Edited' not in client.get(url).content
+
+        response = client.post(url, {'name': 'Ann', 'email': 'ann@example.com', 'content': 'Hi'})
+        assert response.status_code == 302
+        assert PIN_COOKIE in response.cookies
+        assert b'Edited' in client.get(url).content
+
+        replicate_in_other_process()
+        assert b'Edited' in Client().get(url).content
+
+        # Сохранение сбрасывает поколение, но кэш страниц заполняется со старой
+        # реплики; сброс после копии убирает и эту страницу
+        post.title = 'Renamed'
+        post.save()
+        assert b'Renamed' not in Client().get(reverse('blog')).content
+        replicate_in_other_process()
+        assert b'Renamed' in Client().get(reverse('blog')).content
+    finally:
+        connections['replica'].close()
+        del connections['replica']
+        del connections.settings['replica']
+
+
+@pytest.mark.django_db
+def test_streaming_export_of_contacts_and_subscribers(admin_client):
+    """Admin actions and export_data stream rows in chunks as CSV and JSON"""
+    import csv
+    import io
+    import json
+    from django.core.management import call_command
+    from core.export import iter_csv, EXPORT_FIELDS
+    from core.models import ContactMessage, NewsletterSubscriber
+    ContactMessage.objects.bulk_create([
+        ContactMessage(name=f'Guest {i}', email=f'g{i}@example.com', subject='Hello', message='Hi, there')
+        for i in range(5)
+    ])
+    ContactMessage.objects.create(name='Mallory', email='m@example.com', subject='=HYPERLINK("x")', message='x')
+    NewsletterSubscriber.objects.create(email='reader@example.com')
+
+    response = admin_client.post(reverse('admin:core_contactmessage_changelist'), {
+        'action': 'export_csv', 'select_across': '1', 'index': '0',
+        '_selected_action': ContactMessage.objects.values_list('pk', flat=True)[:1],
+    })
+    assert response.streaming
+    assert response['Content-Disposition'].startswith('attachment; filename="contactmessage-')
+    rows = list(csv.reader(io.StringIO(b''.join(response.streaming_content).decode())))
+    assert rows[0] == list(EXPORT_FIELDS[ContactMessage])
+    assert len(rows) == 7
+    assert ["'=HYPERLINK(\"x\")"] == [row[3] for row in rows if row[1] == 'Mallory']
+
+    chunks = list(iter_csv(ContactMessage.objects.order_by('pk'), EXPORT_FIELDS[ContactMessage], chunk_size=2))
+    assert len(chunks) == 4
+
+    out = io.StringIO()
+    call_command('export_data', 'subscribers', '--format', 'json', stdout=out)
+    assert [row['email'] for row in json.loads(out.getvalue())] == ['reader@example.com']
+
+
+@pytest.mark.django_db
+def test_fragment_cache_keyed_on_generations_and_template_preload():
+    """cached_include reuses fragment HTML until a dependency's generation changes"""
+    from django.template import engines
+    from core.caching import bump_generation
+    from core.models import Testimonial
+    from core.templating import preload_templates
+    cache.clear()
+    engine = engines.all()[0]
+    page = engine.from_string('{% load fragments %}{% cached_include "includes/blog_part.html" page %}')
+    first = [{'id': 1, 'title': 'First post', 'image': None, 'created_at': timezone.now()}]
+    second = [{'id': 2, 'title': 'Second post', 'image': None, 'created_at': timezone.now()}]
+
+    assert 'First post' in page.render({'blog_posts': first, 'page': 'index'})
+    assert 'First post' in page.render({'blog_posts': second, 'page': 'index'})
+    assert 'Second post' in page.render({'blog_posts': second, 'page': 'blog'})
+    from core.models import BlogPost
+    bump_generation(BlogPost)
+    assert 'Second post' in page.render({'blog_posts': second, 'page': 'index'})
+    # Правка отзывов не трогает фрагмент блога
+    bump_generation(Testimonial)
+    assert 'Second post' in page.render({'blog_posts': first, 'page': 'index'})
+
+    # В ключ входят только перечисленные параметры запроса, без учёта порядка
+    from django.test import RequestFactory
+    keyed = engine.from_string(
+        '{% load fragments %}{% cached_include "includes/blog_part.html" request|query_params:"menu page" %}'
+    )
+
+    def render(path, posts):
+        return keyed.render({'blog_posts': posts, 'request': RequestFactory().get(path)})
+    assert 'First post' in render('/?menu=1&page=2', first)
+    assert 'First post' in render('/?page=2&utm_source=mail&menu=1', second)
+    assert 'Second post' in render('/?menu=1', second)
+
+    assert preload_templates() >= 20
+    cached_loader = engine.engine.template_loaders[0]
+    assert 'index.html' in {key.split('-')[0] for key in cached_loader.get_template_cache}
+
+
+@pytest.mark.django_db
+def test_fragment_with_pending_derivatives_refreshed_when_built(settings, tmp_path, monkeypatch):
+    """A fragment cached with an empty srcset is short-lived, marks the request and is rebuilt after the job"""
+    from io import BytesIO
+    from PIL import Image
+    from django.core.files.base import ContentFile
+    from django.core.files.storage import default_storage
+    from django.template import engines
+    from django.test import RequestFactory
+    from core import images
+    from core.models import BlogPost
+    from core.records import ImageURL
+    settings.MEDIA_ROOT = str(tmp_path)
+    monkeypatch.setattr(images, '_manifests', images.OrderedDict())
+    cache.clear()
+
+    buffer = BytesIO()
+    Image.new('RGB', (500, 300), 'purple').save(buffer, format='JPEG')
+    name = default_storage.save('blog/fragment.jpg', ContentFile(buffer.getvalue()))
+    posts = [{'id': 1, 'title': 'Fresh', 'image': ImageURL(default_storage.url(name)), 'created_at': timezone.now()}]
+    page = engines.all()[0].from_string('{% load fragments %}{% cached_include "includes/blog_part.html" %}')
+
+    def render():
+        request = RequestFactory().get('/blog/')
+        return page.render({'blog_posts': posts, 'request': request}), getattr(request, 'pending_derivatives', 0)
+
+    html, pending = render()
+    assert 'srcset=""' in html and pending == 1
+    # Повтор из кэша тоже помечает запрос, чтобы страница не закэшировалась надолго
+    html, pending = render()
+    assert 'srcset=""' in html and pending == 1
+
+    images.ensure_derivatives(name, model=BlogPost)
+    html, pending = render()
+    assert '/media/derivatives/blog/fragment-320w.webp 320w' in html and pending == 0
+
+
+def test_static_pipeline_hashed_compressed_and_ranges(tmp_path, settings):
+    """collectstatic writes hashed .gz siblings; the middleware negotiates encoding and ranges"""
+    import gzip
+    from django.contrib.staticfiles.storage import staticfiles_storage
+    from django.core.management import call_command
+    source = tmp_path / 'src'
+    source.mkdir()
+    css = ('body { color: #222; }\n' * 50).encode()
+    (source / 'site.css').write_bytes(css)
+    settings.STATICFILES_DIRS = [str(source)]
+    settings.STATIC_ROOT = str(tmp_path / 'root')
+    call_command('collectstatic', interactive=False, verbosity=0)
+
+    url = staticfiles_storage.url('site.css')
+    assert url != '/static/site.css' and (tmp_path / 'root' / (url[len('/static/'):] + '.gz')).exists()
+    client = Client()
+
+    response = client.get(url, HTTP_ACCEPT_ENCODING='gzip, deflate')
+    assert response['Content-Encoding'] == 'gzip'
+    assert response['Cache-Control'] == 'public, max-age=31536000, immutable'
+    assert 'Accept-Encoding' in response['Vary']
+    assert gzip.decompress(b''.join(response.streaming_content)) == css
+    assert client.get(url, HTTP_ACCEPT_ENCODING='gzip', HTTP_IF_NONE_MATCH=response['ETag']).status_code == 304
+
+    plain = client.get(url)
+    assert 'Content-Encoding' not in plain and b''.join(plain.streaming_content) == css
+    partial = client.get(url, HTTP_RANGE='bytes=5-14', HTTP_ACCEPT_ENCODING='gzip')
+    assert partial.status_code == 206
+    assert b''.join(partial.streaming_content) == css[5:15]
+    assert partial['Content-Range'] == f'bytes 5-14/{len(css)}'
+    assert client.get(url, HTTP_RANGE=f'bytes={len(css)}-').status_code == 416
+
+    assert client.get('/static/site.css')['Cache-Control'] == 'public, max-age=60'
+    from core.staticfiles import StaticFilesMiddleware
+    assert StaticFilesMiddleware(lambda request: None).find('../src/site.css') is None
+
+    # Под ASGI файл читается асинхронно, остальные запросы идут дальше без потоков
+    from asgiref.sync import async_to_sync, iscoroutinefunction
+    from django.test import AsyncRequestFactory
+
+    async def downstream(request):
+        return 'next'
+
+    async def read(response):
+        return b''.join([chunk async for chunk in response.streaming_content])
+
+    middleware = StaticFilesMiddleware(downstream)
+    assert iscoroutinefunction(middleware)
+    factory = AsyncRequestFactory()
+    response = async_to_sync(middleware)(factory.get(url, headers={'Accept-Encoding': 'gzip'}))
+    assert response.is_async and gzip.decompress(async_to_sync(read)(response)) == css
+    partial = async_to_sync(middleware)(factory.get(url, headers={'Range': 'bytes=5-14'}))
+    assert partial.is_async and async_to_sync(read)(partial) == css[5:15]
+    assert async_to_sync(middleware)(factory.get('/menu/')) == 'next'
+
+
+def test_static_metadata_rechecked_for_unhashed_names(tmp_path, settings):
+    """Unhashed static files rewritten in place are served with fresh length and ETag"""
+    import os
+    from django.test import RequestFactory
+    from core.staticfiles import StaticFilesMiddleware
+    settings.DEBUG = False
+    settings.STATIC_ROOT = str(tmp_path)
+    middleware = StaticFilesMiddleware(lambda request: None)
+    factory = RequestFactory()
+    robots = tmp_path / 'robots.txt'
+    robots.write_bytes(b'User-agent: *\n')
+    (tmp_path / 'app.0123456789ab.js').write_bytes(b'let a = 1;')
+
+    first = middleware(factory.get('/static/robots.txt'))
+    assert int(first['Content-Length']) == 14
+    robots.write_bytes(b'User-agent: *\nDisallow: /admin/\n')
+    stat = os.stat(robots)
+    os.utime(robots, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    second = middleware(factory.get('/static/robots.txt'))
+    assert int(second['Content-Length']) == 32 and second['ETag'] != first['ETag']
+    assert b''.join(second.streaming_content) == b'User-agent: *\nDisallow: /admin/\n'
+
+    robots.unlink()
+    assert middleware.find('robots.txt') is None and 'robots.txt' not in middleware.files
+    # Имя с хэшем содержимого не перепроверяется
+    hashed = middleware.find('app.0123456789ab.js')
+    assert middleware.find('app.0123456789ab.js') is hashed
+
+
+@pytest.mark.django_db
+def test_media_serving_modes(tmp_path, settings):
+    """Media is handed off via X-Accel-Redirect/X-Sendfile or streamed with ETag and ranges"""
+    from django.test import RequestFactory
+    from django.http import Http404
+    from core.media import serve_media
+    settings.MEDIA_ROOT = str(tmp_path)
+    (tmp_path / 'dishes').mkdir()
+    data = bytes(range(256)) * 40
+    (tmp_path / 'dishes' / 'soup one.jpg').write_bytes(data)
+    factory = RequestFactory()
+
+    response = serve_media(factory.get('/media/dishes/soup one.jpg'), 'dishes/soup one.jpg')
+    assert response['Content-Type'] == 'image/jpeg'
+    assert int(response['Content-Length']) == len(data)
+    assert b''.join(response.streaming_content) == data
+    etag = response['ETag']
+    response.close()
+    assert serve_media(factory.get('/', HTTP_IF_NONE_MATCH=etag), 'dishes/soup one.jpg').status_code == 304
+
+    partial = serve_media(factory.get('/', HTTP_RANGE='bytes=-100'), 'dishes/soup one.jpg')
+    assert partial.status_code == 206
+    assert partial['Content-Range'] == f'bytes {len(data) - 100}-{len(data) - 1}/{len(data)}'
+    assert b''.join(partial.streaming_content) == data[-100:]
+    partial.close()
+    stale = serve_media(factory.get('/', HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"old"'), 'dishes/soup one.jpg')
+    assert stale.status_code == 200
+    stale.close()
+
+    settings.MEDIA_SERVE_BACKEND = 'nginx'
+    response = serve_media(factory.get('/'), 'dishes/soup one.jpg')
+    assert response['X-Accel-Redirect'] == '/protected-media/dishes/soup%20one.jpg'
+    assert response.content == b''
+    settings.MEDIA_SERVE_BACKEND = 'sendfile'
+    assert serve_media(factory.get('/'), 'dishes/soup one.jpg')['X-Sendfile'] == str(tmp_path / 'dishes' / 'soup one.jpg')
+
+    with pytest.raises(Http404):
+        serve_media(factory.get('/'), '../secret.txt')
+    assert serve_media(factory.post('/'), 'dishes/soup one.jpg').status_code == 405
+
+
+@pytest.mark.django_db
+def test_rate_limit_token_buckets_per_ip_and_email(settings):
+    """Form POSTs get 429 with Retry-After once the IP or e-mail bucket is empty"""
+    import time
+    from unittest import mock
+    from asgiref.sync import async_to_sync
+    from django.test import RequestFactory
+    from core.models import NewsletterSubscriber
+    from core.ratelimit import acheck_rate
+    cache.clear()
+    settings.RATE_LIMITS = {'newsletter': {'ip': '2/m', 'email': '1/h'}}
+    url = reverse('newsletter_subscribe')
+    client = Client()
+
+    assert client.post(url, {'email': 'a@example.com'}).status_code == 200
+    denied = client.post(url, {'email': 'A@example.com '})
+    assert denied.status_code == 429
+    assert 3000 < int(denied['Retry-After']) <= 3600
+    assert client.post(url, {'email': 'b@example.com'}).status_code == 200
+    denied = client.post(url, {'email': 'c@example.com'})
+    assert denied.status_code == 429 and int(denied['Retry-After']) <= 30
+    assert client.post(url, {'email': 'd@example.com'}, REMOTE_ADDR='10.0.0.2').status_code == 200
+    assert client.get(url).status_code == 200
+    assert set(NewsletterSubscriber.objects.values_list('email', flat=True)) == {
+        'a@example.com', 'b@example.com', 'd@example.com',
+    }
+
+    # Через 30 секунд IP-корзина получает жетон обратно
+    with mock.patch('core.ratelimit.time.time', return_value=time.time() + 30):
+        assert client.post(url, {'email': 'e@example.com'}).status_code == 200
+    request = RequestFactory().post(url, {'email': 'f@example.com'}, REMOTE_ADDR='10.0.0.3')
+    assert async_to_sync(acheck_rate)(request, 'newsletter') is None
+    assert async_to_sync(acheck_rate)(request, 'newsletter') > 0
+
+
+@pytest.mark.django_db
+def test_captcha_pool_serves_prerendered_images(client, monkeypatch):
+    """Contact captchas come from a pre-rendered pool, each key once, images from cache"""
+    import datetime
+    from captcha.models import CaptchaStore
+    from django.utils import timezone
+    from core import captcha_pool
+    from core.models import ContactMessage
+    cache.clear()
+    refills = []
+    monkeypatch.setattr(captcha_pool, 'refill_in_background', lambda: refills.append(1))
+    CaptchaStore.objects.create(challenge='1+1=', response='2', expiration=timezone.now() - datetime.timedelta(minutes=1))
+
+    captcha_pool.refill(size=2)
+    stores = {store.hashkey: store for store in CaptchaStore.objects.all()}
+    assert len(stores) == 2
+
+    response = client.get(reverse('contact'))
+    key = response.context['form']['captcha'].field.widget._key
+    assert key in stores and refills
+
+    monkeypatch.setattr('captcha.views._captcha_image', lambda *args: pytest.fail('rendered on request'))
+    image = client.get(f'/captcha/image/{key}/')
+    assert image['Content-Type'] == 'image/png' and image.content.startswith(b'\x89PNG')
+
+    response = client.post(reverse('contact'), {
+        'name': 'Anna', 'email': 'anna@example.com', 'subject': 'Booking request',
+        'message': 'A table for four, please.', 'captcha_0': key, 'captcha_1': stores[key].response,
+    })
+    assert response.context['success_message'] and ContactMessage.objects.count() == 1
+    assert not CaptchaStore.objects.filter(hashkey=key).exists()
+
+    # Форма после отправки взяла второй ключ; дальше — обычные капчи библиотеки
+    assert captcha_pool.take_key() is None
+    response = client.get(reverse('contact'))
+    assert response.context['form']['captcha'].field.widget._key not in stores
+
+
+def test_captcha_fields_never_reach_library_pool_pick():
+    """With CAPTCHA_GET_FROM_POOL on, every CaptchaField and the refresh route use core.captcha_pool"""
+    import inspect
+    from captcha.fields import CaptchaField
+    from django import forms as django_forms
+    from django.urls import resolve
+    from core import captcha_pool, forms
+    fields = [
+        field
+        for _, form in inspect.getmembers(forms, inspect.isclass)
+        if issubclass(form, django_forms.BaseForm)
+        for field in form.base_fields.values()
+        if isinstance(field, CaptchaField)
+    ]
+    assert fields and all(isinstance(field.widget, captcha_pool.PooledCaptchaTextInput) for field in fields)
+    assert resolve('/captcha/refresh/').func is captcha_pool.captcha_refresh
+    assert resolve('/captcha/image/abc/').func is captcha_pool.captcha_image
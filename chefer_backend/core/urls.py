@@ -1,8 +1,13 @@
 from django.urls import path
+from django.conf import settings
 from . import views
 from .views import *
 from django.conf.urls import include
 
+# Под ASGI публичные страницы обслуживаются асинхронными представлениями
+if getattr(settings, 'CORE_ASYNC_VIEWS', False):
+    from .async_views import blog, blog_detail, dish_detail, dishes_by_tag, index, menu
+
 urlpatterns = [
     path('', index, name='index'),
     path('about/', about, name='about'),
@@ -1,22 +1,31 @@
 from django.shortcuts import get_object_or_404, redirect, render
+from django.urls import reverse
 from django import forms
-from django.core.paginator import Paginator
 from django.core.cache import cache
-from django.core.mail import send_mail
 from django.conf import settings
+from django.db import transaction
 from django.core.validators import validate_email
 from django.core.exceptions import ValidationError
 from typing import Dict, List, Optional, Any
 from .models import *
 import logging
-from django.http import HttpResponse
+from django.http import Http404, HttpResponse
 from django.views.decorators.http import require_http_methods
 from django.utils.translation import gettext_lazy as _
 from captcha.fields import CaptchaField
 from .forms import *
 from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib import messages
-from django.db.models import Prefetch, Q
+from .caching import DEFAULT_TIMEOUT as CACHE_TIMEOUT, aversioned_key, versioned_key
+from .comments import get_approved_comments_page
+from .instrumentation import record_cache_lookup
+from .outbox import enqueue_email
+from .newsletter import deliver_newsletter, get_delivery_progress, start_delivery
+from .records import ato_rows, to_rows
+from .pagination import KeysetPaginator
+from .ratelimit import ratelimit
+from .search import search_menu_items
+from .snapshots import get_menu_categories
 
 # Настройка логгера
 logger = logging.getLogger(__name__)
@@ -37,7 +46,6 @@ ERROR_MESSAGES = {
     'message_required': 'Message is required',
     'message_too_short': f'Message must be at least {MIN_MESSAGE_LENGTH} characters long',
     'save_error': 'Sorry, there was an error processing your message. Please try again later.',
-    'email_error': 'Message saved but there was an error sending emails.',
     'success': 'Your message has been sent successfully!',
 }
 
@@ -68,58 +76,121 @@ EMAIL_TEMPLATES = {
     ''',
 }
 
+def _cached_data_key(cache_key, limit, kwargs):
+    full_cache_key = f"{cache_key}_{limit}" if limit else cache_key
+    if kwargs:
+        full_cache_key += '_' + '_'.join(f'{key}={value}' for key, value in sorted(kwargs.items()))
+    return full_cache_key
+
+
+def _cached_data_queryset(model_class, limit, kwargs):
+    queryset = model_class.objects.filter(**kwargs)
+    if limit:
+        queryset = queryset[:limit]
+    return queryset
+
+
 def get_cached_data(model_class, cache_key, limit=None, **kwargs):
     """
     Универсальная функция для получения кэшированных данных
-    
+
+    Ключ версионируется поколением модели, которое сбрасывают сигналы
+    из `core.signals`, поэтому данные можно хранить долго. Значение —
+    кортеж записей из `core.records` с полями, нужными шаблонам.
+
     Args:
         model_class: Класс модели Django
         cache_key: Ключ для кэша
         limit: Ограничение количества записей (опционально)
         **kwargs: Дополнительные параметры для фильтрации
     """
-    full_cache_key = f"{cache_key}_{limit}" if limit else cache_key
+    full_cache_key = versioned_key(_cached_data_key(cache_key, limit, kwargs), model_class)
     data = cache.get(full_cache_key)
+    record_cache_lookup(data is not None)
     
-    if not data:
-        data = model_class.objects.filter(**kwargs)
-        if limit:
-            data = data[:limit]
-        cache.set(full_cache_key, data, 60 * 15)  # Кэш на 15 минут
+    if data is None:
+        # В кэш попадают компактные записи, а не QuerySet с экземплярами моделей
+        data = to_rows(_cached_data_queryset(model_class, limit, kwargs))
+        cache.set(full_cache_key, data, CACHE_TIMEOUT)
     
     return data
-  
-def get_menu_context(request):
-    menus = Menu.objects.all()
-    selected_menu_id = request.GET.get('menu')
-    selected_menu = get_object_or_404(Menu, id=selected_menu_id) if selected_menu_id else menus.first()
-
-    filtered_menu_items = Prefetch(
-        'menu_items',
-        queryset=MenuItem.objects.filter(dish__menu=selected_menu),
-        to_attr='filtered_items'
+
+
+async def aget_cached_data(model_class, cache_key, limit=None, **kwargs):
+    """Асинхронный вариант get_cached_data: async API кэша и ORM, те же ключи."""
+    full_cache_key = await aversioned_key(_cached_data_key(cache_key, limit, kwargs), model_class)
+    data = await cache.aget(full_cache_key)
+    record_cache_lookup(data is not None)
+
+    if data is None:
+        data = await ato_rows(_cached_data_queryset(model_class, limit, kwargs))
+        await cache.aset(full_cache_key, data, CACHE_TIMEOUT)
+
+    return data
+
+
+def get_selected_menu(menus, selected_menu_id):
+    """
+    Выбирает меню из уже загруженного списка без дополнительного запроса.
+    Неизвестный ID приводит к 404, отсутствие ID — к первому меню.
+    """
+    if not selected_menu_id:
+        return menus[0] if menus else None
+    for menu in menus:
+        if str(menu.id) == selected_menu_id:
+            return menu
+    raise Http404('No Menu matches the given query.')
+
+
+def paginate_categories(request, categories, per_page=5):
+    """
+    Курсорная пагинация категорий по (name, id). Снимок уже отсортирован
+    по этому ключу, а его длина служит готовым count для номеров страниц.
+    """
+    paginator = KeysetPaginator(categories, per_page, count=len(categories))
+    return paginator.get_page(
+        after=request.GET.get('after'),
+        before=request.GET.get('before'),
+        number=request.GET.get('page'),
     )
-    features = get_cached_data(Feature, 'features')
 
-    categories = Category.objects.filter(
-        menu_items__dish__menu=selected_menu
-    ).distinct().prefetch_related(
-        filtered_menu_items,
-        'menu_items__dish',
-        'menu_items__dish__tags'
-    ).order_by('name')
 
-    paginator = Paginator(categories, 5)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+def get_menu_context(request):
+    menus = list(Menu.objects.all())
+    selected_menu = get_selected_menu(menus, request.GET.get('menu'))
+    features = get_cached_data(Feature, 'features')
+
+    page_obj = paginate_categories(request, get_menu_categories(selected_menu))
 
     return {
         'categories': page_obj,
+        'page_obj': page_obj,
         'features': features,
         'menus': menus,
         'selected_menu': selected_menu,
     }
 
+def filter_menu_categories(page_obj, ranks, active_category_id):
+    """
+    Оставляет категории страницы, в которых есть пункты меню. Если задан
+    поиск (`ranks`: id пункта -> место в выдаче), пункты фильтруются и
+    сортируются по релевантности. Возвращает категории и активную категорию.
+    """
+    filtered_categories = []
+    for category in page_obj:
+        if ranks is not None:
+            category.filtered_items = tuple(sorted(
+                (item for item in category.items if item.id in ranks),
+                key=lambda item: ranks[item.id],
+            ))
+        if category.filtered_items:
+            filtered_categories.append(category)
+            # Найдена первая категория с результатами — запомним её
+            if active_category_id is None:
+                active_category_id = category.id
+    return filtered_categories, active_category_id or (filtered_categories[0].id if filtered_categories else None)
+
+
 def index(request):
     features = get_cached_data(Feature, 'features')
     testimonials = get_cached_data(Testimonial, 'testimonials')
@@ -128,22 +199,9 @@ def index(request):
     chefs = get_cached_data(Chef, 'chefs')
     categories = get_cached_data(Category, 'categories')
     
-    menus = Menu.objects.all()
-    selected_menu = menus.first()
-    
-    categories_for_index_menu = Category.objects.filter(
-        menu_items__dish__menu=selected_menu
-    ).distinct().prefetch_related(
-        Prefetch('menu_items',
-                 queryset=MenuItem.objects.filter(dish__menu=selected_menu),
-                 to_attr='filtered_items'),
-        'menu_items__dish',
-        'menu_items__dish__tags'
-    ).order_by('name')
-
-    for category in categories_for_index_menu:
-        if not hasattr(category, 'filtered_items') or not category.filtered_items:
-            category.filtered_items = category.menu_items.all()
+    menus = list(Menu.objects.all())
+    selected_menu = menus[0] if menus else None
+    categories_for_index_menu = get_menu_categories(selected_menu)
 
     context = {
         'features': features,
@@ -165,60 +223,26 @@ def index(request):
 
 def menu(request):
     # Получаем список всех меню
-    menus = Menu.objects.all()
-    active_category_id = None 
-    
+    menus = list(Menu.objects.all())
+
     # Получаем ID активной категории из GET-параметра
     active_category_id = request.GET.get('category')
-    if active_category_id:
-        try:
-            active_category = Category.objects.get(id=active_category_id)
-        except Category.DoesNotExist:
-            active_category = None
-            
 
     # Определяем выбранное меню
-    selected_menu_id = request.GET.get('menu')
-    if selected_menu_id:
-        selected_menu = get_object_or_404(Menu, id=selected_menu_id)
-    else:
-        selected_menu = menus.first()
+    selected_menu = get_selected_menu(menus, request.GET.get('menu'))
 
     # Получаем поисковый запрос
     search_query = request.GET.get('search', '').strip()
-    
 
-    # Получаем категории, у которых есть блюда из выбранного меню
-    categories = Category.objects.filter(
-        menu_items__dish__menu=selected_menu
-    ).distinct().prefetch_related(
-        'menu_items__dish',
-        'menu_items__dish__tags'
-    ).order_by('name')
+    # Категории с блюдами выбранного меню берём из снимка одним запросом
+    page_obj = paginate_categories(request, get_menu_categories(selected_menu))
 
-    # Пагинация
-    paginator = Paginator(categories, 5)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    # Поиск — один запрос к полнотекстовому индексу, результат упорядочен по релевантности
+    ranks = None
+    if search_query and selected_menu:
+        ranks = {item_id: rank for rank, item_id in enumerate(search_menu_items(search_query, selected_menu.id))}
 
-    # Для каждой категории фильтруем menu_items
-    filtered_categories = []
-    for category in page_obj:
-        items = category.menu_items.filter(dish__menu=selected_menu)
-        if search_query:
-            items = items.filter(
-                Q(dish__name__icontains=search_query) |
-                Q(title__icontains=search_query) |
-                Q(dish__description__icontains=search_query) |
-                Q(description__icontains=search_query) |
-                Q(category__name__icontains=search_query)
-            )
-        category.filtered_items = items
-        if items.exists():
-            filtered_categories.append(category)
-        # Найдена первая категория с результатами — запомним её
-        if active_category_id is None and items.exists():
-            active_category_id = category.id
+    filtered_categories, active_category_id = filter_menu_categories(page_obj, ranks, active_category_id)
 
     context = {
         'title': 'Menu',
@@ -226,12 +250,13 @@ def menu(request):
         'name': 'Our Menu',
         'description': "Explore our delicious menu",
         'categories': filtered_categories,
+        'page_obj': page_obj,
         'features': get_cached_data(Feature, 'features'),
         'menus': menus,
         'selected_menu': selected_menu,
         'search_query': search_query,
         'show_search': True,
-        'active_category_id': active_category_id or (filtered_categories[0].id if filtered_categories else None),
+        'active_category_id': active_category_id,
     }
 
     return render(request, 'menu.html', context)
@@ -279,80 +304,41 @@ def about(request):
     return render(request, 'about.html', context)
 
 
-def send_contact_emails(name: str, email: str, subject: str, message: str) -> bool:
+def queue_contact_emails(name: str, email: str, subject: str, message: str,
+                         contact_message: Optional[ContactMessage] = None) -> None:
     """
-    Отправка email-уведомлений
+    Постановка email-уведомлений в очередь OutboundEmail.
+    Письма отправляет команда `process_outbox`, запрос не ждёт SMTP.
     
     Args:
         name: Имя отправителя
         email: Email отправителя
         subject: Тема сообщения
         message: Текст сообщения
-        
-    Returns:
-        bool: True если письма отправлены успешно, False в случае ошибки
+        contact_message: Сообщение, к которому относятся письма
     """
     from_email = settings.DEFAULT_FROM_EMAIL or 'noreply@example.com'
     admin_email = settings.ADMIN_EMAIL or 'admin@example.com'
-    
-    try:
-        # Подготовка данных для писем
-        admin_subject = EMAIL_TEMPLATES['admin_subject'].format(subject=subject)
-        admin_message = EMAIL_TEMPLATES['admin_message'].format(
-            name=name,
-            email=email,
-            subject=subject,
-            message=message
-        )
-        
-        user_subject = EMAIL_TEMPLATES['user_subject']
-        user_message = EMAIL_TEMPLATES['user_message'].format(
-            name=name,
-            message=message
-        )
-        
-        # Отправка письма администратору
-        try:
-            logger.info(f"Attempting to send admin notification to {admin_email}")
-            send_mail(
-                admin_subject,
-                admin_message,
-                from_email,
-                [admin_email],
-                fail_silently=False,  # Изменено на False для получения ошибок
-            )
-            logger.info(f"Admin notification sent successfully to {admin_email}")
-        except Exception as e:
-            logger.error(f"Failed to send admin notification: {str(e)}", exc_info=True)
-            logger.error(f"Email settings: host={settings.EMAIL_HOST}, port={settings.EMAIL_PORT}, "
-                        f"use_tls={settings.EMAIL_USE_TLS}, from_email={from_email}")
-            return False
-        
-        # Отправка подтверждения пользователю
-        try:
-            logger.info(f"Attempting to send user confirmation to {email}")
-            send_mail(
-                user_subject,
-                user_message,
-                from_email,
-                [email],
-                fail_silently=False,  # Изменено на False для получения ошибок
-            )
-            logger.info(f"User confirmation sent successfully to {email}")
-        except Exception as e:
-            logger.error(f"Failed to send user confirmation: {str(e)}", exc_info=True)
-            logger.error(f"Email settings: host={settings.EMAIL_HOST}, port={settings.EMAIL_PORT}, "
-                        f"use_tls={settings.EMAIL_USE_TLS}, from_email={from_email}")
-            return False
-        
-        return True
-    except Exception as e:
-        logger.error(f"Unexpected error in send_contact_emails: {str(e)}", exc_info=True)
-        logger.error(f"Email settings: host={settings.EMAIL_HOST}, port={settings.EMAIL_PORT}, "
-                    f"use_tls={settings.EMAIL_USE_TLS}, from_email={from_email}")
-        return False
 
+    # Письмо администратору
+    enqueue_email(
+        EMAIL_TEMPLATES['admin_subject'].format(subject=subject),
+        EMAIL_TEMPLATES['admin_message'].format(name=name, email=email, subject=subject, message=message),
+        admin_email,
+        from_email=from_email,
+        contact_message=contact_message,
+    )
+    # Подтверждение пользователю
+    enqueue_email(
+        EMAIL_TEMPLATES['user_subject'],
+        EMAIL_TEMPLATES['user_message'].format(name=name, message=message),
+        email,
+        from_email=from_email,
+        contact_message=contact_message,
+    )
 
+
+@ratelimit('contact')
 def contact(request) -> Any:
     """
     Представление для страницы контактов
@@ -390,33 +376,19 @@ def contact(request) -> Any:
             }
             logger.info(f"Form data received: {form_data}")
             
-            # Сохранение сообщения в базу данных
+            # Сохранение сообщения и постановка писем в очередь одной транзакцией
             try:
-                contact_message = ContactMessage.objects.create(**form_data)
-                logger.info(f"Message saved to database with ID: {contact_message.id}")
+                with transaction.atomic():
+                    contact_message = ContactMessage.objects.create(**form_data)
+                    queue_contact_emails(**form_data, contact_message=contact_message)
+                logger.info(f"Message saved to database with ID: {contact_message.id}, emails queued")
             except Exception as e:
                 logger.error(f"Database error: {str(e)}", exc_info=True)
                 context['error_message'] = ERROR_MESSAGES['save_error']
                 context['form'] = form
                 return render(request, 'contact.html', context)
-            
-            # Отправка email-уведомлений
-            try:
-                if send_contact_emails(**form_data):
-                    logger.info(f"Emails sent successfully for message ID: {contact_message.id}")
-                    context['success_message'] = ERROR_MESSAGES['success']
-                else:
-                    logger.warning(f"Email sending failed for message ID: {contact_message.id}")
-                    context['error_message'] = ERROR_MESSAGES['email_error']
-                    # Сохраняем информацию об ошибке в базе данных
-                    contact_message.is_read = False
-                    contact_message.save()
-            except Exception as e:
-                logger.error(f"Email sending error: {str(e)}", exc_info=True)
-                context['error_message'] = ERROR_MESSAGES['email_error']
-                # Сохраняем информацию об ошибке в базе данных
-                contact_message.is_read = False
-                contact_message.save()
+
+            context['success_message'] = ERROR_MESSAGES['success']
                 
         except Exception as e:
             logger.error(f"Unexpected error in contact view: {str(e)}", exc_info=True)
@@ -455,10 +427,12 @@ def error_404(request):
     return render(request, '404.html', context)
 
 
+@ratelimit('comment')
 def blog_detail(request, pk):
     post = get_object_or_404(BlogPost, pk=pk)
     blog_posts = get_cached_data(BlogPost, 'blog_posts')
-    comments = post.comments.filter(is_approved=True)
+    # Страница одобренных комментариев из кэша; общее число хранится в посте
+    comments = get_approved_comments_page(post, request.GET.get('page'))
     
     if request.method == 'POST':
         form = CommentForm(request.POST)
@@ -481,6 +455,7 @@ def blog_detail(request, pk):
     return render(request, 'blog_detail.html', context)
 
 
+@ratelimit('newsletter')
 def newsletter_subscribe(request):
     if request.method == 'POST':
         form = NewsletterForm(request.POST)
@@ -503,17 +478,19 @@ def send_newsletter(request):
         if form.is_valid():
             subject = form.cleaned_data['subject']
             message = form.cleaned_data['message']
-            from_email = settings.DEFAULT_FROM_EMAIL
-            subscribers = NewsletterSubscriber.objects.values_list('email', flat=True)
-            sent_count = 0
-            for email in subscribers:
-                send_mail(subject, message, from_email, [email], fail_silently=False)
-                sent_count += 1
-            messages.success(request, f'Newsletter sent to {sent_count} subscribers!')
+            subscribers = NewsletterSubscriber.objects.all()
+            if getattr(settings, 'NEWSLETTER_BACKGROUND', True):
+                # Рассылка ставится в очередь outbox, страница показывает прогресс по job
+                job_id = start_delivery(subject, message, subscribers)
+                messages.success(request, 'Newsletter queued for delivery.')
+                return redirect(f"{reverse('send_newsletter')}?job={job_id}")
+            report = deliver_newsletter(subject, message, subscribers)
+            messages.success(request, f'Newsletter sent to {report.sent} subscribers!')
             return redirect('send_newsletter')
     else:
         form = NewsletterSendForm()
-    return render(request, 'send_newsletter.html', {'form': form})
+    delivery = get_delivery_progress(request.GET['job']) if request.GET.get('job') else None
+    return render(request, 'send_newsletter.html', {'form': form, 'delivery': delivery})
 
 
 def testimonials(request):